@@ -0,0 +1,361 @@
+"""
+Traductions FR/AR et mise en forme des données pour l'affichage
+Sans dépendance à Streamlit : importable par les tests et les benchmarks
+"""
+
+import numpy as np
+import pandas as pd
+
+from database import COLONNES_DRAPEAUX, VALEURS_VRAIES
+
+
+# ============================================
+# TRADUCTIONS COMPLÈTES
+# ============================================
+
+TRANSLATIONS = {
+    'fr': {
+        # Navigation
+        'title': '🏘️ Système de Gestion des Logements - Nouakchott, Mauritanie',
+        'language': 'Langue',
+        'menu': 'Menu',
+        'dashboard': '📊 Tableau de Bord',
+        'list': '📋 Liste des Logements',
+        'add': '➕ Ajouter un Logement',
+        'edit': '✏️ Modifier un Logement',
+        'search': '🔍 Recherche & Filtres',
+        'map': '🗺️ Cartographie GPS',
+        'import_export': '💾 Import/Export',
+        'statistics': '📈 Statistiques',
+        'history': '📜 Historique',
+        
+        # Statistiques
+        'total': 'Total des logements',
+        'by_ilot': 'Par îlot',
+        'by_dept': 'Par département',
+        'active': 'En activité',
+        'retired': 'À la retraite',
+        'deceased': 'Décédés',
+        
+        # Filtres et recherche
+        'filters': 'Filtres',
+        'ilot': 'Îlot',
+        'logement': 'Logement',
+        'affectaire': 'Affectaire',
+        'profession': 'Profession',
+        'departement': 'Département',
+        'telephone': 'Téléphone',
+        'nni': 'NNI',
+        'all': 'Tous',
+        'search_placeholder': 'Rechercher par nom, NNI, profession...',
+        'search_button': 'Rechercher',
+        
+        # Actions
+        'export': 'Exporter les données',
+        'import': 'Importer depuis Excel',
+        'save': 'Enregistrer',
+        'cancel': 'Annuler',
+        'delete': 'Supprimer',
+        'edit_action': 'Modifier',
+        'view_map': 'Voir sur la carte',
+        'select': 'Sélectionner',
+        'showing': 'Affichage de',
+        'results': 'résultats',
+        'sort_by': 'Trier par',
+        'relevance': 'Pertinence',
+        'descending': 'Ordre décroissant',
+        'page_size': 'Lignes par page',
+        'previous': 'Précédent',
+        'next': 'Suivant',
+        'map_mode': 'Affichage des marqueurs',
+        'map_mode_auto': 'Automatique',
+        'map_mode_individual': 'Individuels',
+        'map_mode_clustered': 'Regroupés',
+        'clustered_info': 'marqueurs regroupés (au-delà de {seuil} points)',
+        'details_on_click': 'Détails au clic',
+        'housing_details': 'Détails du logement',
+        'click_marker': 'Cliquez sur un marqueur pour afficher ses détails',
+        'viewport': 'Charger uniquement la zone affichée',
+        'in_view': 'logements dans la zone affichée',
+        'zone_aggregated': 'Plus de {maximum} logements dans la zone : effectifs par secteur, zoomez pour afficher les marqueurs',
+        'map_engine': 'Moteur de carte',
+        'engine_leaflet': 'Leaflet (marqueurs)',
+        'engine_webgl': 'WebGL (grands volumes)',
+        'loading': 'Chargement des données...',
+        
+        # Champs de formulaire
+        'decision': 'Décision',
+        'date_decision': 'Date Décision',
+        'matricule': 'Matricule',
+        'fonction': 'Fonction',
+        'en_activite': 'En Activité',
+        'a_la_retraite': 'À la Retraite',
+        'decede': 'Décédé',
+        'nom_repondant': 'Nom du Répondant',
+        'lien_parente': 'Lien de Parenté',
+        'tel_repondant': 'Téléphone Répondant',
+        'latitude': 'Latitude',
+        'longitude': 'Longitude',
+        'observation': 'Observation',
+        'statut': 'Statut',
+        
+        # Messages
+        'yes': 'Oui',
+        'no': 'Non',
+        'required_fields': 'Les champs marqués * sont obligatoires',
+        'success_add': 'Logement ajouté avec succès',
+        'success_edit': 'Logement modifié avec succès',
+        'success_delete': 'Logement supprimé avec succès',
+        'error': 'Erreur',
+        'no_data': 'Aucune donnée disponible',
+        'no_housing': 'Aucun logement trouvé',
+        'select_housing': 'Sélectionner un logement (ID)',
+        'batch_actions': 'Actions groupées',
+        'select_many': 'Sélectionner plusieurs logements',
+        'batch_field': 'Champ à modifier',
+        'batch_value': 'Nouvelle valeur',
+        'batch_clear': 'Vider ce champ sur toute la sélection',
+        'apply_selection': 'Appliquer à la sélection',
+        'delete_selection': 'Supprimer la sélection',
+        'history_action': 'Action',
+        'history_user': 'Utilisateur',
+        'date_from': 'Du',
+        'date_to': 'Au',
+        'history_archive': "Archivage de l'historique",
+        'retention_days': 'Archiver les entrées de plus de (jours)',
+        'archive_button': 'Archiver',
+        'state_at': "État d'un logement à une date",
+        'state_date': 'Date',
+        'show_state': "Afficher l'état",
+        'state_unknown': 'État inconnu à cette date (logement absent ou antérieur au premier instantané)',
+        'no_selection': 'Aucun logement sélectionné pour modification',
+        'not_found': 'Logement introuvable',
+        'file_saved': 'Fichier sauvegardé dans',
+        'import_success': 'Import réussi',
+        'export_success': 'Export réussi',
+    },
+    'ar': {
+        # Navigation
+        'title': '🏘️ نظام إدارة المساكن - نواكشوط، موريتانيا',
+        'language': 'اللغة',
+        'menu': 'القائمة',
+        'dashboard': '📊 لوحة المعلومات',
+        'list': '📋 قائمة المساكن',
+        'add': '➕ إضافة مسكن',
+        'edit': '✏️ تعديل مسكن',
+        'search': '🔍 البحث والفلاتر',
+        'map': '🗺️ الخريطة',
+        'import_export': '💾 استيراد/تصدير',
+        'statistics': '📈 الإحصائيات',
+        'history': '📜 السجل',
+        
+        # Statistiques
+        'total': 'إجمالي المساكن',
+        'by_ilot': 'حسب الجزيرة',
+        'by_dept': 'حسب القسم',
+        'active': 'نشط',
+        'retired': 'متقاعد',
+        'deceased': 'متوفى',
+        
+        # Filtres et recherche
+        'filters': 'الفلاتر',
+        'ilot': 'الجزيرة',
+        'logement': 'المسكن',
+        'affectaire': 'المستفيد',
+        'profession': 'المهنة',
+        'departement': 'القسم',
+        'telephone': 'الهاتف',
+        'nni': 'رقم التعريف الوطني',
+        'all': 'الكل',
+        'search_placeholder': 'البحث بالاسم، رقم التعريف، المهنة...',
+        'search_button': 'بحث',
+        
+        # Actions
+        'export': 'تصدير البيانات',
+        'import': 'استيراد من Excel',
+        'save': 'حفظ',
+        'cancel': 'إلغاء',
+        'delete': 'حذف',
+        'edit_action': 'تعديل',
+        'view_map': 'عرض على الخريطة',
+        'select': 'اختيار',
+        'showing': 'عرض',
+        'results': 'نتيجة',
+        'sort_by': 'ترتيب حسب',
+        'relevance': 'الصلة',
+        'descending': 'ترتيب تنازلي',
+        'page_size': 'عدد الأسطر في الصفحة',
+        'previous': 'السابق',
+        'next': 'التالي',
+        'map_mode': 'عرض العلامات',
+        'map_mode_auto': 'تلقائي',
+        'map_mode_individual': 'فردية',
+        'map_mode_clustered': 'مجمعة',
+        'clustered_info': 'علامات مجمعة (أكثر من {seuil} نقطة)',
+        'details_on_click': 'التفاصيل عند النقر',
+        'housing_details': 'تفاصيل السكن',
+        'click_marker': 'انقر على علامة لعرض تفاصيلها',
+        'viewport': 'تحميل المنطقة المعروضة فقط',
+        'in_view': 'سكن في المنطقة المعروضة',
+        'zone_aggregated': 'أكثر من {maximum} سكن في المنطقة: أعداد حسب القطاع، قم بالتكبير لعرض العلامات',
+        'map_engine': 'محرك الخريطة',
+        'engine_leaflet': 'Leaflet (علامات)',
+        'engine_webgl': 'WebGL (أحجام كبيرة)',
+        'loading': 'جاري تحميل البيانات...',
+        
+        # Champs de formulaire
+        'decision': 'القرار',
+        'date_decision': 'تاريخ القرار',
+        'matricule': 'الرقم المسلسل',
+        'fonction': 'الوظيفة',
+        'en_activite': 'نشط',
+        'a_la_retraite': 'متقاعد',
+        'decede': 'متوفى',
+        'nom_repondant': 'اسم المجيب',
+        'lien_parente': 'صلة القرابة',
+        'tel_repondant': 'هاتف المجيب',
+        'latitude': 'خط العرض',
+        'longitude': 'خط الطول',
+        'observation': 'ملاحظة',
+        'statut': 'الحالة',
+        
+        # Messages
+        'yes': 'نعم',
+        'no': 'لا',
+        'required_fields': 'الحقول المميزة بـ * إلزامية',
+        'success_add': 'تمت إضافة المسكن بنجاح',
+        'success_edit': 'تم تعديل المسكن بنجاح',
+        'success_delete': 'تم حذف المسكن بنجاح',
+        'error': 'خطأ',
+        'no_data': 'لا توجد بيانات متاحة',
+        'no_housing': 'لم يتم العثور على مساكن',
+        'select_housing': 'اختر مسكن (المعرف)',
+        'batch_actions': 'إجراءات جماعية',
+        'select_many': 'اختر عدة مساكن',
+        'batch_field': 'الحقل المراد تعديله',
+        'batch_value': 'القيمة الجديدة',
+        'batch_clear': 'إفراغ هذا الحقل في كل التحديد',
+        'apply_selection': 'تطبيق على التحديد',
+        'delete_selection': 'حذف التحديد',
+        'history_action': 'الإجراء',
+        'history_user': 'المستخدم',
+        'date_from': 'من',
+        'date_to': 'إلى',
+        'history_archive': 'أرشفة السجل',
+        'retention_days': 'أرشفة الإدخالات الأقدم من (أيام)',
+        'archive_button': 'أرشفة',
+        'state_at': 'حالة مسكن في تاريخ معين',
+        'state_date': 'التاريخ',
+        'show_state': 'عرض الحالة',
+        'state_unknown': 'الحالة غير معروفة في هذا التاريخ',
+        'no_selection': 'لم يتم اختيار مسكن للتعديل',
+        'not_found': 'المسكن غير موجود',
+        'file_saved': 'تم حفظ الملف في',
+        'import_success': 'نجح الاستيراد',
+        'export_success': 'نجح التصدير',
+    }
+}
+
+
+def t(key, lang='fr'):
+    """Fonction de traduction robuste"""
+    try:
+        return TRANSLATIONS.get(lang, TRANSLATIONS['fr']).get(key, key)
+    except Exception:
+        return key
+
+
+# ============================================
+# FONCTIONS UTILITAIRES
+# ============================================
+
+def est_vrai(valeur):
+    """Interprète une valeur de statut (booléen, nombre ou texte) ; absente = faux"""
+    if isinstance(valeur, bool):
+        return valeur
+    if isinstance(valeur, str):
+        return valeur.lower().strip() in VALEURS_VRAIES
+    if isinstance(valeur, (int, float)):
+        return valeur == 1
+    return False
+
+
+def afficher_valeur_activite(valeur, lang='fr'):
+    """Affiche correctement le statut d'activité (gère les NaN)"""
+    return t('yes', lang) if est_vrai(valeur) else t('no', lang)
+
+
+def drapeau_saisi(choix, lang='fr'):
+    """Statut choisi dans un formulaire (vide, Oui, Non) converti en None, 1 ou 0"""
+    if choix == t('yes', lang):
+        return 1
+    if choix == t('no', lang):
+        return 0
+    return None
+
+
+def index_drapeau(valeur):
+    """Position d'un statut stocké dans les options (vide, Oui, Non) des formulaires"""
+    if valeur is None or pd.isna(valeur) or valeur == '':
+        return 0
+    return 1 if est_vrai(valeur) else 2
+
+
+def traduire_activite(serie, lang='fr'):
+    """Statut d'activité traduit : chaque valeur distincte est interprétée une seule fois"""
+    vrais = [valeur for valeur in serie.dropna().unique().tolist() if est_vrai(valeur)]
+    return pd.Series(np.where(serie.isin(vrais), t('yes', lang), t('no', lang)), index=serie.index, dtype=object)
+
+
+def nettoyer_dataframe(df, lang='fr'):
+    """Nettoie le DataFrame pour l'affichage (remplace NaN, traduit)
+    
+    Seules les colonnes modifiées sont remplacées ; sans modification, le
+    DataFrame est renvoyé tel quel.
+    """
+    if df.empty:
+        return df
+    
+    colonnes = {}
+    for col in df.columns:
+        serie = df[col]
+        # Colonnes de statut (1/0) affichées en Oui/Non
+        if col in COLONNES_DRAPEAUX:
+            colonnes[col] = traduire_activite(serie, lang)
+        # Colonnes texte : valeurs absentes et chaînes vides repérées en une passe
+        elif serie.dtype == 'object':
+            vides = serie.isin(['', None, np.nan])
+            if vides.any():
+                colonnes[col] = serie.mask(vides, '-')
+        # Colonnes numériques
+        elif serie.dtype == 'float64' and serie.hasnans:
+            colonnes[col] = serie.fillna(0)
+    
+    if not colonnes:
+        return df
+    # Copie superficielle : les colonnes inchangées ne sont pas dupliquées
+    df_clean = df.copy(deep=False)
+    for col, serie in colonnes.items():
+        df_clean[col] = serie
+    return df_clean
+
+
+def libelles_logements(df):
+    """Libellé « ID:id - îlot-logement - affectaire » de chaque ligne, indexé par id"""
+    def colonne(nom):
+        return df[nom].fillna('').astype(str) if nom in df.columns else ''
+    
+    libelles = ("ID:" + df['id'].astype(str) + " - " + colonne('ilot') + "-" + colonne('logement')
+                + " - " + colonne('nom_affectaire'))
+    return dict(zip(df['id'].tolist(), libelles.tolist()))
+
+
+def get_safe_value(data_dict, key, default=''):
+    """Récupère une valeur de manière sécurisée depuis un dictionnaire"""
+    try:
+        value = data_dict.get(key, default)
+        if pd.isna(value):
+            return default
+        return str(value) if value is not None else default
+    except Exception:
+        return default
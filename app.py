@@ -7,15 +7,20 @@ import streamlit as st
 import pandas as pd
 import tempfile
 import os
-import folium
 from streamlit_folium import st_folium
 import plotly.express as px
 import plotly.graph_objects as go
-from database import LogementDatabase
+from database import LogementDatabase, COLONNES_LOGEMENTS, ACTIONS_HISTORIQUE
+from affichage import (t, afficher_valeur_activite, drapeau_saisi, index_drapeau, traduire_activite,
+                       nettoyer_dataframe, libelles_logements, get_safe_value)
+from carte import (carte_logements, id_depuis_clic, vue_depuis_retour, ajouter_effectifs,
+                   collection_geojson, geojson_en_cache, mode_effectif, figure_webgl,
+                   COLONNES_CARTE, COLONNES_MARQUEURS, SEUIL_REGROUPEMENT, MAX_MARQUEURS_ZONE)
 from datetime import datetime
 import arabic_reshaper
 from bidi.algorithm import get_display
 import json
+import atexit
 
 
 # ============================================
@@ -30,6 +35,14 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+@st.cache_resource
+def obtenir_base(db_path, excel_path):
+    """Base de données partagée par toutes les sessions du processus (pool de connexions)"""
+    db = LogementDatabase(db_path=db_path, excel_path=excel_path)
+    atexit.register(db.fermer)
+    return db
+
+
 # Initialisation de la session AVANT toute utilisation
 if 'lang' not in st.session_state:
     st.session_state.lang = 'fr'
@@ -38,7 +51,7 @@ if 'db' not in st.session_state:
     # Respecter les variables d'environnement si présentes (utiles en déploiement)
     excel_path = os.environ.get('LOGEMENTS_EXCEL_PATH', os.path.join(os.path.expanduser("~"), "logements.xlsx"))
     db_path = os.environ.get('LOGEMENTS_DB_PATH', 'logements.db')
-    st.session_state.db = LogementDatabase(db_path=db_path, excel_path=excel_path)
+    st.session_state.db = obtenir_base(db_path, excel_path)
     st.session_state.data_loaded = False
 
 if 'selected_logements' not in st.session_state:
@@ -47,6 +60,11 @@ if 'selected_logements' not in st.session_state:
 if 'page' not in st.session_state:
     st.session_state.page = 'dashboard'
 
+if 'liste_curseurs' not in st.session_state:
+    # Curseurs des pages déjà parcourues de la liste (pour revenir en arrière)
+    st.session_state.liste_curseurs = [None]
+    st.session_state.liste_signature = None
+
 
 # ============================================
 # STYLES CSS AMÉLIORÉS
@@ -139,185 +157,9 @@ def apply_custom_css():
 
 
 # ============================================
-# TRADUCTIONS COMPLÈTES
+# FONCTIONS UTILITAIRES
 # ============================================
 
-TRANSLATIONS = {
-    'fr': {
-        # Navigation
-        'title': '🏘️ Système de Gestion des Logements - Nouakchott, Mauritanie',
-        'language': 'Langue',
-        'menu': 'Menu',
-        'dashboard': '📊 Tableau de Bord',
-        'list': '📋 Liste des Logements',
-        'add': '➕ Ajouter un Logement',
-        'edit': '✏️ Modifier un Logement',
-        'search': '🔍 Recherche & Filtres',
-        'map': '🗺️ Cartographie GPS',
-        'import_export': '💾 Import/Export',
-        'statistics': '📈 Statistiques',
-        'history': '📜 Historique',
-        
-        # Statistiques
-        'total': 'Total des logements',
-        'by_ilot': 'Par îlot',
-        'by_dept': 'Par département',
-        'active': 'En activité',
-        'retired': 'À la retraite',
-        'deceased': 'Décédés',
-        
-        # Filtres et recherche
-        'filters': 'Filtres',
-        'ilot': 'Îlot',
-        'logement': 'Logement',
-        'affectaire': 'Affectaire',
-        'profession': 'Profession',
-        'departement': 'Département',
-        'telephone': 'Téléphone',
-        'nni': 'NNI',
-        'all': 'Tous',
-        'search_placeholder': 'Rechercher par nom, NNI, profession...',
-        'search_button': 'Rechercher',
-        
-        # Actions
-        'export': 'Exporter les données',
-        'import': 'Importer depuis Excel',
-        'save': 'Enregistrer',
-        'cancel': 'Annuler',
-        'delete': 'Supprimer',
-        'edit_action': 'Modifier',
-        'view_map': 'Voir sur la carte',
-        'select': 'Sélectionner',
-        'showing': 'Affichage de',
-        'results': 'résultats',
-        'loading': 'Chargement des données...',
-        
-        # Champs de formulaire
-        'decision': 'Décision',
-        'date_decision': 'Date Décision',
-        'matricule': 'Matricule',
-        'fonction': 'Fonction',
-        'en_activite': 'En Activité',
-        'a_la_retraite': 'À la Retraite',
-        'decede': 'Décédé',
-        'nom_repondant': 'Nom du Répondant',
-        'lien_parente': 'Lien de Parenté',
-        'tel_repondant': 'Téléphone Répondant',
-        'latitude': 'Latitude',
-        'longitude': 'Longitude',
-        'observation': 'Observation',
-        'statut': 'Statut',
-        
-        # Messages
-        'yes': 'Oui',
-        'no': 'Non',
-        'required_fields': 'Les champs marqués * sont obligatoires',
-        'success_add': 'Logement ajouté avec succès',
-        'success_edit': 'Logement modifié avec succès',
-        'success_delete': 'Logement supprimé avec succès',
-        'error': 'Erreur',
-        'no_data': 'Aucune donnée disponible',
-        'no_housing': 'Aucun logement trouvé',
-        'select_housing': 'Sélectionner un logement (ID)',
-        'no_selection': 'Aucun logement sélectionné pour modification',
-        'not_found': 'Logement introuvable',
-        'file_saved': 'Fichier sauvegardé dans',
-        'import_success': 'Import réussi',
-        'export_success': 'Export réussi',
-    },
-    'ar': {
-        # Navigation
-        'title': '🏘️ نظام إدارة المساكن - نواكشوط، موريتانيا',
-        'language': 'اللغة',
-        'menu': 'القائمة',
-        'dashboard': '📊 لوحة المعلومات',
-        'list': '📋 قائمة المساكن',
-        'add': '➕ إضافة مسكن',
-        'edit': '✏️ تعديل مسكن',
-        'search': '🔍 البحث والفلاتر',
-        'map': '🗺️ الخريطة',
-        'import_export': '💾 استيراد/تصدير',
-        'statistics': '📈 الإحصائيات',
-        'history': '📜 السجل',
-        
-        # Statistiques
-        'total': 'إجمالي المساكن',
-        'by_ilot': 'حسب الجزيرة',
-        'by_dept': 'حسب القسم',
-        'active': 'نشط',
-        'retired': 'متقاعد',
-        'deceased': 'متوفى',
-        
-        # Filtres et recherche
-        'filters': 'الفلاتر',
-        'ilot': 'الجزيرة',
-        'logement': 'المسكن',
-        'affectaire': 'المستفيد',
-        'profession': 'المهنة',
-        'departement': 'القسم',
-        'telephone': 'الهاتف',
-        'nni': 'رقم التعريف الوطني',
-        'all': 'الكل',
-        'search_placeholder': 'البحث بالاسم، رقم التعريف، المهنة...',
-        'search_button': 'بحث',
-        
-        # Actions
-        'export': 'تصدير البيانات',
-        'import': 'استيراد من Excel',
-        'save': 'حفظ',
-        'cancel': 'إلغاء',
-        'delete': 'حذف',
-        'edit_action': 'تعديل',
-        'view_map': 'عرض على الخريطة',
-        'select': 'اختيار',
-        'showing': 'عرض',
-        'results': 'نتيجة',
-        'loading': 'جاري تحميل البيانات...',
-        
-        # Champs de formulaire
-        'decision': 'القرار',
-        'date_decision': 'تاريخ القرار',
-        'matricule': 'الرقم المسلسل',
-        'fonction': 'الوظيفة',
-        'en_activite': 'نشط',
-        'a_la_retraite': 'متقاعد',
-        'decede': 'متوفى',
-        'nom_repondant': 'اسم المجيب',
-        'lien_parente': 'صلة القرابة',
-        'tel_repondant': 'هاتف المجيب',
-        'latitude': 'خط العرض',
-        'longitude': 'خط الطول',
-        'observation': 'ملاحظة',
-        'statut': 'الحالة',
-        
-        # Messages
-        'yes': 'نعم',
-        'no': 'لا',
-        'required_fields': 'الحقول المميزة بـ * إلزامية',
-        'success_add': 'تمت إضافة المسكن بنجاح',
-        'success_edit': 'تم تعديل المسكن بنجاح',
-        'success_delete': 'تم حذف المسكن بنجاح',
-        'error': 'خطأ',
-        'no_data': 'لا توجد بيانات متاحة',
-        'no_housing': 'لم يتم العثور على مساكن',
-        'select_housing': 'اختر مسكن (المعرف)',
-        'no_selection': 'لم يتم اختيار مسكن للتعديل',
-        'not_found': 'المسكن غير موجود',
-        'file_saved': 'تم حفظ الملف في',
-        'import_success': 'نجح الاستيراد',
-        'export_success': 'نجح التصدير',
-    }
-}
-
-
-def t(key, lang='fr'):
-    """Fonction de traduction robuste"""
-    try:
-        return TRANSLATIONS.get(lang, TRANSLATIONS['fr']).get(key, key)
-    except Exception:
-        return key
-
-
 def format_arabic_text(text):
     """Formate le texte arabe pour un affichage correct"""
     try:
@@ -329,65 +171,6 @@ def format_arabic_text(text):
         return text
 
 
-# ============================================
-# FONCTIONS UTILITAIRES
-# ============================================
-
-def afficher_valeur_activite(valeur, lang='fr'):
-    """Affiche correctement le statut d'activité (gère les NaN)"""
-    if pd.isna(valeur) or valeur is None or valeur == '':
-        return t('no', lang)
-    
-    # Convertir en booléen de manière robuste
-    if isinstance(valeur, bool):
-        return t('yes', lang) if valeur else t('no', lang)
-    
-    if isinstance(valeur, str):
-        valeur_lower = str(valeur).lower().strip()
-        if valeur_lower in ['oui', 'yes', 'true', '1', 'actif', 'نعم']:
-            return t('yes', lang)
-        else:
-            return t('no', lang)
-    
-    if isinstance(valeur, (int, float)):
-        return t('yes', lang) if valeur == 1 else t('no', lang)
-    
-    return t('no', lang)
-
-
-def nettoyer_dataframe(df, lang='fr'):
-    """Nettoie le DataFrame pour l'affichage (remplace NaN, traduit)"""
-    if df.empty:
-        return df
-    
-    df_clean = df.copy()
-    
-    # Remplacer les NaN
-    for col in df_clean.columns:
-        # Colonnes booléennes
-        if col in ['en_activite', 'a_la_retraite', 'decede']:
-            df_clean[col] = df_clean[col].apply(lambda x: afficher_valeur_activite(x, lang))
-        # Colonnes texte
-        elif df_clean[col].dtype == 'object':
-            df_clean[col] = df_clean[col].fillna('-').replace('', '-')
-        # Colonnes numériques
-        elif df_clean[col].dtype in ['float64', 'int64']:
-            df_clean[col] = df_clean[col].fillna(0)
-    
-    return df_clean
-
-
-def get_safe_value(data_dict, key, default=''):
-    """Récupère une valeur de manière sécurisée depuis un dictionnaire"""
-    try:
-        value = data_dict.get(key, default)
-        if pd.isna(value):
-            return default
-        return str(value) if value is not None else default
-    except Exception:
-        return default
-
-
 # ============================================
 # PAGES DE L'APPLICATION
 # ============================================
@@ -405,7 +188,10 @@ def page_dashboard():
                 count, message = st.session_state.db.importer_depuis_excel()
                 if count > 0:
                     st.session_state.data_loaded = True
-                    st.success(message)
+                    if st.session_state.db.statistiques_import.get('ignore'):
+                        st.caption(message)
+                    else:
+                        st.success(message)
                 elif count == 0:
                     st.info("Aucune donnée à importer. Ajoutez des logements manuellement.")
             except Exception as e:
@@ -427,7 +213,7 @@ def page_dashboard():
         st.metric(t('by_dept', lang), len(stats.get('par_departement', {})))
     
     with col4:
-        actifs = stats.get('par_activite', {}).get('Oui', 0)
+        actifs = stats.get('par_activite', {}).get(1, 0)
         st.metric(t('active', lang), actifs)
     
     # Graphiques
@@ -476,11 +262,13 @@ def page_liste():
             filtre_ilot = st.selectbox(t('ilot', lang), ilots)
         
         with col2:
-            depts = [t('all', lang)] + st.session_state.db.obtenir_valeurs_uniques('departement')
+            # Facettes dépendantes : seules les valeurs présentes dans l'îlot choisi
+            ilot_choisi = filtre_ilot if filtre_ilot != t('all', lang) else None
+            depts = [t('all', lang)] + st.session_state.db.obtenir_valeurs_uniques('departement', ilot=ilot_choisi)
             filtre_dept = st.selectbox(t('departement', lang), depts)
         
         with col3:
-            profs = [t('all', lang)] + st.session_state.db.obtenir_valeurs_uniques('profession')
+            profs = [t('all', lang)] + st.session_state.db.obtenir_valeurs_uniques('profession', ilot=ilot_choisi)
             filtre_prof = st.selectbox(t('profession', lang), profs)
         
         with col4:
@@ -495,29 +283,70 @@ def page_liste():
     if filtre_prof != t('all', lang):
         filtres['profession'] = filtre_prof
     
-    # Charger les données
+    # Tri et taille de page
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        tris = {t('ilot', lang): 'ilot', t('departement', lang): 'departement',
+                t('profession', lang): 'profession', t('affectaire', lang): 'nom_affectaire',
+                'Date de modification': 'updated_at'}
+        if terme_recherche:
+            tris = {t('relevance', lang): 'pertinence', **tris}
+        tri = tris[st.selectbox(t('sort_by', lang), list(tris))]
+    with col2:
+        taille_page = st.selectbox(t('page_size', lang), [25, 50, 100, 200], index=1)
+    with col3:
+        descendant = st.checkbox(t('descending', lang), disabled=(tri == 'pertinence'))
+    
+    # Sélection des colonnes à afficher (seules celles-ci sont lues dans la base)
+    colonnes_par_defaut = ['ilot', 'logement', 'nom_affectaire', 'profession',
+                          'departement', 'telephone', 'nni', 'en_activite']
+    colonnes_selectionnees = st.multiselect(
+        "Colonnes à afficher",
+        [col for col in COLONNES_LOGEMENTS if col != 'hash_import'],
+        default=colonnes_par_defaut
+    )
+    # id, îlot, logement et affectaire servent aussi au sélecteur d'actions
+    colonnes_lues = list(dict.fromkeys(colonnes_selectionnees + ['ilot', 'logement', 'nom_affectaire'])) \
+        if colonnes_selectionnees else None
+    
+    # Revenir à la première page quand la requête change
+    signature = (terme_recherche, tuple(sorted(filtres.items())), tri, descendant, taille_page)
+    if st.session_state.liste_signature != signature:
+        st.session_state.liste_signature = signature
+        st.session_state.liste_curseurs = [None]
+    numero_page = len(st.session_state.liste_curseurs) - 1
+    apres = st.session_state.liste_curseurs[-1]
+    
+    # Charger uniquement la page affichée
     if terme_recherche:
-        df = st.session_state.db.rechercher(terme_recherche)
+        df = st.session_state.db.rechercher(terme_recherche, filtre=filtres, taille_page=taille_page, apres=apres,
+                                            tri=None if tri == 'pertinence' else tri, descendant=descendant,
+                                            colonnes=colonnes_lues)
     else:
-        df = st.session_state.db.lire_tous(filtres)
+        df = st.session_state.db.lire_tous(filtres, taille_page=taille_page, apres=apres, tri=tri,
+                                           descendant=descendant, colonnes=colonnes_lues)
+    total = df.attrs.get('total', len(df))
+    curseur_suivant = df.attrs.get('curseur_suivant')
     
     # Nettoyer les données
     df = nettoyer_dataframe(df, lang)
     
-    st.info(f"{t('showing', lang)} {len(df)} {t('results', lang)}")
+    debut = numero_page * taille_page
+    st.info(f"{t('showing', lang)} {debut + 1 if len(df) else 0}–{debut + len(df)} / {total} {t('results', lang)}")
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("◀ " + t('previous', lang), disabled=(numero_page == 0)):
+            st.session_state.liste_curseurs.pop()
+            st.rerun()
+    with col2:
+        st.caption(f"Page {numero_page + 1} / {max(1, -(-total // taille_page))}")
+    with col3:
+        if st.button(t('next', lang) + " ▶", disabled=(curseur_suivant is None)):
+            st.session_state.liste_curseurs.append(curseur_suivant)
+            st.rerun()
     
     if not df.empty:
-        # Sélection des colonnes à afficher
-        colonnes_disponibles = list(df.columns)
-        colonnes_par_defaut = ['ilot', 'logement', 'nom_affectaire', 'profession', 
-                              'departement', 'telephone', 'nni', 'en_activite']
-        
-        colonnes_selectionnees = st.multiselect(
-            "Colonnes à afficher",
-            colonnes_disponibles,
-            default=[col for col in colonnes_par_defaut if col in colonnes_disponibles]
-        )
-        
         if colonnes_selectionnees:
             df_display = df[colonnes_selectionnees]
         else:
@@ -544,7 +373,13 @@ def page_liste():
         
         with col3:
             if st.button("🖨️ Imprimer"):
-                preparer_impression(df_display)
+                # L'impression porte sur tous les résultats, pas seulement la page affichée
+                if terme_recherche:
+                    df_complet = st.session_state.db.rechercher(terme_recherche, filtre=filtres, colonnes=colonnes_lues)
+                else:
+                    df_complet = st.session_state.db.lire_tous(filtres, colonnes=colonnes_lues)
+                df_complet = nettoyer_dataframe(df_complet, lang)
+                preparer_impression(df_complet[colonnes_selectionnees] if colonnes_selectionnees else df_complet)
         
         # Affichage du tableau
         st.dataframe(
@@ -557,10 +392,12 @@ def page_liste():
         st.subheader("Actions")
         
         if 'id' in df.columns and len(df) > 0:
+            # Libellés indexés par id, construits une fois pour la page affichée
+            libelles = libelles_logements(df)
             logement_id = st.selectbox(
                 t('select_housing', lang),
-                df['id'].tolist(),
-                format_func=lambda x: f"ID:{x} - {get_safe_value(df[df['id']==x].iloc[0], 'ilot')}-{get_safe_value(df[df['id']==x].iloc[0], 'logement')} - {get_safe_value(df[df['id']==x].iloc[0], 'nom_affectaire')}"
+                list(libelles),
+                format_func=libelles.__getitem__
             )
             
             col1, col2, col3 = st.columns(3)
@@ -585,6 +422,54 @@ def page_liste():
                         st.rerun()
                     else:
                         st.error(message)
+            
+            # Actions groupées : une transaction pour toute la sélection
+            st.subheader(t('batch_actions', lang))
+            selection = st.multiselect(
+                t('select_many', lang),
+                list(libelles),
+                format_func=libelles.__getitem__,
+                key='liste_selection'
+            )
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                champ = st.selectbox(t('batch_field', lang),
+                                     ['ilot', 'departement', 'profession', 'fonction', 'statut'],
+                                     format_func=lambda col: t(col, lang))
+            with col2:
+                valeur = st.text_input(t('batch_value', lang)).strip()
+                # Une valeur vide n'efface le champ que sur demande explicite
+                vider = st.checkbox(t('batch_clear', lang), key='liste_vider')
+            
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                if st.button("✏️ " + t('apply_selection', lang), disabled=not selection or not (valeur or vider)):
+                    nombre, message = st.session_state.db.modifier_logements(
+                        [{'id': logement_id, champ: None if vider else valeur} for logement_id in selection])
+                    if nombre:
+                        st.success(message)
+                        st.rerun()
+                    elif message.startswith('✗'):
+                        st.error(message)
+                    else:
+                        st.info(message)
+            
+            with col2:
+                if st.button("🗺️ " + t('view_map', lang), key='carte_selection', disabled=not selection):
+                    st.session_state.selected_logements = list(selection)
+                    st.session_state.page = 'map_filtered'
+                    st.rerun()
+            
+            with col3:
+                if st.button("🗑️ " + t('delete_selection', lang), type="secondary", disabled=not selection):
+                    nombre, message = st.session_state.db.supprimer_logements(selection)
+                    if nombre:
+                        st.success(message)
+                        st.rerun()
+                    else:
+                        st.error(message)
     else:
         st.warning(t('no_housing', lang))
 
@@ -633,10 +518,10 @@ def page_ajout():
             if not ilot or not logement or not nom_affectaire:
                 st.error(t('required_fields', lang))
             else:
-                # Convertir les valeurs de langue en français pour la base de données
-                en_activite_db = "Oui" if en_activite == t('yes', lang) else "Non" if en_activite == t('no', lang) else ""
-                a_la_retraite_db = "Oui" if a_la_retraite == t('yes', lang) else "Non" if a_la_retraite == t('no', lang) else ""
-                decede_db = "Oui" if decede == t('yes', lang) else "Non" if decede == t('no', lang) else ""
+                # Statuts stockés en 1/0 (None si non renseigné)
+                en_activite_db = drapeau_saisi(en_activite, lang)
+                a_la_retraite_db = drapeau_saisi(a_la_retraite, lang)
+                decede_db = drapeau_saisi(decede, lang)
                 
                 data = {
                     'ilot': ilot,
@@ -704,34 +589,14 @@ def page_modification():
             departement = st.text_input(t('departement', lang), value=get_safe_value(logement, 'departement'))
             telephone = st.text_input(t('telephone', lang), value=get_safe_value(logement, 'telephone'))
             
-            # Gestion robuste des selectbox
-            valeur_activite = get_safe_value(logement, 'en_activite', '')
+            # Statuts 1/0 : Oui / Non, vide si non renseigné
             options_activite = ["", t('yes', lang), t('no', lang)]
-            if valeur_activite.lower() == 'oui':
-                index_activite = 1
-            elif valeur_activite.lower() == 'non':
-                index_activite = 2
-            else:
-                index_activite = 0
-            en_activite = st.selectbox(t('en_activite', lang), options_activite, index=index_activite)
-            
-            valeur_retraite = get_safe_value(logement, 'a_la_retraite', '')
-            if valeur_retraite.lower() == 'oui':
-                index_retraite = 1
-            elif valeur_retraite.lower() == 'non':
-                index_retraite = 2
-            else:
-                index_retraite = 0
-            a_la_retraite = st.selectbox(t('a_la_retraite', lang), options_activite, index=index_retraite)
-            
-            valeur_decede = get_safe_value(logement, 'decede', '')
-            if valeur_decede.lower() == 'oui':
-                index_decede = 1
-            elif valeur_decede.lower() == 'non':
-                index_decede = 2
-            else:
-                index_decede = 0
-            decede = st.selectbox(t('decede', lang), options_activite, index=index_decede)
+            en_activite = st.selectbox(t('en_activite', lang), options_activite,
+                                       index=index_drapeau(logement.get('en_activite')))
+            a_la_retraite = st.selectbox(t('a_la_retraite', lang), options_activite,
+                                         index=index_drapeau(logement.get('a_la_retraite')))
+            decede = st.selectbox(t('decede', lang), options_activite,
+                                  index=index_drapeau(logement.get('decede')))
             
             nom_repondant = st.text_input(t('nom_repondant', lang), value=get_safe_value(logement, 'nom_repondant'))
             lien_parente = st.text_input(t('lien_parente', lang), value=get_safe_value(logement, 'lien_parente'))
@@ -763,10 +628,10 @@ def page_modification():
             cancelled = st.form_submit_button("❌ " + t('cancel', lang))
         
         if submitted:
-            # Convertir les valeurs de langue en français pour la base de données
-            en_activite_db = "Oui" if en_activite == t('yes', lang) else "Non" if en_activite == t('no', lang) else ""
-            a_la_retraite_db = "Oui" if a_la_retraite == t('yes', lang) else "Non" if a_la_retraite == t('no', lang) else ""
-            decede_db = "Oui" if decede == t('yes', lang) else "Non" if decede == t('no', lang) else ""
+            # Statuts stockés en 1/0 (None si non renseigné)
+            en_activite_db = drapeau_saisi(en_activite, lang)
+            a_la_retraite_db = drapeau_saisi(a_la_retraite, lang)
+            decede_db = drapeau_saisi(decede, lang)
             
             data = {
                 'ilot': ilot,
@@ -805,61 +670,112 @@ def page_modification():
             st.rerun()
 
 
+def choisir_mode_carte(lang, cle):
+    """Sélecteurs du mode d'affichage des marqueurs et des détails au clic
+    
+    Renvoie (mode, details_au_clic).
+    """
+    modes = {
+        t('map_mode_auto', lang): 'auto',
+        t('map_mode_individual', lang): 'individuel',
+        t('map_mode_clustered', lang): 'regroupe',
+    }
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        mode = modes[st.radio(t('map_mode', lang), list(modes), horizontal=True, key=cle)]
+    with col2:
+        details_au_clic = st.checkbox(t('details_on_click', lang), value=True, key=f"{cle}_details")
+    return mode, details_au_clic
+
+
+def afficher_details_logement(logement_id, lang, cle):
+    """Panneau des détails du logement cliqué sur la carte, lus à la demande"""
+    st.markdown(f"#### 🏠 {t('housing_details', lang)}")
+    logement = st.session_state.db.lire_logement(logement_id) if logement_id else None
+    if not logement:
+        st.info(t('click_marker', lang))
+        return
+    
+    st.markdown(f"**{get_safe_value(logement, 'ilot')}-{get_safe_value(logement, 'logement')}**")
+    st.markdown(f"""
+    **{t('affectaire', lang)} :** {get_safe_value(logement, 'nom_affectaire', 'N/A')}  
+    **{t('nni', lang)} :** {get_safe_value(logement, 'nni', 'N/A')}  
+    **{t('profession', lang)} :** {get_safe_value(logement, 'profession', 'N/A')}  
+    **Fonction :** {get_safe_value(logement, 'fonction', 'N/A')}  
+    **{t('departement', lang)} :** {get_safe_value(logement, 'departement', 'N/A')}  
+    **{t('telephone', lang)} :** {get_safe_value(logement, 'telephone', 'N/A')}  
+    **{t('active', lang)} :** {afficher_valeur_activite(logement.get('en_activite'), lang)}
+    """)
+    if st.button("✏️ " + t('edit_action', lang), key=f"{cle}_modifier"):
+        st.session_state.edit_id = logement_id
+        st.session_state.page = 'edit'
+        st.rerun()
+
+
+def afficher_carte(m, lang, cle, details_au_clic, height, suivre_zone=False):
+    """Affiche la carte ; avec les détails au clic, un panneau latéral les présente
+    
+    Avec suivre_zone, la vue (limites, zoom, centre) revient à Streamlit et
+    reste lisible dans st.session_state[cle] au passage suivant.
+    """
+    objets = ['bounds', 'zoom', 'center'] if suivre_zone else []
+    if not details_au_clic:
+        st_folium(m, width=1200, height=height, key=cle, returned_objects=objets)
+        return
+    
+    col_carte, col_details = st.columns([3, 1])
+    with col_carte:
+        # Seule l'info-bulle cliquée (qui porte l'id) revient à Streamlit
+        retour = st_folium(m, use_container_width=True, height=height, key=cle,
+                           returned_objects=['last_object_clicked_tooltip'] + objets)
+    with col_details:
+        afficher_details_logement(id_depuis_clic(retour), lang, cle)
+
+
+def collection_carte(df, cle, champs, lang):
+    """Couche GeoJSON des marqueurs, gardée en cache (par page, filtres et
+    langue) tant que les données n'ont pas changé
+    """
+    def construire():
+        df_carte = df.assign(en_activite=traduire_activite(df['en_activite'], lang)) if champs else df
+        return collection_geojson(df_carte, champs or (), avec_id=not champs)
+    
+    return geojson_en_cache(st.session_state.db, cle + (lang, champs), construire)
+
+
 def afficher_carte_generale():
     """Affiche la carte avec tous les logements"""
-    df = st.session_state.db.lire_tous()
+    lang = st.session_state.lang
+    mode_carte, details_au_clic = choisir_mode_carte(lang, 'mode_carte_generale')
+    df = st.session_state.db.lire_tous(colonnes=COLONNES_MARQUEURS if details_au_clic else COLONNES_CARTE)
     
     if df.empty:
-        st.warning(t('no_data', st.session_state.lang))
+        st.warning(t('no_data', lang))
         return
     
-    # Créer la carte centrée sur Nouakchott
-    m = folium.Map(
-        location=[18.0735, -15.9582],
-        zoom_start=12,
-        tiles='OpenStreetMap'
-    )
-    
-    # Couleurs par îlot
-    couleurs_ilot = {
-        'A': 'red', 'B': 'blue', 'C': 'green', 'D': 'purple',
-        'E': 'orange', 'F': 'darkred', 'G': 'lightred', 'H': 'beige',
-        'I': 'pink', 'J': 'lightblue', 'K': 'darkgreen', 'L': 'cadetblue'
+    champs = None if details_au_clic else {
+        'nom_affectaire': 'Affectaire', 'profession': 'Profession', 'departement': 'Département',
+        'telephone': 'Téléphone', 'nni': 'NNI', 'en_activite': 'En activité',
     }
     
-    # Ajouter les marqueurs
-    for idx, row in df.iterrows():
-        try:
-            lat = float(get_safe_value(row, 'latitude', 18.0735))
-            lon = float(get_safe_value(row, 'longitude', -15.9582))
-            
-            if pd.notna(lat) and pd.notna(lon):
-                popup_html = f"""
-                <div style='min-width: 200px'>
-                    <h4>🏠 {get_safe_value(row, 'ilot')}-{get_safe_value(row, 'logement')}</h4>
-                    <hr>
-                    <b>Affectaire:</b> {get_safe_value(row, 'nom_affectaire', 'N/A')}<br>
-                    <b>Profession:</b> {get_safe_value(row, 'profession', 'N/A')}<br>
-                    <b>Département:</b> {get_safe_value(row, 'departement', 'N/A')}<br>
-                    <b>Téléphone:</b> {get_safe_value(row, 'telephone', 'N/A')}<br>
-                    <b>NNI:</b> {get_safe_value(row, 'nni', 'N/A')}<br>
-                    <b>En activité:</b> {afficher_valeur_activite(get_safe_value(row, 'en_activite'), st.session_state.lang)}
-                </div>
-                """
-                
-                couleur = couleurs_ilot.get(get_safe_value(row, 'ilot', ''), 'gray')
-                
-                folium.Marker(
-                    location=[lat, lon],
-                    popup=folium.Popup(popup_html, max_width=300),
-                    tooltip=f"{get_safe_value(row, 'ilot')}-{get_safe_value(row, 'logement')}: {get_safe_value(row, 'nom_affectaire')}",
-                    icon=folium.Icon(color=couleur, icon='home', prefix='fa')
-                ).add_to(m)
-        except Exception as e:
-            continue
+    # Au-delà du seuil, les marqueurs sont créés et regroupés par le navigateur
+    mode = mode_effectif(len(df), mode_carte)
+    collection = collection_carte(df, ('carte_generale',), champs, lang) if mode == 'individuel' else None
+    m, mode = carte_logements(df, champs, zoom_start=12, mode=mode, collection=collection)
+    if mode == 'regroupe':
+        st.caption(f"📍 {len(df)} " + t('clustered_info', lang).format(seuil=SEUIL_REGROUPEMENT))
     
     # Afficher la carte
-    st_folium(m, width=1200, height=600)
+    afficher_carte(m, lang, 'carte_generale', details_au_clic, height=600)
+
+
+def afficher_tableau_carte(df):
+    """Affiche les détails des logements sous la carte"""
+    st.subheader("📋 Détails des logements affichés")
+    colonnes_affichage = ['ilot', 'logement', 'nom_affectaire', 'profession', 
+                         'departement', 'telephone', 'en_activite']
+    colonnes_disponibles = [col for col in colonnes_affichage if col in df.columns]
+    st.dataframe(df[colonnes_disponibles], use_container_width=True)
 
 
 def page_carte_filtree():
@@ -876,11 +792,12 @@ def page_carte_filtree():
         filtre_ilot = st.selectbox("Filtrer par " + t('ilot', lang), ilots)
     
     with col2:
-        depts = [t('all', lang)] + st.session_state.db.obtenir_valeurs_uniques('departement')
+        ilot_choisi = filtre_ilot if filtre_ilot != t('all', lang) else None
+        depts = [t('all', lang)] + st.session_state.db.obtenir_valeurs_uniques('departement', ilot=ilot_choisi)
         filtre_dept = st.selectbox("Filtrer par " + t('departement', lang), depts)
     
     with col3:
-        profs = [t('all', lang)] + st.session_state.db.obtenir_valeurs_uniques('profession')
+        profs = [t('all', lang)] + st.session_state.db.obtenir_valeurs_uniques('profession', ilot=ilot_choisi)
         filtre_prof = st.selectbox("Filtrer par " + t('profession', lang), profs)
     
     # Construire les filtres
@@ -892,65 +809,63 @@ def page_carte_filtree():
     if filtre_prof != t('all', lang):
         filtres['profession'] = filtre_prof
     
-    df = st.session_state.db.lire_tous(filtres)
-    df = nettoyer_dataframe(df, lang)
+    moteurs = {t('engine_leaflet', lang): 'leaflet', t('engine_webgl', lang): 'webgl'}
+    moteur = moteurs[st.radio(t('map_engine', lang), list(moteurs), horizontal=True, key='carte_filtree_moteur')]
+    if moteur == 'webgl':
+        # Nuage de points WebGL : tous les logements filtrés, sans marqueurs Leaflet
+        df = st.session_state.db.lire_tous(filtres, colonnes=COLONNES_CARTE)
+        st.info(f"📍 {len(df)} logements sur la carte")
+        if df.empty:
+            st.warning(t('no_housing', lang))
+            return
+        survol = {'nom_affectaire': 'Affectaire', 'profession': 'Profession', 'departement': 'Département'}
+        st.plotly_chart(figure_webgl(df, survol, zoom=13), use_container_width=True)
+        afficher_tableau_carte(nettoyer_dataframe(df, lang))
+        return
     
-    st.info(f"📍 {len(df)} logements sur la carte")
+    mode_carte, details_au_clic = choisir_mode_carte(lang, 'mode_carte_filtree')
+    suivre_zone = st.checkbox(t('viewport', lang), value=True, key='carte_filtree_zone')
+    
+    centre, zoom, zone = vue_depuis_retour(st.session_state.get('carte_filtree'), zoom_defaut=13)
+    if suivre_zone:
+        # Seuls les logements de la zone affichée sont lus, par l'index spatial
+        df = st.session_state.db.lire_dans_zone(zone, filtres, limite=MAX_MARQUEURS_ZONE, colonnes=COLONNES_CARTE)
+        total = df.attrs.get('total', len(df))
+        st.info(f"📍 {total} " + t('in_view', lang))
+    else:
+        df = st.session_state.db.lire_tous(filtres, colonnes=COLONNES_CARTE)
+        total = len(df)
+        st.info(f"📍 {total} logements sur la carte")
+    # Positions lues avant nettoyage : une coordonnée absente n'y devient pas 0
+    df_carte = df
+    df = nettoyer_dataframe(df, lang)
     
     # Créer la carte
-    if not df.empty:
-        m = folium.Map(
-            location=[18.0735, -15.9582],
-            zoom_start=13,
-            tiles='OpenStreetMap'
-        )
-        
-        couleurs_ilot = {
-            'A': 'red', 'B': 'blue', 'C': 'green', 'D': 'purple',
-            'E': 'orange', 'F': 'darkred', 'G': 'lightred', 'H': 'beige'
+    if not df.empty or suivre_zone:
+        champs = None if details_au_clic else {
+            'nom_affectaire': 'Affectaire', 'nni': 'NNI', 'profession': 'Profession', 'fonction': 'Fonction',
+            'departement': 'Département', 'telephone': 'Téléphone', 'en_activite': 'En activité',
         }
         
-        for idx, row in df.iterrows():
-            try:
-                lat = float(get_safe_value(row, 'latitude', 18.0735))
-                lon = float(get_safe_value(row, 'longitude', -15.9582))
-                
-                if pd.notna(lat) and pd.notna(lon):
-                    popup_html = f"""
-                    <div style='min-width: 250px'>
-                        <h4 style='color: #1f77b4'>🏠 Logement {get_safe_value(row, 'ilot')}-{get_safe_value(row, 'logement')}</h4>
-                        <hr>
-                        <table style='width: 100%'>
-                            <tr><td><b>Affectaire:</b></td><td>{get_safe_value(row, 'nom_affectaire', 'N/A')}</td></tr>
-                            <tr><td><b>NNI:</b></td><td>{get_safe_value(row, 'nni', 'N/A')}</td></tr>
-                            <tr><td><b>Profession:</b></td><td>{get_safe_value(row, 'profession', 'N/A')}</td></tr>
-                            <tr><td><b>Fonction:</b></td><td>{get_safe_value(row, 'fonction', 'N/A')}</td></tr>
-                            <tr><td><b>Département:</b></td><td>{get_safe_value(row, 'departement', 'N/A')}</td></tr>
-                            <tr><td><b>Téléphone:</b></td><td>{get_safe_value(row, 'telephone', 'N/A')}</td></tr>
-                            <tr><td><b>En activité:</b></td><td>{get_safe_value(row, 'en_activite', 'N/A')}</td></tr>
-                        </table>
-                    </div>
-                    """
-                    
-                    couleur = couleurs_ilot.get(get_safe_value(row, 'ilot', ''), 'gray')
-                    
-                    folium.Marker(
-                        location=[lat, lon],
-                        popup=folium.Popup(popup_html, max_width=350),
-                        tooltip=f"{get_safe_value(row, 'ilot')}-{get_safe_value(row, 'logement')}: {get_safe_value(row, 'nom_affectaire')}",
-                        icon=folium.Icon(color=couleur, icon='home', prefix='fa')
-                    ).add_to(m)
-            except Exception:
-                continue
-        
-        st_folium(m, width=1200, height=700)
-        
-        # Afficher les détails sous la carte
-        st.subheader("📋 Détails des logements affichés")
-        colonnes_affichage = ['ilot', 'logement', 'nom_affectaire', 'profession', 
-                             'departement', 'telephone', 'en_activite']
-        colonnes_disponibles = [col for col in colonnes_affichage if col in df.columns]
-        st.dataframe(df[colonnes_disponibles], use_container_width=True)
+        tronque = suivre_zone and total > len(df)
+        if tronque:
+            df_carte = df_carte.iloc[0:0]
+        mode = mode_effectif(len(df_carte), mode_carte)
+        collection = None
+        if mode == 'individuel' and not tronque:
+            cle = ('carte_filtree', tuple(sorted(filtres.items())), zone if suivre_zone else None)
+            collection = collection_carte(df_carte, cle, champs, lang)
+        m, mode = carte_logements(df_carte, champs, zoom_start=zoom, mode=mode, max_width=350,
+                                  centre=centre, collection=collection)
+        if tronque:
+            # Trop de logements dans la zone : effectifs par case au lieu des marqueurs
+            ajouter_effectifs(m, st.session_state.db.compter_dans_zone(zone, filtres))
+            st.caption(t('zone_aggregated', lang).format(maximum=MAX_MARQUEURS_ZONE))
+        elif mode == 'regroupe':
+            st.caption(t('clustered_info', lang).format(seuil=SEUIL_REGROUPEMENT).capitalize())
+        
+        afficher_carte(m, lang, 'carte_filtree', details_au_clic, height=700, suivre_zone=suivre_zone)
+        afficher_tableau_carte(df)
     else:
         st.warning(t('no_housing', lang))
 
@@ -968,26 +883,61 @@ def page_import_export():
         
         uploaded_file = st.file_uploader("Choisir un fichier Excel", type=['xlsx', 'xls'])
         
+        mode_import = st.radio(
+            "Mode d'import",
+            ["remplacer", "fusion"],
+            format_func=lambda x: "Tout remplacer" if x == "remplacer" else "Mise à jour incrémentale (îlot + logement)"
+        )
+        supprimer_absents = st.checkbox(
+            "Supprimer les logements absents du fichier",
+            disabled=mode_import != "fusion"
+        )
+        forcer_import = st.checkbox("Forcer l'import même si le fichier est inchangé")
+        
+        derniere = st.session_state.db.derniere_importation()
+        if derniere:
+            st.caption(f"Dernier import : {derniere['timestamp']} — {os.path.basename(derniere['chemin'])} "
+                       f"({derniere['mode']}) — {derniere['details']}")
+        
         if uploaded_file is not None:
+            if mode_import == "fusion" and st.button("Aperçu des changements"):
+                fd, temp_path = tempfile.mkstemp(suffix='.xlsx')
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        f.write(uploaded_file.getvalue())
+                    resultat = st.session_state.db.synchroniser_depuis_excel(
+                        supprimer_absents=supprimer_absents, simulation=True, chemin=temp_path
+                    )
+                    st.info(resultat['message'])
+                finally:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+            
             if st.button("Importer les données"):
                 try:
-                    # Créer un fichier temporaire dans le répertoire temp du système
-                    temp_dir = tempfile.gettempdir()
-                    temp_path = os.path.join(temp_dir, 'temp_import.xlsx')
+                    # Créer un fichier temporaire propre à la session (la base est partagée)
+                    fd, temp_path = tempfile.mkstemp(suffix='.xlsx')
                     
                     # Sauvegarder le fichier temporairement
-                    with open(temp_path, 'wb') as f:
+                    with os.fdopen(fd, 'wb') as f:
                         f.write(uploaded_file.getvalue())
                     
-                    # Mettre à jour le chemin et importer
-                    st.session_state.db.excel_path = temp_path
-                    count, message = st.session_state.db.importer_depuis_excel()
+                    # Importer depuis le fichier temporaire
+                    count, message = st.session_state.db.importer_depuis_excel(
+                        mode=mode_import, supprimer_absents=supprimer_absents, force=forcer_import,
+                        chemin=temp_path
+                    )
                     
                     # Nettoyer le fichier temporaire
                     if os.path.exists(temp_path):
                         os.remove(temp_path)
                     
-                    if count > 0:
+                    if st.session_state.db.statistiques_import.get('ignore'):
+                        st.info(message)
+                    elif mode_import == "fusion" and not message.startswith("✗"):
+                        st.success(message)
+                        st.session_state.data_loaded = True
+                    elif count > 0:
                         st.success(t('import_success', lang) + f": {count} logements")
                         st.session_state.data_loaded = True
                         st.balloons()
@@ -1052,21 +1002,117 @@ def page_import_export():
     
     with col3:
         st.metric("Départements différents", len(stats.get('par_departement', {})))
+    
+    if st.button("🔎 Vérifier les statistiques"):
+        verification = st.session_state.db.verifier_statistiques()
+        if verification['coherent']:
+            st.success("Statistiques cohérentes avec les données")
+        else:
+            st.warning(f"Écarts corrigés : {', '.join(verification['ecarts'])}")
+    
+    with st.expander("🔌 Connexions à la base de données"):
+        metriques = st.session_state.db.metriques_pool()
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Lecteurs en cours", f"{metriques['lecteurs_en_cours']} / {metriques['lecteurs_max']}")
+        with col2:
+            st.metric("Emprunts", metriques['emprunts_lecture'] + metriques['emprunts_ecriture'])
+        with col3:
+            st.metric("Attente moyenne", f"{metriques['attente_moyenne_s'] * 1000:.1f} ms")
+        with col4:
+            st.metric("Attente max", f"{metriques['attente_max_s'] * 1000:.1f} ms")
+        
+        cache = st.session_state.db.metriques_cache()
+        if cache:
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Cache : succès", cache['succes'])
+            with col2:
+                st.metric("Cache : échecs", cache['echecs'])
+            with col3:
+                st.metric("Taux de succès", f"{cache['taux_succes']:.0%}")
+            with col4:
+                st.metric("Taille du cache", f"{cache['taille_octets'] / 1e6:.1f} / {cache['taille_max_octets'] / 1e6:.0f} Mo")
 
 
 def page_historique():
-    """Page d'historique des modifications"""
+    """Page d'historique des modifications (filtres, pages par curseur, archivage)"""
     lang = st.session_state.lang
     
     st.markdown(f"<div class='main-header'>{t('history', lang)}</div>", unsafe_allow_html=True)
     
-    df_historique = st.session_state.db.obtenir_historique(limit=100)
+    with st.expander(t('filters', lang), expanded=True):
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            actions = [t('all', lang)] + ACTIONS_HISTORIQUE
+            action = st.selectbox(t('history_action', lang), actions)
+        with col2:
+            utilisateur = st.text_input(t('history_user', lang))
+        with col3:
+            debut = st.date_input(t('date_from', lang), value=None)
+        with col4:
+            fin = st.date_input(t('date_to', lang), value=None)
+    
+    filtres = {
+        'action': action if action != t('all', lang) else None,
+        'utilisateur': utilisateur.strip() or None,
+        'debut': debut.isoformat() if debut else None,
+        'fin': fin.isoformat() if fin else None,
+    }
+    taille_page = 100
+    
+    # Revenir à la première page quand les filtres changent
+    signature = tuple(sorted(filtres.items()))
+    if st.session_state.get('historique_signature') != signature:
+        st.session_state.historique_signature = signature
+        st.session_state.historique_curseurs = [None]
+    numero_page = len(st.session_state.historique_curseurs) - 1
+    
+    df_historique = st.session_state.db.obtenir_historique(
+        limit=taille_page, apres=st.session_state.historique_curseurs[-1], **filtres)
+    curseur_suivant = df_historique.attrs.get('curseur_suivant')
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("◀ " + t('previous', lang), disabled=(numero_page == 0)):
+            st.session_state.historique_curseurs.pop()
+            st.rerun()
+    with col2:
+        st.caption(f"Page {numero_page + 1}")
+    with col3:
+        if st.button(t('next', lang) + " ▶", disabled=(curseur_suivant is None)):
+            st.session_state.historique_curseurs.append(curseur_suivant)
+            st.rerun()
     
     if not df_historique.empty:
         df_historique = nettoyer_dataframe(df_historique, lang)
         st.dataframe(df_historique, use_container_width=True, height=600)
     else:
         st.info(t('no_data', lang))
+    
+    with st.expander(t('state_at', lang)):
+        col1, col2 = st.columns(2)
+        with col1:
+            logement_id = st.number_input("ID", min_value=1, step=1)
+        with col2:
+            date_etat = st.date_input(t('state_date', lang))
+        if st.button(t('show_state', lang)):
+            etat = st.session_state.db.etat_au(int(logement_id), date_etat.isoformat())
+            if etat:
+                valeurs = {colonne: '-' if valeur is None else str(valeur) for colonne, valeur in etat.items()}
+                st.dataframe(pd.Series(valeurs, name=date_etat.isoformat()), use_container_width=True)
+            else:
+                st.info(t('state_unknown', lang))
+    
+    with st.expander(t('history_archive', lang)):
+        jours = st.number_input(t('retention_days', lang), min_value=1,
+                                value=int(os.environ.get('LOGEMENTS_HISTORIQUE_RETENTION_JOURS', 365)))
+        if st.button("🗄️ " + t('archive_button', lang)):
+            resultat = st.session_state.db.archiver_historique(jours=int(jours))
+            if resultat.get('erreur'):
+                st.error(resultat['message'])
+            else:
+                st.success(resultat['message'])
 
 
 def preparer_impression(df):
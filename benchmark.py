@@ -0,0 +1,628 @@
+"""
+Script de benchmark pour le système de gestion des logements
+
+Usage:
+    python benchmark.py                      # tous les benchmarks
+    python benchmark.py import_memoire       # un benchmark précis
+    python benchmark.py import_memoire --lignes 50000
+    python benchmark.py lecture_pendant_import --lignes 50000
+    python benchmark.py recherche --lignes 300000
+    python benchmark.py pagination
+    python benchmark.py carte --lignes 100000
+    python benchmark.py zone
+    python benchmark.py webgl --lignes 100000
+    python benchmark.py nettoyage --lignes 100000
+    python benchmark.py lots --lignes 10000
+    python benchmark.py historique
+    python benchmark.py archivage --lignes 500000
+    python benchmark.py etat --lignes 1000000
+"""
+
+import sys
+import os
+import argparse
+import subprocess
+import tempfile
+import time
+
+from database import COLUMN_MAPPING
+
+
+# ============================================
+# DONNÉES SYNTHÉTIQUES
+# ============================================
+
+ILOTS = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'V', 'BMDSB']
+PROFESSIONS = ['INSTITUTEUR', 'MEDECIN', 'INGENIEUR', 'INFIRMIER', 'JURISTE', 'MATRONE']
+DEPARTEMENTS = ['MS', 'MEN', 'MF', 'MJ', 'MHA', 'MI']
+
+
+def ligne_synthetique(i: int) -> list:
+    """Ligne synthétique n°i dans l'ordre des colonnes de logements.xlsx (+ Observations)"""
+    return [
+        ILOTS[i % len(ILOTS)],
+        str(i),
+        str(1000 + i),
+        f"{1 + i % 28:02d}/{1 + i % 12:02d}/{1970 + i % 40}",
+        f"AFFECTAIRE {i}",
+        f"{i % 97:02d} {i % 89:02d} {i % 7}E",
+        f"{i % 100:02d} {i % 91:02d} {i % 83:02d} {i % 71:02d} {i % 61:02d}",
+        PROFESSIONS[i % len(PROFESSIONS)],
+        PROFESSIONS[(i + 1) % len(PROFESSIONS)],
+        DEPARTEMENTS[i % len(DEPARTEMENTS)],
+        f"{i % 50 + 20:02d} {i % 97:02d} {i % 89:02d} {i % 83:02d}",
+        'OUI' if i % 3 == 0 else None,
+        'OUI' if i % 3 == 1 else None,
+        'OUI' if i % 7 == 0 else None,
+        f"REPONDANT {i}",
+        'FILS',
+        f"{i % 50 + 20:02d} {i % 79:02d} {i % 73:02d} {i % 67:02d}",
+        'OUI',
+        None,
+        None,
+    ]
+
+
+def generer_classeur(chemin: str, n: int):
+    """Génère un classeur Excel synthétique de n lignes au format logements.xlsx"""
+    import openpyxl
+    
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Logements")
+    ws.append(list(COLUMN_MAPPING.keys()) + ['Observations'])
+    for i in range(n):
+        ws.append(ligne_synthetique(i))
+    wb.save(chemin)
+
+
+def remplir_base(db, n: int, taille_lot: int = 10000):
+    """Insère n lignes synthétiques directement dans la base (sans passer par Excel)"""
+    from database import INSERT_IMPORT, _convertir_cellule, _typer_import
+    
+    with db.pool.ecriture() as conn:
+        conn.execute("DELETE FROM logements")
+        for debut in range(0, n, taille_lot):
+            lot = []
+            for i in range(debut, min(n, debut + taille_lot)):
+                valeurs = _typer_import([_convertir_cellule(v) for v in ligne_synthetique(i)[:len(COLUMN_MAPPING)]])
+                lot.append(valeurs + (18.07 + (i % 100) / 1000, -15.96 + (i % 97) / 1000, 'Actif', None))
+            conn.executemany(INSERT_IMPORT, lot)
+
+
+def _executer_isole(code: str) -> str:
+    """Exécute du code dans un processus séparé et renvoie sa sortie standard"""
+    resultat = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    return resultat.stdout.strip().splitlines()[-1]
+
+
+# ============================================
+# BENCHMARKS
+# ============================================
+
+def bench_import_memoire(lignes: int = 200000, **options):
+    """Pic de mémoire (RSS) de l'import : DataFrame complet vs lecture en flux"""
+    print(f"\n📏 Pic mémoire de l'import ({lignes} lignes)...")
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        excel_path = os.path.join(dossier, "logements.xlsx")
+        debut = time.perf_counter()
+        generer_classeur(excel_path, lignes)
+        print(f"  ℹ️  Classeur généré en {time.perf_counter() - debut:.1f}s "
+              f"({os.path.getsize(excel_path) / 1e6:.1f} Mo)")
+        
+        for nom, flux in [("DataFrame complet (pd.read_excel)", False), ("Lecture en flux (openpyxl)", True)]:
+            db_path = os.path.join(dossier, f"bench_{flux}.db")
+            sortie = _executer_isole(f"""
+import resource
+from database import LogementDatabase
+db = LogementDatabase(db_path={db_path!r}, excel_path={excel_path!r})
+count, message = db.importer_depuis_excel(flux={flux})
+pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(count, db.statistiques_import['duree'], pic)
+""")
+            count, duree, pic = sortie.split()
+            print(f"  ✅ {nom}: {count} lignes en {float(duree):.1f}s, pic RSS {int(pic) / 1024:.0f} Mo")
+
+
+def bench_lecture_pendant_import(lignes: int = 50000, **options):
+    """Latence des lectures concurrentes pendant un import massif, par profil SQLite"""
+    import threading
+    import statistics
+    from database import LogementDatabase
+    
+    print(f"\n📖 Lectures pendant un import ({lignes} lignes)...")
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        excel_path = os.path.join(dossier, "logements.xlsx")
+        generer_classeur(excel_path, lignes)
+        
+        for profil in ['defaut', 'production']:
+            db = LogementDatabase(db_path=os.path.join(dossier, f"bench_{profil}.db"),
+                                  excel_path=excel_path, profil=profil)
+            db.importer_depuis_excel()
+            
+            import_thread = threading.Thread(target=db.importer_depuis_excel, kwargs={'force': True})
+            latences = []
+            erreurs = 0
+            import_thread.start()
+            while import_thread.is_alive():
+                debut = time.perf_counter()
+                try:
+                    db.lire_logement(1 + len(latences) % lignes)
+                except Exception:
+                    erreurs += 1
+                latences.append((time.perf_counter() - debut) * 1000)
+                time.sleep(0.005)
+            import_thread.join()
+            db.fermer()
+            
+            latences.sort()
+            p95 = latences[min(len(latences) - 1, int(len(latences) * 0.95))]
+            print(f"  ✅ Profil {profil}: {len(latences)} lectures, "
+                  f"p50 {statistics.median(latences):.1f} ms, p95 {p95:.1f} ms, "
+                  f"max {latences[-1]:.1f} ms, {erreurs} erreurs")
+
+
+def bench_recherche(lignes: int = 300000, **options):
+    """Latence de la recherche : LIKE sur six colonnes vs index plein texte, selon la taille"""
+    from database import LogementDatabase
+    
+    like = """
+        SELECT * FROM logements
+        WHERE ilot LIKE ? OR logement LIKE ? OR nom_affectaire LIKE ?
+        OR nni LIKE ? OR profession LIKE ? OR departement LIKE ?
+        ORDER BY ilot, logement
+    """
+    termes = ['4242', 'AFFECTAIRE 4242', 'INGEN']
+    
+    print(f"\n🔍 Recherche plein texte (jusqu'à {lignes} lignes)...")
+    with tempfile.TemporaryDirectory() as dossier:
+        db = LogementDatabase(db_path=os.path.join(dossier, "bench.db"))
+        for n in sorted({min(10000, lignes), min(100000, lignes), lignes}):
+            remplir_base(db, n)
+            for terme in termes:
+                with db.pool.lecture() as conn:
+                    debut = time.perf_counter()
+                    conn.execute(like, [f"%{terme}%"] * 6).fetchall()
+                    duree_like = time.perf_counter() - debut
+                debut = time.perf_counter()
+                page = db.rechercher(terme, taille_page=50)
+                duree_fts = time.perf_counter() - debut
+                # Page suivante par le curseur (sans OFFSET)
+                debut = time.perf_counter()
+                if page.attrs['curseur_suivant'] is not None:
+                    db.rechercher(terme, taille_page=50, apres=page.attrs['curseur_suivant'])
+                duree_suivante = time.perf_counter() - debut
+                print(f"  ✅ {n:>7} lignes, « {terme} » ({page.attrs['total']} résultats) : "
+                      f"LIKE {duree_like * 1000:.1f} ms, FTS5 (page de {len(page)}) {duree_fts * 1000:.1f} ms, "
+                      f"page suivante {duree_suivante * 1000:.1f} ms")
+        db.fermer()
+
+
+def bench_pagination(lignes: int = 300000, **options):
+    """Coût d'affichage de la liste : lecture complète vs une page lue par curseur"""
+    from database import LogementDatabase
+    
+    print(f"\n📄 Pagination de la liste (jusqu'à {lignes} lignes)...")
+    with tempfile.TemporaryDirectory() as dossier:
+        db = LogementDatabase(db_path=os.path.join(dossier, "bench.db"))
+        for n in sorted({min(10000, lignes), min(100000, lignes), lignes}):
+            remplir_base(db, n)
+            debut = time.perf_counter()
+            db.lire_tous()
+            duree_complete = time.perf_counter() - debut
+            
+            # Curseur au milieu de la table : une page « profonde »
+            with db.pool.lecture() as conn:
+                milieu = tuple(conn.execute("SELECT ilot, logement, id FROM logements ORDER BY ilot, logement, id "
+                                            "LIMIT 1 OFFSET ?", (n // 2,)).fetchone())
+            durees = []
+            for apres in (None, milieu):
+                debut = time.perf_counter()
+                page = db.lire_tous(taille_page=50, apres=apres)
+                durees.append(time.perf_counter() - debut)
+            print(f"  ✅ {n:>7} lignes : lecture complète {duree_complete * 1000:.0f} ms, "
+                  f"page de {len(page)} {durees[0] * 1000:.1f} ms (1re) / {durees[1] * 1000:.1f} ms (milieu), "
+                  f"total {page.attrs['total']}")
+        db.fermer()
+
+
+def bench_carte(lignes: int = 100000, **options):
+    """Carte : taille du HTML et temps de construction, pop-ups embarquées ou détails au clic"""
+    from database import LogementDatabase
+    from carte import carte_logements, collection_geojson, geojson_en_cache, COLONNES_CARTE, COLONNES_MARQUEURS
+    
+    # Mêmes champs que la pop-up de la carte filtrée
+    champs = {colonne: colonne for colonne in COLONNES_CARTE[2:9]}
+    
+    print(f"\n🗺️  Carte des logements (jusqu'à {lignes} points)...")
+    with tempfile.TemporaryDirectory() as dossier:
+        db = LogementDatabase(db_path=os.path.join(dossier, "bench.db"), taille_cache=256 * 1024 * 1024)
+        for n in sorted({min(1000, lignes), min(10000, lignes), lignes}):
+            remplir_base(db, n)
+            for mode, details_au_clic in [('individuel', False), ('individuel', True),
+                                          ('regroupe', False), ('regroupe', True)]:
+                db.cache.vider()
+                debut = time.perf_counter()
+                df = db.lire_tous(colonnes=COLONNES_MARQUEURS if details_au_clic else COLONNES_CARTE)
+                carte, _ = carte_logements(df, None if details_au_clic else champs, mode=mode)
+                page = carte.get_root().render()
+                duree = time.perf_counter() - debut
+                libelle = f"{mode}{', détails au clic' if details_au_clic else ''}"
+                print(f"  ✅ {n:>7} points, {libelle:<29} : HTML {len(page.encode()) / 1e6:.2f} Mo, "
+                      f"lecture et construction {duree * 1000:.0f} ms")
+            
+            # Couche GeoJSON servie par le cache tant que les données ne changent pas
+            df = db.lire_tous(colonnes=COLONNES_CARTE)
+            durees = []
+            for _ in range(2):
+                debut = time.perf_counter()
+                geojson_en_cache(db, ('bench', n), lambda: collection_geojson(df, champs))
+                durees.append(time.perf_counter() - debut)
+            print(f"  ✅ {n:>7} points, couche GeoJSON : construction {durees[0] * 1000:.1f} ms, "
+                  f"cache {durees[1] * 1000:.2f} ms")
+        db.fermer()
+
+
+def bench_zone(lignes: int = 100000, **options):
+    """Carte filtrée : lecture complète vs lecture de la zone affichée (index R*Tree)"""
+    from database import LogementDatabase
+    from carte import COLONNES_CARTE, MAX_MARQUEURS_ZONE
+    
+    print(f"\n🧭 Lecture de la zone affichée ({lignes} lignes)...")
+    with tempfile.TemporaryDirectory() as dossier:
+        db = LogementDatabase(db_path=os.path.join(dossier, "bench.db"), taille_cache=0)
+        remplir_base(db, lignes)
+        debut = time.perf_counter()
+        db.lire_tous(colonnes=COLONNES_CARTE)
+        duree_complete = time.perf_counter() - debut
+        # Positions synthétiques sur 0,1° × 0,1° : zones d'un quart puis d'un centième de la surface
+        for nom, zone in [("quart", (18.07, -15.96, 18.12, -15.91)), ("centième", (18.07, -15.96, 18.08, -15.95))]:
+            debut = time.perf_counter()
+            df = db.lire_dans_zone(zone, limite=MAX_MARQUEURS_ZONE, colonnes=COLONNES_CARTE)
+            if df.attrs['total'] > len(df):
+                db.compter_dans_zone(zone)
+            duree = time.perf_counter() - debut
+            print(f"  ✅ Zone {nom} : {df.attrs['total']} logements, {len(df)} lus en {duree * 1000:.0f} ms "
+                  f"(lecture complète {duree_complete * 1000:.0f} ms)")
+        db.fermer()
+
+
+def bench_webgl(lignes: int = 100000, **options):
+    """Carte WebGL (plotly) : construction de la figure et sérialisation envoyée au navigateur"""
+    from database import LogementDatabase
+    from carte import figure_webgl, COLONNES_CARTE
+    
+    survol = {'nom_affectaire': 'Affectaire', 'profession': 'Profession', 'departement': 'Département'}
+    print(f"\n🌐 Carte WebGL (jusqu'à {lignes} points)...")
+    with tempfile.TemporaryDirectory() as dossier:
+        db = LogementDatabase(db_path=os.path.join(dossier, "bench.db"), taille_cache=0)
+        for n in sorted({min(1000, lignes), min(10000, lignes), lignes}):
+            remplir_base(db, n)
+            df = db.lire_tous(colonnes=COLONNES_CARTE)
+            debut = time.perf_counter()
+            figure = figure_webgl(df, survol)
+            duree_figure = time.perf_counter() - debut
+            debut = time.perf_counter()
+            json_figure = figure.to_json()
+            duree_json = time.perf_counter() - debut
+            print(f"  ✅ {n:>7} points : figure {duree_figure * 1000:.0f} ms, JSON {len(json_figure) / 1e6:.2f} Mo "
+                  f"en {duree_json * 1000:.0f} ms")
+        db.fermer()
+
+
+def _nettoyer_cellule_par_cellule(df, lang='fr'):
+    """Ancien nettoyer_dataframe (copie complète, apply cellule par cellule), pour comparaison"""
+    from affichage import afficher_valeur_activite
+    
+    df_clean = df.copy()
+    for col in df_clean.columns:
+        if col in ['en_activite', 'a_la_retraite', 'decede']:
+            df_clean[col] = df_clean[col].apply(lambda x: afficher_valeur_activite(x, lang))
+        elif df_clean[col].dtype == 'object':
+            df_clean[col] = df_clean[col].fillna('-').replace('', '-')
+        elif df_clean[col].dtype in ['float64', 'int64']:
+            df_clean[col] = df_clean[col].fillna(0)
+    return df_clean
+
+
+def bench_nettoyage(lignes: int = 100000, **options):
+    """Préparation des tableaux pour l'affichage : nettoyer_dataframe vectorisé vs cellule par cellule"""
+    from database import LogementDatabase
+    from affichage import nettoyer_dataframe
+    
+    print(f"\n🧹 Nettoyage pour l'affichage ({lignes} lignes)...")
+    with tempfile.TemporaryDirectory() as dossier:
+        db = LogementDatabase(db_path=os.path.join(dossier, "bench.db"), taille_cache=0)
+        remplir_base(db, lignes)
+        df = db.lire_tous()
+        db.fermer()
+    
+    durees = {}
+    for nom, nettoyer in [("cellule par cellule", _nettoyer_cellule_par_cellule), ("vectorisé", nettoyer_dataframe)]:
+        debut = time.perf_counter()
+        resultat = nettoyer(df)
+        durees[nom] = time.perf_counter() - debut
+        print(f"  ✅ {nom:<20} : {durees[nom] * 1000:.0f} ms")
+    assert resultat.equals(_nettoyer_cellule_par_cellule(df)), "résultats différents"
+    print(f"  ✅ Résultats identiques, gain x{durees['cellule par cellule'] / durees['vectorisé']:.1f}")
+
+
+def bench_lots(lignes: int = 10000, **options):
+    """Réaffectation puis suppression d'un îlot : une transaction par logement vs une par lot"""
+    from database import LogementDatabase
+    
+    print(f"\n📦 Opérations sur un îlot entier ({lignes} lignes)...")
+    with tempfile.TemporaryDirectory() as dossier:
+        db = LogementDatabase(db_path=os.path.join(dossier, "bench.db"), taille_cache=0)
+        durees = {}
+        for nom in ["une par logement", "par lot"]:
+            remplir_base(db, lignes)
+            ids = db.lire_tous({'ilot': ILOTS[0]}, colonnes=['ilot'])['id'].tolist()
+            debut = time.perf_counter()
+            if nom == "par lot":
+                db.modifier_logements([{'id': i, 'ilot': 'Z'} for i in ids])
+            else:
+                for i in ids:
+                    db.modifier_logement(i, {'ilot': 'Z'})
+            duree_modification = time.perf_counter() - debut
+            debut = time.perf_counter()
+            if nom == "par lot":
+                db.supprimer_logements(ids)
+            else:
+                for i in ids:
+                    db.supprimer_logement(i)
+            duree_suppression = time.perf_counter() - debut
+            durees[nom] = duree_modification + duree_suppression
+            print(f"  ✅ {nom:<17} : {len(ids)} modifiés en {duree_modification * 1000:.0f} ms, "
+                  f"supprimés en {duree_suppression * 1000:.0f} ms")
+        db.fermer()
+    print(f"  ✅ Gain x{durees['une par logement'] / durees['par lot']:.1f}")
+
+
+def bench_historique(lignes: int = 10000, **options):
+    """Modifications unitaires (historique dans la même transaction) et historique immédiat vs différé"""
+    from database import LogementDatabase
+    
+    print(f"\n📜 Historique ({lignes} lignes)...")
+    for profil in ['defaut', 'production']:
+        for nom, lot_historique in [("immédiat", 0), ("différé", 500)]:
+            with tempfile.TemporaryDirectory() as dossier:
+                db = LogementDatabase(db_path=os.path.join(dossier, "bench.db"), profil=profil,
+                                      taille_cache=0, lot_historique=lot_historique)
+                remplir_base(db, lignes)
+                debut = time.perf_counter()
+                for i in range(1, 1001):
+                    db.modifier_logement(i, {'ilot': 'Z'})
+                duree_modification = time.perf_counter() - debut
+                debut = time.perf_counter()
+                for i in range(2000):
+                    db.ajouter_historique(None, "EXPORT", f"export {i}", "Système")
+                duree_ajout = time.perf_counter() - debut
+                db.fermer()
+                duree_fermeture = time.perf_counter() - debut
+            print(f"  ✅ {profil:<10} {nom:<8} : 1000 modifications en {duree_modification * 1000:.0f} ms, "
+                  f"2000 entrées en {duree_ajout * 1000:.0f} ms ({duree_fermeture * 1000:.0f} ms avec la fermeture)")
+
+
+def remplir_historique(db, n: int, taille_lot: int = 50000):
+    """Insère n entrées d'historique synthétiques réparties sur quatre ans"""
+    from database import INSERT_HISTORIQUE
+    
+    actions = ['CREATE', 'UPDATE', 'DELETE', 'IMPORT']
+    with db.pool.ecriture() as conn:
+        for debut in range(0, n, taille_lot):
+            conn.executemany(INSERT_HISTORIQUE, [
+                (i % 5000, actions[i % len(actions)], f'{{"ilot": "{ILOTS[i % len(ILOTS)]}", "logement": "{i}"}}',
+                 'Utilisateur' if i % 5 else 'Système',
+                 time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(1577836800 + i * 4 * 365 * 86400 // n)))
+                for i in range(debut, min(n, debut + taille_lot))])
+
+
+def bench_archivage(lignes: int = 500000, **options):
+    """Historique volumineux : pages par OFFSET vs par curseur, filtres, archivage et espace récupéré"""
+    from database import LogementDatabase
+    
+    print(f"\n🗄️  Historique volumineux ({lignes} entrées)...")
+    with tempfile.TemporaryDirectory() as dossier:
+        chemin = os.path.join(dossier, "bench.db")
+        db = LogementDatabase(db_path=chemin, taille_cache=0, lot_historique=0)
+        remplir_historique(db, lignes)
+        
+        # Dernière page sur 100 : OFFSET parcourt toutes les lignes sautées, le curseur part de l'index
+        saut = lignes - 100
+        with db.pool.lecture() as conn:
+            debut = time.perf_counter()
+            conn.execute("SELECT * FROM historique ORDER BY timestamp DESC LIMIT 100 OFFSET ?", (saut,)).fetchall()
+            duree_offset = time.perf_counter() - debut
+            curseur = tuple(conn.execute("SELECT timestamp, id FROM historique ORDER BY timestamp DESC, id DESC "
+                                         "LIMIT 1 OFFSET ?", (saut - 1,)).fetchone())
+        debut = time.perf_counter()
+        page = db.obtenir_historique(limit=100, apres=curseur)
+        duree_curseur = time.perf_counter() - debut
+        print(f"  ✅ Dernière page : OFFSET {duree_offset * 1000:.1f} ms, curseur {duree_curseur * 1000:.1f} ms "
+              f"({len(page)} lignes)")
+        
+        debut = time.perf_counter()
+        page = db.obtenir_historique(limit=100, action='DELETE', utilisateur=None, debut='2021-06-01', fin='2021-06-30')
+        print(f"  ✅ Filtre action + mois : {len(page)} lignes en {(time.perf_counter() - debut) * 1000:.1f} ms")
+        
+        taille = os.path.getsize(chemin)
+        debut = time.perf_counter()
+        resultat = db.archiver_historique(avant='2023-01-01')
+        duree = time.perf_counter() - debut
+        db.fermer()
+        print(f"  ✅ Archivage : {resultat['archivees']} entrées en {duree:.1f} s, base {taille / 1e6:.1f} Mo "
+              f"→ {os.path.getsize(chemin) / 1e6:.1f} Mo ({resultat['pages_liberees']} pages rendues)")
+
+
+def remplir_modifications(db, n: int, intervalle: int, echantillons: int = 500, taille_lot: int = 50000) -> list:
+    """Insère n entrées UPDATE synthétiques (mêmes formats que modifier_logement) et leurs instantanés
+    
+    Renvoie des échantillons (logement_id, horodatage, état attendu) pour vérifier etat_au.
+    """
+    import json
+    import random
+    from database import INSERT_INSTANTANE
+    
+    rng = random.Random(0)
+    with db.pool.lecture() as conn:
+        etats = {ligne['id']: dict(ligne) for ligne in conn.execute("SELECT * FROM logements")}
+    ids = list(etats)
+    champs = {
+        'profession': PROFESSIONS,
+        'departement': DEPARTEMENTS,
+        'fonction': PROFESSIONS,
+        'en_activite': [0, 1, None],
+        'statut': ['Actif', 'Inactif'],
+        'telephone': [f"{i:02d} 45 67 89" for i in range(20, 50)],
+    }
+    debut_s, pas_s = 1577836800, 4 * 365 * 86400 / n
+    depuis = {}
+    a_echantillonner = set(rng.sample(range(n), min(echantillons, n)))
+    resultat = []
+    entrees, instantanes = [], []
+    
+    def ecrire():
+        with db.pool.ecriture() as conn:
+            conn.executemany("INSERT INTO historique (id, logement_id, action, details, utilisateur, timestamp) "
+                             "VALUES (?, ?, 'UPDATE', ?, 'Utilisateur', ?)", entrees)
+            conn.executemany(INSERT_INSTANTANE, instantanes)
+        entrees.clear()
+        instantanes.clear()
+    
+    for k in range(n):
+        historique_id = k + 1
+        logement_id = rng.choice(ids)
+        etat = etats[logement_id]
+        horodatage = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(debut_s + k * pas_s))
+        if logement_id not in depuis:
+            # Premier changement : instantané de l'état précédent
+            instantanes.append((logement_id, 1, json.dumps(etat, ensure_ascii=False), historique_id))
+            depuis[logement_id] = 0
+        differences = {}
+        for champ in rng.sample(list(champs), rng.choice([1, 1, 2])):
+            valeur = rng.choice(champs[champ])
+            if valeur != etat[champ]:
+                differences[champ] = [etat[champ], valeur]
+                etat[champ] = valeur
+        etat['updated_at'] = horodatage
+        entrees.append((historique_id, logement_id, json.dumps(differences, ensure_ascii=False), horodatage))
+        depuis[logement_id] += 1
+        if depuis[logement_id] >= intervalle:
+            instantanes.append((logement_id, 0, json.dumps(etat, ensure_ascii=False), historique_id))
+            depuis[logement_id] = 0
+        if k in a_echantillonner:
+            resultat.append((logement_id, horodatage, dict(etat)))
+        if len(entrees) >= taille_lot:
+            ecrire()
+    ecrire()
+    return resultat
+
+
+def bench_etat(lignes: int = 1000000, **options):
+    """État d'un logement à une date : différences par champ + instantanés vs formulaire complet"""
+    import json
+    from database import LogementDatabase
+    
+    logements, intervalle = 10000, 20
+    print(f"\n🕰️  État à une date ({lignes} entrées UPDATE sur {logements} logements)...")
+    with tempfile.TemporaryDirectory() as dossier:
+        db = LogementDatabase(db_path=os.path.join(dossier, "bench.db"), taille_cache=0, lot_historique=0)
+        remplir_base(db, logements)
+        debut = time.perf_counter()
+        echantillons = remplir_modifications(db, lignes, intervalle)
+        print(f"  ✅ Historique synthétique écrit en {time.perf_counter() - debut:.1f} s")
+        
+        with db.pool.lecture() as conn:
+            differences, entrees = conn.execute("SELECT SUM(LENGTH(details)), COUNT(*) FROM historique").fetchone()
+            etats, instantanes = conn.execute(
+                "SELECT SUM(LENGTH(etat)), COUNT(*) FROM historique_instantanes").fetchone()
+            # Ancien format : le formulaire complet (champs de la page de modification) à chaque entrée
+            formulaire = conn.execute("SELECT * FROM logements LIMIT 1").fetchone()
+        taille_formulaire = len(json.dumps({k: formulaire[k] for k in formulaire.keys()
+                                            if k not in ('id', 'created_at', 'updated_at', 'hash_import')},
+                                           ensure_ascii=False))
+        print(f"  ✅ Stockage : différences {differences / 1e6:.1f} Mo ({differences / entrees:.0f} o/entrée) "
+              f"+ {instantanes} instantanés {etats / 1e6:.1f} Mo, contre {taille_formulaire * entrees / 1e6:.1f} Mo "
+              f"pour le formulaire complet ({taille_formulaire} o/entrée)")
+        
+        durees = []
+        for logement_id, horodatage, attendu in echantillons:
+            debut = time.perf_counter()
+            etat = db.etat_au(logement_id, horodatage)
+            durees.append(time.perf_counter() - debut)
+            assert etat == attendu, (logement_id, horodatage)
+        durees.sort()
+        print(f"  ✅ etat_au sur {len(durees)} échantillons vérifiés : médiane {durees[len(durees) // 2] * 1000:.2f} ms, "
+              f"p95 {durees[int(len(durees) * 0.95)] * 1000:.2f} ms")
+        
+        # Sans instantanés périodiques : rejeu de toutes les entrées depuis le premier état connu
+        durees, rejouees = [], 0
+        with db.pool.lecture() as conn:
+            for logement_id, horodatage, _ in echantillons[::max(1, len(echantillons) // 100)]:
+                debut = time.perf_counter()
+                premier = conn.execute("SELECT historique_id, etat FROM historique_instantanes WHERE logement_id = ? "
+                                       "ORDER BY historique_id LIMIT 1", (logement_id,)).fetchone()
+                etat = json.loads(premier['etat'])
+                for (details,) in conn.execute("SELECT details FROM historique WHERE logement_id = ? AND id > ? "
+                                               "AND timestamp <= ? ORDER BY id",
+                                               (logement_id, premier['historique_id'], horodatage)):
+                    for colonne, (_, valeur) in json.loads(details).items():
+                        etat[colonne] = valeur
+                    rejouees += 1
+                durees.append(time.perf_counter() - debut)
+        durees.sort()
+        print(f"  ✅ Rejeu complet sans instantanés périodiques : médiane {durees[len(durees) // 2] * 1000:.2f} ms, "
+              f"p95 {durees[int(len(durees) * 0.95)] * 1000:.2f} ms ({rejouees / len(durees):.0f} entrées rejouées)")
+        db.fermer()
+
+
+BENCHMARKS = {
+    'import_memoire': bench_import_memoire,
+    'lecture_pendant_import': bench_lecture_pendant_import,
+    'recherche': bench_recherche,
+    'pagination': bench_pagination,
+    'carte': bench_carte,
+    'zone': bench_zone,
+    'webgl': bench_webgl,
+    'nettoyage': bench_nettoyage,
+    'lots': bench_lots,
+    'historique': bench_historique,
+    'archivage': bench_archivage,
+    'etat': bench_etat,
+}
+
+
+def main():
+    """Fonction principale des benchmarks"""
+    parser = argparse.ArgumentParser(description="Benchmarks du système de gestion des logements")
+    parser.add_argument('benchmarks', nargs='*', help=f"Benchmarks à exécuter ({', '.join(BENCHMARKS)})")
+    parser.add_argument('--lignes', type=int, help="Nombre de lignes synthétiques")
+    args = parser.parse_args()
+    
+    inconnus = [nom for nom in args.benchmarks if nom not in BENCHMARKS]
+    if inconnus:
+        parser.error(f"benchmark inconnu: {', '.join(inconnus)}")
+    
+    options = {}
+    if args.lignes:
+        options['lignes'] = args.lignes
+    
+    print("=" * 60)
+    print("⏱️  BENCHMARKS DU SYSTÈME DE GESTION DES LOGEMENTS")
+    print("=" * 60)
+    
+    for nom in args.benchmarks or list(BENCHMARKS):
+        BENCHMARKS[nom](**options)
+    
+    print("\n" + "=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""
+Construction des cartes Folium des logements
+Marqueurs individuels (couche GeoJSON) ou regroupés dans le navigateur,
+nuage de points WebGL (plotly) pour les très grands volumes
+"""
+
+import os
+import re
+import html
+import math
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import folium
+from folium.plugins import FastMarkerCluster
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+
+# Centre de Nouakchott
+CENTRE_CARTE = [18.0735, -15.9582]
+
+# Colonnes lues pour les cartes (marqueurs, pop-ups et tableau de détails)
+COLONNES_CARTE = ['ilot', 'logement', 'nom_affectaire', 'nni', 'profession', 'fonction',
+                  'departement', 'telephone', 'en_activite', 'latitude', 'longitude']
+
+# Colonnes suffisantes quand les détails sont lus au clic (id, libellé, position)
+COLONNES_MARQUEURS = ['ilot', 'logement', 'nom_affectaire', 'latitude', 'longitude']
+
+# Couleurs des marqueurs par îlot (palette de folium.Icon)
+COULEURS_ILOT = {
+    'A': 'red', 'B': 'blue', 'C': 'green', 'D': 'purple',
+    'E': 'orange', 'F': 'darkred', 'G': 'lightred', 'H': 'beige',
+    'I': 'pink', 'J': 'lightblue', 'K': 'darkgreen', 'L': 'cadetblue'
+}
+COULEUR_DEFAUT = 'gray'
+
+# Teintes des marqueurs Leaflet.awesome-markers, reprises par la carte WebGL
+COULEURS_WEBGL = {
+    'red': '#d63e2a', 'darkred': '#a23336', 'lightred': '#ff8e7f', 'orange': '#f69730',
+    'beige': '#ffcb92', 'green': '#72b026', 'darkgreen': '#728224', 'lightgreen': '#bbf970',
+    'blue': '#38aadd', 'darkblue': '#0067a3', 'lightblue': '#8adaff', 'cadetblue': '#436978',
+    'purple': '#d252b9', 'darkpurple': '#5b396b', 'pink': '#ff91ea', 'gray': '#575757'
+}
+
+# Au-delà de ce nombre de points, le mode 'auto' regroupe les marqueurs
+SEUIL_REGROUPEMENT = int(os.environ.get('LOGEMENTS_CARTE_SEUIL_REGROUPEMENT', 500))
+
+MODES_CARTE = ('auto', 'individuel', 'regroupe')
+
+# Nombre maximal de marqueurs chargés pour la zone affichée ; au-delà, effectifs par case
+MAX_MARQUEURS_ZONE = int(os.environ.get('LOGEMENTS_CARTE_MAX_MARQUEURS', 2000))
+
+# Marqueur créé dans le navigateur à partir d'une ligne [lat, lon, libellé, n° de couleur]
+# (avec une pop-up reprenant le libellé, sauf si les détails sont lus au clic)
+_PALETTE = list(dict.fromkeys(list(COULEURS_ILOT.values()) + [COULEUR_DEFAUT]))
+_CREER_MARQUEUR = """function (ligne) {
+    var couleurs = %s;
+    var marqueur = L.marker(new L.LatLng(ligne[0], ligne[1]), {
+        icon: L.AwesomeMarkers.icon({icon: 'home', prefix: 'fa', markerColor: couleurs[ligne[3]]})
+    });
+    marqueur.bindTooltip(ligne[2]);
+    %s
+    return marqueur;
+}"""
+_POPUP_LIBELLE = "marqueur.bindPopup('<b>' + ligne[2] + '</b>');"
+
+# Sans pop-up, l'info-bulle se termine par l'id du logement : « A-12: NOM (#345) »
+_ID_INFOBULLE = re.compile(r'\(#(\d+)\)$')
+
+
+def mode_effectif(nombre_points: int, mode: str = 'auto', seuil: int = None) -> str:
+    """Mode de rendu retenu : 'individuel' ou 'regroupe' ('auto' selon le seuil)"""
+    if mode not in MODES_CARTE:
+        raise ValueError(f"Mode de carte inconnu: {mode}")
+    if mode != 'auto':
+        return mode
+    seuil = SEUIL_REGROUPEMENT if seuil is None else seuil
+    return 'regroupe' if nombre_points > seuil else 'individuel'
+
+
+def zone_visible(centre, zoom: int, largeur: int = 1200, hauteur: int = 700) -> Tuple[float, float, float, float]:
+    """Zone (sud, ouest, nord, est) couverte par une carte Web Mercator de largeur × hauteur pixels"""
+    degres_par_pixel = 360 / (256 * 2 ** zoom)
+    demi_lon = largeur / 2 * degres_par_pixel
+    demi_lat = hauteur / 2 * degres_par_pixel * math.cos(math.radians(centre[0]))
+    return (centre[0] - demi_lat, centre[1] - demi_lon, centre[0] + demi_lat, centre[1] + demi_lon)
+
+
+def vue_depuis_retour(retour: Optional[Dict], zoom_defaut: int, hauteur: int = 700):
+    """Centre, zoom et zone (sud, ouest, nord, est) de la vue renvoyée par st_folium
+    
+    Avant le premier retour du navigateur, la vue par défaut est centrée sur
+    Nouakchott et sa zone estimée d'après le zoom.
+    """
+    retour = retour or {}
+    centre = retour.get('center') or {}
+    centre = [centre['lat'], centre['lng']] if 'lat' in centre else list(CENTRE_CARTE)
+    zoom = retour.get('zoom') or zoom_defaut
+    limites = retour.get('bounds') or {}
+    sud_ouest, nord_est = limites.get('_southWest') or {}, limites.get('_northEast') or {}
+    if sud_ouest.get('lat') is not None and nord_est.get('lat') is not None:
+        zone = (sud_ouest['lat'], sud_ouest['lng'], nord_est['lat'], nord_est['lng'])
+    else:
+        zone = zone_visible(centre, zoom, hauteur=hauteur)
+    return centre, zoom, zone
+
+
+def _coordonnees(df: pd.DataFrame) -> pd.DataFrame:
+    """Lignes aux latitude et longitude numériques et plausibles, les autres écartées"""
+    latitude = pd.to_numeric(df['latitude'], errors='coerce')
+    longitude = pd.to_numeric(df['longitude'], errors='coerce')
+    valides = latitude.between(-90, 90) & longitude.between(-180, 180)
+    return df.assign(latitude=latitude, longitude=longitude)[valides]
+
+
+def _texte(df: pd.DataFrame, colonne: str) -> pd.Series:
+    """Colonne convertie en texte, valeurs absentes vides"""
+    if colonne not in df.columns:
+        return pd.Series('', index=df.index)
+    return df[colonne].fillna('').astype(str)
+
+
+def _libelles(df: pd.DataFrame, avec_id: bool = False) -> pd.Series:
+    """Libellé « îlot-logement: affectaire » de chaque ligne, suivi de « (#id) » si demandé"""
+    libelles = _texte(df, 'ilot') + '-' + _texte(df, 'logement') + ': ' + _texte(df, 'nom_affectaire')
+    if avec_id:
+        libelles = libelles + ' (#' + df['id'].astype(int).astype(str) + ')'
+    return libelles
+
+
+def id_depuis_clic(retour: Optional[Dict]) -> Optional[int]:
+    """Identifiant du logement cliqué, d'après l'info-bulle renvoyée par st_folium"""
+    infobulle = (retour or {}).get('last_object_clicked_tooltip')
+    correspondance = _ID_INFOBULLE.search(infobulle.strip()) if infobulle else None
+    return int(correspondance.group(1)) if correspondance else None
+
+
+def lignes_regroupees(df: pd.DataFrame, avec_id: bool = False) -> list:
+    """Tableau compact [lat, lon, libellé, n° de couleur] construit colonne par colonne"""
+    df = _coordonnees(df)
+    libelles = _libelles(df, avec_id).map(html.escape)
+    indices = {couleur: i for i, couleur in enumerate(_PALETTE)}
+    couleurs = _texte(df, 'ilot').map(COULEURS_ILOT).fillna(COULEUR_DEFAUT).map(indices)
+    # Coordonnées arrondies au mètre : la charge utile diminue d'autant
+    return list(map(list, zip(df['latitude'].round(5).tolist(), df['longitude'].round(5).tolist(),
+                              libelles.tolist(), couleurs.tolist())))
+
+
+def collection_geojson(df: pd.DataFrame, proprietes: Iterable[str] = (), avec_id: bool = False) -> Dict:
+    """FeatureCollection GeoJSON des logements, construite colonne par colonne
+    
+    Chaque point porte son libellé, sa couleur d'îlot et les colonnes de
+    proprietes (en texte) ; l'id du logement est celui de l'entité.
+    """
+    df = _coordonnees(df)
+    colonnes = {
+        'libelle': _libelles(df, avec_id).map(html.escape),
+        'couleur': _texte(df, 'ilot').map(COULEURS_ILOT).fillna(COULEUR_DEFAUT),
+    }
+    colonnes.update({propriete: _texte(df, propriete).map(html.escape) for propriete in proprietes})
+    noms = list(colonnes)
+    ids = df['id'].astype(int).tolist() if 'id' in df.columns else list(range(len(df)))
+    entites = [
+        {'type': 'Feature', 'id': logement_id, 'geometry': {'type': 'Point', 'coordinates': [longitude, latitude]},
+         'properties': dict(zip(noms, valeurs))}
+        for logement_id, latitude, longitude, *valeurs in zip(
+            ids, df['latitude'].round(5).tolist(), df['longitude'].round(5).tolist(),
+            *(serie.tolist() for serie in colonnes.values()))
+    ]
+    return {'type': 'FeatureCollection', 'features': entites}
+
+
+def geojson_en_cache(db, cle: tuple, construire: Callable[[], Dict]) -> Dict:
+    """Collection GeoJSON servie par le cache de la base tant que les données n'ont pas changé
+    
+    cle identifie la collection (filtres, zone, langue...) et construire()
+    la produit en cas d'échec. La collection renvoyée est partagée : ne pas
+    la modifier.
+    """
+    if db.cache is None:
+        return construire()
+    cle = ('geojson', repr(cle))
+    version = db.pool.version_donnees()
+    trouve, collection = db.cache.lire(cle, version)
+    if not trouve:
+        collection = construire()
+        db.cache.ecrire(cle, version, collection)
+    return collection
+
+
+def ajouter_couche_geojson(carte: folium.Map, collection: Dict, champs_popup: Dict[str, str] = None,
+                           max_width: int = 300):
+    """Tous les marqueurs en une seule couche folium.GeoJson (une sérialisation)
+    
+    champs_popup associe les propriétés affichées dans la pop-up à leur
+    libellé ; sans pop-up, l'info-bulle (terminée par l'id) suffit.
+    """
+    folium.GeoJson(
+        collection,
+        name="Logements",
+        marker=folium.Marker(icon=folium.Icon(icon='home', prefix='fa')),
+        style_function=lambda entite: {'markerColor': entite['properties']['couleur']},
+        tooltip=folium.GeoJsonTooltip(fields=['libelle'], labels=False),
+        popup=folium.GeoJsonPopup(fields=list(champs_popup), aliases=list(champs_popup.values()),
+                                  max_width=max_width) if champs_popup else None,
+    ).add_to(carte)
+
+
+def ajouter_marqueurs_regroupes(carte: folium.Map, df: pd.DataFrame, details_au_clic: bool = False):
+    """Marqueurs créés et regroupés dans le navigateur (Leaflet.markercluster)"""
+    rappel = _CREER_MARQUEUR % (_PALETTE, '' if details_au_clic else _POPUP_LIBELLE)
+    regroupement = FastMarkerCluster([], callback=rappel, name="Logements")
+    # Tableau déjà validé : évite la vérification ligne par ligne de FastMarkerCluster
+    regroupement.data = lignes_regroupees(df, avec_id=details_au_clic)
+    regroupement.add_to(carte)
+
+
+def ajouter_effectifs(carte: folium.Map, effectifs: pd.DataFrame):
+    """Effectif de chaque case de la zone, affiché sur une pastille à sa position moyenne"""
+    for latitude, longitude, nombre in effectifs[['latitude', 'longitude', 'nombre']].itertuples(index=False):
+        taille = 24 + 6 * len(str(nombre))
+        folium.Marker(
+            location=[latitude, longitude],
+            tooltip=f"{nombre} logements",
+            icon=folium.DivIcon(
+                icon_size=(taille, taille), icon_anchor=(taille // 2, taille // 2),
+                html=(f"<div style='width: {taille}px; height: {taille}px; line-height: {taille}px; "
+                      f"border-radius: 50%; background: rgba(31, 119, 180, 0.75); color: white; "
+                      f"text-align: center; font-weight: bold'>{nombre}</div>")
+            )
+        ).add_to(carte)
+
+
+def carte_logements(df: pd.DataFrame, champs_popup: Dict[str, str] = None, zoom_start: int = 12,
+                    mode: str = 'auto', seuil: int = None, max_width: int = 300,
+                    centre: list = None, collection: Dict = None) -> Tuple[folium.Map, str]:
+    """Construit la carte des logements et renvoie (carte, mode effectif)
+    
+    En mode individuel, les marqueurs forment une couche GeoJSON : collection
+    si elle est fournie (voir geojson_en_cache), sinon construite depuis df,
+    la pop-up affichant champs_popup. En mode regroupé, chaque point ne
+    transporte que ses coordonnées, son libellé et sa couleur. Sans
+    champs_popup, les détails sont lus au clic : les marqueurs ne portent que
+    leur info-bulle terminée par l'id (voir id_depuis_clic).
+    """
+    carte = folium.Map(location=centre or CENTRE_CARTE, zoom_start=zoom_start, tiles='OpenStreetMap')
+    mode = mode_effectif(len(df), mode, seuil)
+    details_au_clic = not champs_popup
+    if mode == 'regroupe':
+        ajouter_marqueurs_regroupes(carte, df, details_au_clic=details_au_clic)
+    else:
+        if collection is None:
+            collection = collection_geojson(df, champs_popup or (), avec_id=details_au_clic)
+        ajouter_couche_geojson(carte, collection, champs_popup, max_width)
+    return carte, mode
+
+
+def figure_webgl(df: pd.DataFrame, survol: Dict[str, str] = None, zoom: int = 12,
+                 centre: list = None, hauteur: int = 700) -> go.Figure:
+    """Nuage de points WebGL (go.Scattermapbox) des logements, une trace par îlot
+    
+    Positions, couleurs et données de survol sont passées en tableaux NumPy :
+    rien n'est construit point par point. survol associe les colonnes
+    affichées au survol à leur libellé.
+    """
+    survol = survol or {}
+    df = _coordonnees(df)
+    latitudes = df['latitude'].to_numpy()
+    longitudes = df['longitude'].to_numpy()
+    ilots = _texte(df, 'ilot')
+    donnees = np.column_stack([(ilots + '-' + _texte(df, 'logement')).to_numpy()]
+                              + [_texte(df, colonne).to_numpy() for colonne in survol]).astype(str)
+    modele = '<b>%{customdata[0]}</b>' + ''.join(
+        f'<br>{html.escape(libelle)} : %{{customdata[{i}]}}' for i, libelle in enumerate(survol.values(), 1)
+    ) + '<extra></extra>'
+    
+    figure = go.Figure()
+    codes, valeurs = pd.factorize(ilots, sort=True)
+    for code, ilot in enumerate(valeurs):
+        masque = codes == code
+        couleur = COULEURS_WEBGL[COULEURS_ILOT.get(ilot, COULEUR_DEFAUT)]
+        figure.add_trace(go.Scattermapbox(
+            lat=latitudes[masque], lon=longitudes[masque], mode='markers', name=ilot or '-',
+            marker={'size': 8, 'color': couleur}, customdata=donnees[masque], hovertemplate=modele,
+        ))
+    centre = centre or CENTRE_CARTE
+    figure.update_layout(
+        mapbox={'style': 'open-street-map', 'center': {'lat': centre[0], 'lon': centre[1]}, 'zoom': zoom},
+        margin={'l': 0, 'r': 0, 't': 0, 'b': 0}, height=hauteur, legend_title_text='Îlot',
+    )
+    return figure
@@ -4,61 +4,1060 @@ Gère le CRUD complet avec SQLite et synchronisation Excel
 """
 
 import sqlite3
+import atexit
 import pandas as pd
 from datetime import datetime
 import os
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Iterable, Iterator
 import json
+import hashlib
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import copy
+import functools
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+import openpyxl
+
+
+# Correspondance entre les en-têtes du fichier Excel et les colonnes de la base
+COLUMN_MAPPING = {
+    'Ilot': 'ilot',
+    'Logement': 'logement',
+    'Décision': 'decision',
+    'Date Décision': 'date_decision',
+    'Nom de l\'Affectaire': 'nom_affectaire',
+    'Matricule': 'matricule',
+    'NNI': 'nni',
+    'Profession': 'profession',
+    'Fonction': 'fonction',
+    'Departement': 'departement',
+    'Téléphone': 'telephone',
+    'En Activité': 'en_activite',
+    'A la Retraite': 'a_la_retraite',
+    'Décédé': 'decede',
+    'Nom du repondant': 'nom_repondant',
+    'Lien de Parenté': 'lien_parente',
+    'N° Téléphone': 'tel_repondant',
+    'Pour l\'Etat': 'pour_etat',
+    'Reformé': 'reforme',
+}
+
+# Centre de Nouakchott: 18.0735° N, 15.9582° W
+CENTRE_NOUAKCHOTT = (18.0735, -15.9582)
+
+# Coordonnées GPS fictives par îlot
+ILOTS_COORDS = {
+    'A': (18.08, -15.96),
+    'B': (18.09, -15.95),
+    'C': (18.07, -15.97),
+    'D': (18.06, -15.96),
+    'E': (18.08, -15.94),
+    'F': (18.09, -15.97),
+    'G': (18.07, -15.95),
+    'H': (18.06, -15.94),
+}
+
+INSERT_IMPORT = f"""
+    INSERT INTO logements (
+        {', '.join(COLUMN_MAPPING.values())}, latitude, longitude, statut, hash_import
+    ) VALUES ({', '.join(['?'] * (len(COLUMN_MAPPING) + 4))})
+"""
+
+# Empreintes par colonne des valeurs importées (crc32, 4 octets par colonne de
+# COLUMN_MAPPING), indexées par l'empreinte de la ligne : la fusion compare
+# l'import précédent au fichier et ne réécrit que les colonnes changées
+SCHEMA_EMPREINTES_COLONNES = """
+    CREATE TABLE IF NOT EXISTS empreintes_colonnes (
+        hash_import INTEGER PRIMARY KEY,
+        colonnes BLOB NOT NULL
+    )
+"""
+
+INSERT_EMPREINTES_COLONNES = "INSERT OR IGNORE INTO empreintes_colonnes (hash_import, colonnes) VALUES (?, ?)"
+
+
+@functools.lru_cache(maxsize=None)
+def _update_import(colonnes: Tuple[str, ...]) -> str:
+    """Mise à jour des seules colonnes importées données (coordonnées et saisies conservées)"""
+    return f"""
+    UPDATE logements
+    SET {''.join(f'{col} = ?, ' for col in colonnes)}hash_import = ?, updated_at = CURRENT_TIMESTAMP
+    WHERE id = ?
+"""
+
+# Entrée d'historique ; l'horodatage (UTC, format de CURRENT_TIMESTAMP) est pris
+# à l'appel, y compris pour les entrées différées
+INSERT_HISTORIQUE = """
+    INSERT INTO historique (logement_id, action, details, utilisateur, timestamp)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+# Archive de l'historique : blocs d'entrées consécutives en JSON compressé (zlib),
+# dans la base ou dans un fichier SQLite séparé
+SCHEMA_HISTORIQUE_ARCHIVE = """
+    CREATE TABLE IF NOT EXISTS historique_archive (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        debut TIMESTAMP,
+        fin TIMESTAMP,
+        nombre INTEGER,
+        donnees BLOB,
+        archive_le TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+COLONNES_HISTORIQUE = ['id', 'logement_id', 'action', 'details', 'utilisateur', 'timestamp']
+
+# Instantanés : état complet d'un logement (JSON, NULL une fois supprimé) après l'entrée
+# d'historique historique_id ; etat_au rejoue les différences UPDATE qui suivent
+SCHEMA_INSTANTANES = """
+    CREATE TABLE IF NOT EXISTS historique_instantanes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        logement_id INTEGER NOT NULL,
+        historique_id INTEGER NOT NULL,
+        timestamp TIMESTAMP NOT NULL,
+        etat TEXT
+    )
+"""
+
+# Instantané daté comme l'entrée d'historique qu'il suit (historique_id = id - decalage)
+INSERT_INSTANTANE = """
+    INSERT INTO historique_instantanes (logement_id, historique_id, timestamp, etat)
+    SELECT ?, id - ?, timestamp, ? FROM historique WHERE id = ?
+"""
+
+# Actions enregistrées dans l'historique (filtre de la page Historique)
+ACTIONS_HISTORIQUE = ['CREATE', 'UPDATE', 'DELETE', 'CREATE_LOT', 'UPDATE_LOT', 'DELETE_LOT', 'IMPORT', 'EXPORT']
+
+# Colonnes de la table logements : liste blanche des projections et des filtres
+COLONNES_LOGEMENTS = [
+    'id', 'ilot', 'logement', 'decision', 'date_decision', 'nom_affectaire', 'matricule', 'nni',
+    'profession', 'fonction', 'departement', 'telephone', 'en_activite', 'a_la_retraite', 'decede',
+    'nom_repondant', 'lien_parente', 'tel_repondant', 'pour_etat', 'reforme', 'decision2',
+    'date_decision2', 'observation', 'latitude', 'longitude', 'adresse', 'statut', 'hash_import',
+    'created_at', 'updated_at',
+]
+
+# Statuts stockés en 0/1 (NULL si non renseigné)
+COLONNES_DRAPEAUX = ['en_activite', 'a_la_retraite', 'decede']
+
+# Dates stockées en ISO-8601 (AAAA-MM-JJ, ou AAAA pour une année seule) : comparables et indexables
+COLONNES_DATES = ['date_decision', 'date_decision2']
+
+# Colonnes comparables aux bornes de date des filtres (min / max)
+EXPRESSIONS_DATE = {colonne: colonne for colonne in COLONNES_DATES + ['created_at', 'updated_at']}
+
+# Valeurs textuelles (en minuscules, sans espaces) des statuts vrais
+VALEURS_VRAIES = {'oui', 'yes', 'true', '1', 'actif', 'نعم'}
+
+# Schéma de la table des logements ({table} : nom de la table créée)
+SCHEMA_LOGEMENTS = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ilot TEXT,
+        logement TEXT,
+        decision TEXT,
+        date_decision TEXT,
+        nom_affectaire TEXT,
+        matricule TEXT,
+        nni TEXT,
+        profession TEXT,
+        fonction TEXT,
+        departement TEXT,
+        telephone TEXT,
+        en_activite INTEGER,
+        a_la_retraite INTEGER,
+        decede INTEGER,
+        nom_repondant TEXT,
+        lien_parente TEXT,
+        tel_repondant TEXT,
+        pour_etat TEXT,
+        reforme TEXT,
+        decision2 TEXT,
+        date_decision2 TEXT,
+        observation TEXT,
+        latitude REAL,
+        longitude REAL,
+        adresse TEXT,
+        statut TEXT,
+        hash_import INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# Opérateurs des filtres, en suffixe du nom de colonne : {'ilot__dans': ['A', 'B']}
+OPERATEURS_FILTRE = ('', 'dans', 'commence', 'nul', 'min', 'max')
+
+# Colonnes indexées par la recherche plein texte
+COLONNES_RECHERCHE = ['ilot', 'logement', 'nom_affectaire', 'nni', 'profession', 'departement']
+
+# Clés de tri de la pagination par curseur : l'id final rend l'ordre total
+TRIS = {
+    'ilot': ('ilot', 'logement', 'id'),
+    'departement': ('departement', 'ilot', 'logement', 'id'),
+    'profession': ('profession', 'ilot', 'logement', 'id'),
+    'nom_affectaire': ('nom_affectaire', 'id'),
+    'updated_at': ('updated_at', 'id'),
+}
+
+
+def _condition_apres(colonnes: Tuple[str, ...], valeurs: Tuple, descendant: bool = False) -> Tuple[str, list]:
+    """Condition SQL « ligne située après le curseur » dans l'ordre des colonnes
+    
+    Comparaison lexicographique développée colonne par colonne, pour tenir
+    compte des NULL (en tête en ordre croissant, en fin en ordre décroissant).
+    """
+    # Cas courant : comparaison de valeurs de ligne, qui sert de borne au parcours d'index
+    if not descendant and None not in valeurs:
+        return f"({', '.join(colonnes)}) > ({', '.join(['?'] * len(valeurs))})", list(valeurs)
+    
+    condition, params = None, []
+    for colonne, valeur in reversed(list(zip(colonnes, valeurs))):
+        if valeur is None:
+            strict, params_strict = (f"{colonne} IS NOT NULL" if not descendant else "0"), []
+            egal, params_egal = f"{colonne} IS NULL", []
+        else:
+            strict = f"{colonne} > ?" if not descendant else f"({colonne} < ? OR {colonne} IS NULL)"
+            params_strict = [valeur]
+            egal, params_egal = f"{colonne} = ?", [valeur]
+        if condition is None:
+            condition, params = strict, params_strict
+        else:
+            condition = f"({strict} OR ({egal} AND {condition}))"
+            params = params_strict + params_egal + params
+    
+    return condition, params
+
+
+def _absent(valeur) -> bool:
+    """Valeur manquante : None, NaN, chaîne vide ou 'nan' (ancien stockage par str())"""
+    if valeur is None or (isinstance(valeur, float) and np.isnan(valeur)):
+        return True
+    return isinstance(valeur, str) and valeur.strip() in ('', 'nan')
+
+
+def _texte(valeur) -> Optional[str]:
+    """Valeur texte, NULL si manquante"""
+    return None if _absent(valeur) else str(valeur)
+
+
+def _drapeau(valeur) -> Optional[int]:
+    """Statut en 1/0 (OUI, oui, 1, True… → 1), NULL si non renseigné"""
+    if _absent(valeur):
+        return None
+    if isinstance(valeur, str):
+        return int(valeur.lower().strip() in VALEURS_VRAIES)
+    return int(valeur == 1)
+
+
+_DATE_JJ_MM_AAAA = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})')
+_DATE_ISO = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+def _date_iso(valeur) -> Optional[str]:
+    """Date en AAAA-MM-JJ (depuis JJ/MM/AAAA, une date ou un horodatage), NULL si manquante
+    
+    Une année seule reste AAAA ; un texte non reconnu est conservé tel quel.
+    """
+    if _absent(valeur):
+        return None
+    if hasattr(valeur, 'strftime'):
+        return valeur.strftime('%Y-%m-%d')
+    texte = str(valeur).strip()
+    correspondance = _DATE_JJ_MM_AAAA.fullmatch(texte)
+    if correspondance:
+        jour, mois, annee = correspondance.groups()
+        return f"{annee}-{int(mois):02d}-{int(jour):02d}"
+    if _DATE_ISO.match(texte):
+        return texte[:10]
+    return texte
+
+
+# Conversion de chaque colonne saisie ou importée vers son type de stockage
+CONVERSIONS = {colonne: _texte for colonne in COLONNES_LOGEMENTS
+               if colonne not in ('id', 'latitude', 'longitude', 'hash_import', 'created_at', 'updated_at')}
+CONVERSIONS.update({colonne: _drapeau for colonne in COLONNES_DRAPEAUX})
+CONVERSIONS.update({colonne: _date_iso for colonne in COLONNES_DATES})
+_CONVERSIONS_IMPORT = [CONVERSIONS[colonne] for colonne in COLUMN_MAPPING.values()]
+
+
+def typer_logement(data: Dict) -> Dict:
+    """Valeurs d'un logement converties vers leur type de stockage (statuts, dates, NULL)"""
+    return {colonne: CONVERSIONS[colonne](valeur) if colonne in CONVERSIONS else valeur
+            for colonne, valeur in data.items()}
+
+
+def _typer_import(valeurs: tuple) -> tuple:
+    """Valeurs importées (dans l'ordre de COLUMN_MAPPING) converties vers leur type de stockage"""
+    return tuple(conversion(valeur) for conversion, valeur in zip(_CONVERSIONS_IMPORT, valeurs))
+
+
+def _valeur_sql(valeur):
+    """Convertit une valeur lue par pandas en paramètre SQLite (NaN → NULL, numpy → Python)"""
+    if valeur is None or (isinstance(valeur, float) and np.isnan(valeur)):
+        return None
+    return valeur.item() if isinstance(valeur, np.generic) else valeur
+
+
+# Normalisation de l'arabe avant indexation : le tokenizer unicode61 retire les accents
+# latins mais pas les voyelles brèves, la tatweel ni les variantes de l'alif
+NORMALISATION_ARABE = (
+    [(chr(code), '') for code in range(0x064B, 0x0653)]  # fathatan … soukoun, chadda
+    + [('\u0670', ''), ('\u0640', '')]                    # alif suscrit, tatweel
+    + [('أ', 'ا'), ('إ', 'ا'), ('آ', 'ا'), ('ٱ', 'ا'), ('ى', 'ي'), ('ة', 'ه')]
+)
+_TABLE_NORMALISATION = str.maketrans({avant: apres for avant, apres in NORMALISATION_ARABE})
+
+
+def normaliser_recherche(texte: str) -> str:
+    """Normalise un texte comme les déclencheurs de l'index plein texte"""
+    return texte.translate(_TABLE_NORMALISATION)
+
+
+def _expression_normalisee(colonne: str) -> str:
+    """Expression SQL équivalente à normaliser_recherche (utilisable dans un déclencheur)
+    
+    Les remplacements ne sont évalués que pour les textes contenant de l'arabe.
+    """
+    expression = colonne
+    for avant, apres in NORMALISATION_ARABE:
+        expression = f"replace({expression}, '{avant}', '{apres}')"
+    return f"CASE WHEN {colonne} GLOB '*[\u0600-\u06FF]*' THEN {expression} ELSE {colonne} END"
+
+
+def _valeurs_fts(prefixe: str) -> str:
+    return ', '.join(_expression_normalisee(f"{prefixe}{col}") for col in COLONNES_RECHERCHE)
+
+
+REMPLIR_RECHERCHE = f"""
+    INSERT INTO logements_fts (rowid, {', '.join(COLONNES_RECHERCHE)})
+    SELECT id, {_valeurs_fts('')} FROM logements
+"""
+
+# Index sans contenu : les textes normalisés ne sont pas stockés, les lignes sont relues
+# dans logements par rowid. Les déclencheurs le tiennent à jour à chaque écriture.
+MIGRATION_RECHERCHE = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS logements_fts USING fts5(
+        {', '.join(COLONNES_RECHERCHE)}, content='',
+        tokenize="unicode61 remove_diacritics 2"
+    )""",
+    REMPLIR_RECHERCHE,
+    f"""CREATE TRIGGER IF NOT EXISTS logements_fts_insert AFTER INSERT ON logements BEGIN
+        INSERT INTO logements_fts (rowid, {', '.join(COLONNES_RECHERCHE)})
+        VALUES (new.id, {_valeurs_fts('new.')});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS logements_fts_delete AFTER DELETE ON logements BEGIN
+        INSERT INTO logements_fts (logements_fts, rowid, {', '.join(COLONNES_RECHERCHE)})
+        VALUES ('delete', old.id, {_valeurs_fts('old.')});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS logements_fts_update
+        AFTER UPDATE OF {', '.join(COLONNES_RECHERCHE)} ON logements BEGIN
+        INSERT INTO logements_fts (logements_fts, rowid, {', '.join(COLONNES_RECHERCHE)})
+        VALUES ('delete', old.id, {_valeurs_fts('old.')});
+        INSERT INTO logements_fts (rowid, {', '.join(COLONNES_RECHERCHE)})
+        VALUES (new.id, {_valeurs_fts('new.')});
+    END""",
+]
+
+
+# Colonnes des listes déroulantes de filtre : valeurs distinctes et effectifs par îlot
+FACETTES = ['ilot', 'departement', 'profession']
+
+
+def _present(valeur: str) -> str:
+    return f"{valeur} IS NOT NULL AND {valeur} NOT IN ('', 'nan')"
+
+
+def _facettes_ajouter(prefixe: str) -> str:
+    return '\n'.join(f"""
+        INSERT INTO facettes (colonne, ilot, valeur, nombre)
+        SELECT '{col}', coalesce({prefixe}ilot, ''), {prefixe}{col}, 1 WHERE {_present(prefixe + col)}
+        ON CONFLICT (colonne, ilot, valeur) DO UPDATE SET nombre = nombre + 1;""" for col in FACETTES)
+
+
+def _facettes_retirer(prefixe: str) -> str:
+    return '\n'.join(f"""
+        UPDATE facettes SET nombre = nombre - 1
+        WHERE colonne = '{col}' AND ilot = coalesce({prefixe}ilot, '') AND valeur = {prefixe}{col};
+        DELETE FROM facettes
+        WHERE colonne = '{col}' AND ilot = coalesce({prefixe}ilot, '') AND valeur = {prefixe}{col}
+        AND nombre <= 0;""" for col in FACETTES)
+
+
+# Recalcul complet des facettes depuis logements
+REMPLIR_FACETTES = [
+    f"""INSERT INTO facettes (colonne, ilot, valeur, nombre)
+        SELECT '{col}', coalesce(ilot, ''), {col}, COUNT(*) FROM logements
+        WHERE {_present(col)} GROUP BY coalesce(ilot, ''), {col}"""
+    for col in FACETTES
+]
+
+# Facettes tenues à jour par déclencheurs : les filtres lisent quelques lignes au lieu
+# d'un SELECT DISTINCT sur toute la table. L'îlot ('' si absent) permet les facettes dépendantes.
+MIGRATION_FACETTES = [
+    """CREATE TABLE IF NOT EXISTS facettes (
+        colonne TEXT NOT NULL,
+        ilot TEXT NOT NULL,
+        valeur TEXT NOT NULL,
+        nombre INTEGER NOT NULL,
+        PRIMARY KEY (colonne, ilot, valeur)
+    ) WITHOUT ROWID""",
+    "DELETE FROM facettes",
+    *REMPLIR_FACETTES,
+    f"""CREATE TRIGGER IF NOT EXISTS logements_facettes_insert AFTER INSERT ON logements BEGIN
+        {_facettes_ajouter('new.')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS logements_facettes_delete AFTER DELETE ON logements BEGIN
+        {_facettes_retirer('old.')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS logements_facettes_update
+        AFTER UPDATE OF {', '.join(FACETTES)} ON logements BEGIN
+        {_facettes_retirer('old.')}
+        {_facettes_ajouter('new.')}
+    END""",
+]
+
+
+# Dimensions de la table statistiques ('total' compte toutes les lignes) ; les valeurs
+# absentes sont rangées sous '' (clé primaire non nulle)
+DIMENSIONS_STATISTIQUES = ['ilot', 'departement', 'en_activite']
+
+
+def _statistiques_modifier(prefixe: str, delta: int, total: bool = True) -> str:
+    lignes = [('total', "''")] if total else []
+    lignes += [(dim, f"coalesce({prefixe}{dim}, '')") for dim in DIMENSIONS_STATISTIQUES]
+    requetes = []
+    for dimension, valeur in lignes:
+        requetes.append(f"""
+        INSERT INTO statistiques (dimension, valeur, nombre) VALUES ('{dimension}', {valeur}, {delta})
+        ON CONFLICT (dimension, valeur) DO UPDATE SET nombre = nombre + ({delta});""")
+    if delta < 0:
+        requetes.append("\n        DELETE FROM statistiques WHERE nombre <= 0 AND dimension != 'total';")
+    return ''.join(requetes)
+
+
+REMPLIR_STATISTIQUES = [
+    "INSERT INTO statistiques (dimension, valeur, nombre) SELECT 'total', '', COUNT(*) FROM logements",
+] + [
+    f"""INSERT INTO statistiques (dimension, valeur, nombre)
+        SELECT '{dim}', coalesce({dim}, ''), COUNT(*) FROM logements GROUP BY coalesce({dim}, '')"""
+    for dim in DIMENSIONS_STATISTIQUES
+]
+
+# Effectifs du tableau de bord tenus à jour par déclencheurs : obtenir_statistiques lit
+# quelques dizaines de lignes au lieu de quatre agrégats sur toute la table
+MIGRATION_STATISTIQUES = [
+    """CREATE TABLE IF NOT EXISTS statistiques (
+        dimension TEXT NOT NULL,
+        valeur TEXT NOT NULL,
+        nombre INTEGER NOT NULL,
+        PRIMARY KEY (dimension, valeur)
+    ) WITHOUT ROWID""",
+    "DELETE FROM statistiques",
+    *REMPLIR_STATISTIQUES,
+    f"""CREATE TRIGGER IF NOT EXISTS logements_statistiques_insert AFTER INSERT ON logements BEGIN
+        {_statistiques_modifier('new.', 1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS logements_statistiques_delete AFTER DELETE ON logements BEGIN
+        {_statistiques_modifier('old.', -1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS logements_statistiques_update
+        AFTER UPDATE OF {', '.join(DIMENSIONS_STATISTIQUES)} ON logements BEGIN
+        {_statistiques_modifier('old.', -1, total=False)}
+        {_statistiques_modifier('new.', 1, total=False)}
+    END""",
+]
+
+
+# Index spatial R*Tree des positions (un point par logement géolocalisé)
+def _zone_inserer(prefixe: str) -> str:
+    """Insère la position d'une ligne de logements dans l'index spatial, si elle est numérique"""
+    return f"""INSERT INTO logements_zones (id, lat_min, lat_max, lon_min, lon_max)
+        SELECT {prefixe}id, {prefixe}latitude, {prefixe}latitude, {prefixe}longitude, {prefixe}longitude
+        WHERE typeof({prefixe}latitude) IN ('real', 'integer') AND typeof({prefixe}longitude) IN ('real', 'integer');"""
+
+
+REMPLIR_ZONES = """
+    INSERT INTO logements_zones (id, lat_min, lat_max, lon_min, lon_max)
+    SELECT id, latitude, latitude, longitude, longitude FROM logements
+    WHERE typeof(latitude) IN ('real', 'integer') AND typeof(longitude) IN ('real', 'integer')
+"""
+
+MIGRATION_ZONES = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS logements_zones USING rtree(id, lat_min, lat_max, lon_min, lon_max)",
+    "DELETE FROM logements_zones",
+    REMPLIR_ZONES,
+    f"""CREATE TRIGGER IF NOT EXISTS logements_zones_insert AFTER INSERT ON logements BEGIN
+        {_zone_inserer('new.')}
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS logements_zones_delete AFTER DELETE ON logements BEGIN
+        DELETE FROM logements_zones WHERE id = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS logements_zones_update AFTER UPDATE OF latitude, longitude ON logements BEGIN
+        DELETE FROM logements_zones WHERE id = old.id;
+        {_zone_inserer('new.')}
+    END""",
+]
+
+
+# Reconstruction en bloc des tables dérivées de logements, après une réécriture complète
+# faite sans déclencheurs (import en mode remplacement)
+RECONSTRUCTIONS = [
+    "INSERT INTO logements_fts (logements_fts) VALUES ('delete-all')",
+    REMPLIR_RECHERCHE,
+    "DELETE FROM facettes",
+    *REMPLIR_FACETTES,
+    "DELETE FROM statistiques",
+    *REMPLIR_STATISTIQUES,
+    "DELETE FROM logements_zones",
+    REMPLIR_ZONES,
+]
+
+
+# Migrations du schéma, appliquées dans l'ordre ; PRAGMA user_version retient la dernière
+# appliquée. Chaque étape est une liste de requêtes SQL ou une méthode de LogementDatabase
+# recevant le curseur. Ne jamais modifier une migration publiée : en ajouter une nouvelle.
+MIGRATIONS = [
+    ("Colonne hash_import des imports incrémentaux", '_migrer_hash_import'),
+    ("Index des filtres et du tri de la liste des logements", [
+        "CREATE INDEX IF NOT EXISTS idx_logements_ilot_logement ON logements (ilot, logement)",
+        "CREATE INDEX IF NOT EXISTS idx_logements_departement ON logements (departement, ilot, logement)",
+        "CREATE INDEX IF NOT EXISTS idx_logements_profession ON logements (profession, ilot, logement)",
+    ]),
+    ("Index de l'historique par logement et par date", [
+        "CREATE INDEX IF NOT EXISTS idx_historique_logement ON historique (logement_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_historique_timestamp ON historique (timestamp)",
+        "ANALYZE",
+    ]),
+    ("Index plein texte de la recherche (FTS5)", MIGRATION_RECHERCHE),
+    ("Index des tris par affectaire et par date de modification", [
+        "CREATE INDEX IF NOT EXISTS idx_logements_nom_affectaire ON logements (nom_affectaire)",
+        "CREATE INDEX IF NOT EXISTS idx_logements_updated_at ON logements (updated_at)",
+    ]),
+    ("Facettes des filtres (îlot, département, profession)", MIGRATION_FACETTES),
+    ("Statistiques du tableau de bord tenues à jour", MIGRATION_STATISTIQUES),
+    ("Index spatial R*Tree des positions", MIGRATION_ZONES),
+    ("Colonnes typées : statuts 0/1, dates ISO, NULL au lieu de '' et 'nan'", '_migrer_types'),
+    ("Archive de l'historique et index de ses filtres", [
+        SCHEMA_HISTORIQUE_ARCHIVE,
+        "CREATE INDEX IF NOT EXISTS idx_historique_action ON historique (action, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_historique_utilisateur ON historique (utilisateur, timestamp)",
+    ]),
+    ("Instantanés des logements (état à une date)", [
+        SCHEMA_INSTANTANES,
+        "CREATE INDEX IF NOT EXISTS idx_instantanes_logement ON historique_instantanes (logement_id, historique_id)",
+    ]),
+    ("Empreintes par colonne des lignes importées", [SCHEMA_EMPREINTES_COLONNES]),
+]
+
+
+# Valeurs que pd.read_excel interprète comme manquantes
+VALEURS_MANQUANTES = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+
+
+def _convertir_cellule(valeur) -> str:
+    """Convertit une cellule openpyxl comme pd.read_excel puis str(valeur)"""
+    if valeur is None:
+        return 'nan'
+    if isinstance(valeur, float):
+        if valeur.is_integer():
+            return str(int(valeur))
+        return str(valeur)
+    if isinstance(valeur, str) and valeur in VALEURS_MANQUANTES:
+        return 'nan'
+    return str(valeur)
+
+
+# Profils de réglage SQLite appliqués à chaque connexion
+PROFILS_SQLITE = {
+    # Réglages par défaut de SQLite (journal rollback, fsync à chaque commit)
+    'defaut': {},
+    # WAL : les lecteurs ne sont plus bloqués par une écriture en cours
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+}
+
+
+def profil_sqlite(nom: str = None) -> Dict:
+    """Construit les réglages SQLite d'un profil, surchargés par les variables d'environnement
+    
+    LOGEMENTS_SQLITE_PROFIL choisit le profil ('production' par défaut) ;
+    LOGEMENTS_SQLITE_JOURNAL_MODE, _SYNCHRONOUS, _CACHE_SIZE, _MMAP_SIZE,
+    _TEMP_STORE et _BUSY_TIMEOUT remplacent un réglage isolé, et
+    LOGEMENTS_SQLITE_CHECKPOINT_S fixe l'intervalle des checkpoints WAL.
+    """
+    nom = nom or os.environ.get('LOGEMENTS_SQLITE_PROFIL', 'production')
+    if nom not in PROFILS_SQLITE:
+        raise ValueError(f"Profil SQLite inconnu: {nom}")
+    
+    reglages = dict(PROFILS_SQLITE[nom])
+    for pragma in ('journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store', 'busy_timeout'):
+        valeur = os.environ.get(f'LOGEMENTS_SQLITE_{pragma.upper()}')
+        if valeur:
+            reglages[pragma] = int(valeur) if valeur.lstrip('-').isdigit() else valeur
+    reglages['checkpoint_s'] = float(os.environ.get('LOGEMENTS_SQLITE_CHECKPOINT_S', 300))
+    return reglages
+
+
+class PoolConnexions:
+    """Pool borné de connexions SQLite partagé par tout le processus
+    
+    Les lectures empruntent une connexion parmi au plus ``taille_lecture``
+    connexions ; toutes les écritures passent par une connexion unique,
+    protégée par un verrou, dans une transaction validée en sortie de bloc.
+    """
+    
+    def __init__(self, db_path: str, taille_lecture: int = 4, timeout: float = 30.0,
+                 reglages: Dict = None):
+        self.db_path = db_path
+        self.taille_lecture = max(1, taille_lecture)
+        self.timeout = timeout
+        self.reglages = dict(reglages or {})
+        self._intervalle_checkpoint = self.reglages.pop('checkpoint_s', None)
+        self._dernier_checkpoint = time.monotonic()
+        self._libres = queue.LifoQueue()
+        self._ouvertes = []
+        self._verrou = threading.Lock()
+        self._verrou_ecriture = threading.RLock()
+        self._local = threading.local()
+        self._ferme = False
+        # Compteur des transactions validées par ce processus et connexion témoin
+        # dont PRAGMA data_version change à chaque écriture d'une autre connexion
+        self._version = 0
+        self._temoin = None
+        self._verrou_temoin = threading.Lock()
+        self._metriques = {
+            'emprunts_lecture': 0,
+            'emprunts_ecriture': 0,
+            'lecteurs_en_cours': 0,
+            'lecteurs_en_cours_max': 0,
+            'attente_totale_s': 0.0,
+            'attente_max_s': 0.0,
+            'delais_depasses': 0,
+            'checkpoints': 0,
+        }
+        self._ecrivain = self._ouvrir()
+    
+    def _ouvrir(self) -> sqlite3.Connection:
+        """Ouvre une connexion configurée pour le pool"""
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # Base neuve : auto_vacuum incrémental, fixé avant le mode de journal (une base
+        # existante est convertie par le VACUUM de recuperer_espace)
+        if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        for pragma, valeur in self.reglages.items():
+            conn.execute(f"PRAGMA {pragma} = {valeur}")
+        return conn
+    
+    def _checkpoint_periodique(self):
+        """Reporte le WAL dans la base si l'intervalle est écoulé (appelé par l'écrivain)"""
+        if not self._intervalle_checkpoint or self.reglages.get('journal_mode', '').upper() != 'WAL':
+            return
+        if time.monotonic() - self._dernier_checkpoint >= self._intervalle_checkpoint:
+            self._ecrivain.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            self._dernier_checkpoint = time.monotonic()
+            self._metriques['checkpoints'] += 1
+    
+    def _noter_attente(self, debut: float):
+        """Cumule le temps d'attente d'un emprunt"""
+        attente = time.perf_counter() - debut
+        self._metriques['attente_totale_s'] += attente
+        self._metriques['attente_max_s'] = max(self._metriques['attente_max_s'], attente)
+    
+    @contextmanager
+    def lecture(self) -> Iterator[sqlite3.Connection]:
+        """Emprunte une connexion de lecture (en crée une si le pool n'est pas plein)"""
+        if self._ferme:
+            raise sqlite3.ProgrammingError("Pool de connexions fermé")
+        # Une lecture dans une transaction d'écriture du même thread voit ses modifications
+        if getattr(self._local, 'profondeur', 0):
+            yield self._ecrivain
+            return
+        
+        debut = time.perf_counter()
+        conn = None
+        try:
+            conn = self._libres.get_nowait()
+        except queue.Empty:
+            with self._verrou:
+                if len(self._ouvertes) < self.taille_lecture:
+                    conn = self._ouvrir()
+                    self._ouvertes.append(conn)
+            if conn is None:
+                try:
+                    conn = self._libres.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._verrou:
+                        self._metriques['delais_depasses'] += 1
+                    raise TimeoutError("Aucune connexion de lecture disponible")
+        
+        with self._verrou:
+            self._noter_attente(debut)
+            self._metriques['emprunts_lecture'] += 1
+            self._metriques['lecteurs_en_cours'] += 1
+            self._metriques['lecteurs_en_cours_max'] = max(self._metriques['lecteurs_en_cours_max'],
+                                                           self._metriques['lecteurs_en_cours'])
+        try:
+            yield conn
+        finally:
+            with self._verrou:
+                self._metriques['lecteurs_en_cours'] -= 1
+            self._libres.put(conn)
+    
+    @contextmanager
+    def ecriture(self) -> Iterator[sqlite3.Connection]:
+        """Emprunte la connexion d'écriture ; valide en sortie, annule en cas d'erreur"""
+        if self._ferme:
+            raise sqlite3.ProgrammingError("Pool de connexions fermé")
+        debut = time.perf_counter()
+        if not self._verrou_ecriture.acquire(timeout=self.timeout):
+            with self._verrou:
+                self._metriques['delais_depasses'] += 1
+            raise TimeoutError("Connexion d'écriture indisponible")
+        
+        profondeur = getattr(self._local, 'profondeur', 0)
+        self._local.profondeur = profondeur + 1
+        with self._verrou:
+            self._noter_attente(debut)
+            self._metriques['emprunts_ecriture'] += 1
+        try:
+            yield self._ecrivain
+            # Seul le bloc le plus externe valide la transaction
+            if profondeur == 0:
+                self._ecrivain.commit()
+                self._version += 1
+                self._checkpoint_periodique()
+        except BaseException:
+            if profondeur == 0:
+                self._ecrivain.rollback()
+            raise
+        finally:
+            self._local.profondeur = profondeur
+            self._verrou_ecriture.release()
+    
+    def en_transaction(self) -> bool:
+        """Indique si le thread courant est dans un bloc d'écriture"""
+        return getattr(self._local, 'profondeur', 0) > 0
+    
+    def version_donnees(self) -> Tuple[int, int]:
+        """Version des données : commits de ce processus et PRAGMA data_version
+        
+        La seconde composante change dès qu'une autre connexion (écrivain du
+        pool ou autre processus) valide une écriture.
+        """
+        with self._verrou_temoin:
+            if self._temoin is None:
+                self._temoin = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+            return self._version, self._temoin.execute("PRAGMA data_version").fetchone()[0]
+    
+    def metriques(self) -> Dict:
+        """Renvoie les métriques du pool (connexions, emprunts, temps d'attente)"""
+        with self._verrou:
+            metriques = dict(self._metriques)
+            metriques['lecteurs_ouverts'] = len(self._ouvertes)
+            metriques['lecteurs_max'] = self.taille_lecture
+        emprunts = metriques['emprunts_lecture'] + metriques['emprunts_ecriture']
+        metriques['attente_moyenne_s'] = metriques['attente_totale_s'] / emprunts if emprunts else 0.0
+        return metriques
+    
+    def fermer(self):
+        """Ferme toutes les connexions du pool"""
+        if self._ferme:
+            return
+        self._ferme = True
+        with self._verrou_ecriture:
+            if self.reglages.get('journal_mode', '').upper() == 'WAL':
+                try:
+                    self._ecrivain.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                except sqlite3.Error:
+                    pass
+            self._ecrivain.close()
+        with self._verrou_temoin:
+            if self._temoin is not None:
+                self._temoin.close()
+        with self._verrou:
+            for conn in self._ouvertes:
+                conn.close()
+            self._ouvertes = []
+
+
+def _taille_resultat(resultat) -> int:
+    """Estimation de l'empreinte mémoire d'un résultat mis en cache (octets)"""
+    if isinstance(resultat, pd.DataFrame):
+        # memory_usage(deep=True) parcourt chaque chaîne : estimation sur un échantillon
+        taille = int(resultat.memory_usage(index=True).sum())
+        pas = max(1, len(resultat) // 1000)
+        for colonne in resultat.columns[resultat.dtypes == object]:
+            echantillon = resultat[colonne].iloc[::pas]
+            taille += int(sum(map(sys.getsizeof, echantillon)) * len(resultat) / max(1, len(echantillon)))
+        return taille
+    if isinstance(resultat, dict):
+        return sys.getsizeof(resultat) + sum(_taille_resultat(cle) + _taille_resultat(valeur)
+                                             for cle, valeur in resultat.items())
+    if isinstance(resultat, (list, tuple)):
+        # Longues listes (entités GeoJSON...) : même estimation sur un échantillon
+        pas = max(1, len(resultat) // 1000)
+        echantillon = resultat[::pas]
+        return sys.getsizeof(resultat) + int(sum(map(_taille_resultat, echantillon)) * len(resultat)
+                                             / max(1, len(echantillon)))
+    return sys.getsizeof(resultat)
+
+
+class CacheRequetes:
+    """Cache LRU des résultats de lecture, borné par leur taille en octets
+    
+    Chaque entrée est associée à la version des données au moment de la
+    lecture : une entrée d'une autre version est ignorée et retirée.
+    """
+    
+    def __init__(self, taille_max: int = 64 * 1024 * 1024):
+        self.taille_max = taille_max
+        self._entrees = OrderedDict()
+        self._taille = 0
+        self._verrou = threading.Lock()
+        self._metriques = {'succes': 0, 'echecs': 0, 'evictions': 0, 'invalidations': 0}
+    
+    def lire(self, cle, version):
+        """Renvoie (True, résultat) si la clé est en cache pour cette version, sinon (False, None)"""
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is not None and entree[0] == version:
+                self._entrees.move_to_end(cle)
+                self._metriques['succes'] += 1
+                return True, entree[1]
+            if entree is not None:
+                self._retirer(cle)
+                self._metriques['invalidations'] += 1
+            self._metriques['echecs'] += 1
+            return False, None
+    
+    def ecrire(self, cle, version, resultat):
+        """Met un résultat en cache puis évince les entrées les moins récemment lues"""
+        taille = _taille_resultat(resultat)
+        if taille > self.taille_max:
+            return
+        with self._verrou:
+            if cle in self._entrees:
+                self._retirer(cle)
+            self._entrees[cle] = (version, resultat, taille)
+            self._taille += taille
+            while self._taille > self.taille_max:
+                self._retirer(next(iter(self._entrees)))
+                self._metriques['evictions'] += 1
+    
+    def _retirer(self, cle):
+        self._taille -= self._entrees.pop(cle)[2]
+    
+    def vider(self):
+        """Vide le cache (les compteurs sont conservés)"""
+        with self._verrou:
+            self._entrees.clear()
+            self._taille = 0
+    
+    def metriques(self) -> Dict:
+        """Renvoie les compteurs du cache (succès, échecs, évictions, taille)"""
+        with self._verrou:
+            metriques = dict(self._metriques)
+            metriques['entrees'] = len(self._entrees)
+            metriques['taille_octets'] = self._taille
+            metriques['taille_max_octets'] = self.taille_max
+        lectures = metriques['succes'] + metriques['echecs']
+        metriques['taux_succes'] = metriques['succes'] / lectures if lectures else 0.0
+        return metriques
+
+
+class JournalHistorique:
+    """Écriture différée de l'historique, par lots, dans un thread d'arrière-plan
+    
+    Les entrées sont mises en file puis insérées par executemany dans une
+    seule transaction dès que ``taille_lot`` entrées attendent, ou toutes les
+    ``intervalle`` secondes. ``fermer`` (appelé aussi à l'arrêt de
+    l'interpréteur) écrit les entrées restantes avant de rendre la main.
+    """
+    
+    def __init__(self, pool: PoolConnexions, taille_lot: int = 500, intervalle: float = 1.0):
+        self.pool = pool
+        self.taille_lot = max(1, taille_lot)
+        self.intervalle = intervalle
+        self._file = []
+        self._condition = threading.Condition()
+        self._ferme = False
+        self._metriques = {'entrees': 0, 'lots': 0, 'erreurs': 0}
+        self._thread = threading.Thread(target=self._boucle, name="journal-historique", daemon=True)
+        self._thread.start()
+        atexit.register(self.fermer)
+    
+    def ajouter(self, entree: Tuple):
+        """Met en file une ligne de INSERT_HISTORIQUE"""
+        with self._condition:
+            if self._ferme:
+                raise sqlite3.ProgrammingError("Journal de l'historique fermé")
+            self._file.append(entree)
+            if len(self._file) >= self.taille_lot:
+                self._condition.notify()
+    
+    def _boucle(self):
+        """Vide la file à chaque lot complet ou intervalle écoulé, jusqu'à la fermeture"""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._ferme or len(self._file) >= self.taille_lot,
+                                         timeout=self.intervalle)
+                if self._ferme:
+                    return
+            try:
+                self.vider()
+            except Exception as e:
+                print(f"Erreur historique: {e}")
+    
+    def vider(self) -> int:
+        """Écrit les entrées en attente en une transaction ; renvoie leur nombre
+        
+        La file est relevée sous le verrou d'écriture, de sorte que les lots
+        sont écrits dans l'ordre d'arrivée ; en cas d'erreur ils y sont remis.
+        """
+        if not self._file:
+            return 0
+        lot = []
+        try:
+            with self.pool.ecriture() as conn:
+                with self._condition:
+                    lot, self._file = self._file, []
+                if lot:
+                    conn.executemany(INSERT_HISTORIQUE, lot)
+        except BaseException:
+            with self._condition:
+                self._file[:0] = lot
+                self._metriques['erreurs'] += 1
+            raise
+        with self._condition:
+            self._metriques['entrees'] += len(lot)
+            self._metriques['lots'] += 1 if lot else 0
+        return len(lot)
+    
+    def metriques(self) -> Dict:
+        """Renvoie les compteurs du journal (entrées écrites, lots, entrées en attente)"""
+        with self._condition:
+            return dict(self._metriques, en_attente=len(self._file))
+    
+    def fermer(self):
+        """Arrête le thread puis écrit les entrées restantes"""
+        with self._condition:
+            if self._ferme:
+                return
+            self._ferme = True
+            self._condition.notify()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        atexit.unregister(self.fermer)
+        try:
+            self.vider()
+        except Exception as e:
+            print(f"Erreur historique: {e}")
+
+
+# Lectures en échec du fil courant : leur valeur de repli n'est pas mise en cache
+_echecs_lecture = threading.local()
+
+
+def _echec_lecture(message: str):
+    """Signale une lecture en échec (valeur de repli renvoyée, à ne pas mettre en cache)"""
+    print(message)
+    _echecs_lecture.nombre = getattr(_echecs_lecture, 'nombre', 0) + 1
+
+
+def _en_cache(methode):
+    """Sert une méthode de lecture depuis le cache de la base tant que les données n'ont pas changé
+    
+    La clé réunit le nom de la méthode et ses paramètres ; les DataFrames et
+    dictionnaires renvoyés sont des copies, l'appelant peut les modifier.
+    Seuls les résultats des lectures réussies sont conservés : une valeur de
+    repli signalée par ``_echec_lecture`` (ici ou dans une lecture imbriquée)
+    est renvoyée sans être mise en cache.
+    """
+    @functools.wraps(methode)
+    def lecture_en_cache(self, *args, **kwargs):
+        cache = self.cache
+        # Dans une transaction d'écriture, la lecture doit voir les modifications non validées
+        if cache is None or self.pool.en_transaction():
+            return methode(self, *args, **kwargs)
+        
+        cle = (methode.__name__, repr(args), repr(sorted(kwargs.items())))
+        version = self.pool.version_donnees()
+        trouve, resultat = cache.lire(cle, version)
+        if not trouve:
+            echecs = getattr(_echecs_lecture, 'nombre', 0)
+            resultat = methode(self, *args, **kwargs)
+            if getattr(_echecs_lecture, 'nombre', 0) == echecs:
+                cache.ecrire(cle, version, resultat)
+        if isinstance(resultat, pd.DataFrame):
+            return resultat.copy()
+        return copy.deepcopy(resultat)
+    return lecture_en_cache
 
 
 class LogementDatabase:
     """Classe pour gérer la base de données des logements"""
     
-    def __init__(self, db_path: str = "logements.db", excel_path: str = "logements.xlsx"):
+    def __init__(self, db_path: str = "logements.db", excel_path: str = "logements.xlsx",
+                 taille_pool: int = None, profil: str = None, taille_cache: int = None,
+                 lot_historique: int = None):
         self.db_path = db_path
         self.excel_path = excel_path
-        self.conn = None
+        if taille_pool is None:
+            taille_pool = int(os.environ.get('LOGEMENTS_POOL_LECTEURS', 4))
+        self.pool = PoolConnexions(db_path, taille_lecture=taille_pool,
+                                   timeout=float(os.environ.get('LOGEMENTS_POOL_TIMEOUT', 30)),
+                                   reglages=profil_sqlite(profil))
+        if taille_cache is None:
+            taille_cache = int(float(os.environ.get('LOGEMENTS_CACHE_MO', 64)) * 1024 * 1024)
+        self.cache = CacheRequetes(taille_cache) if taille_cache > 0 else None
+        self._local = threading.local()
+        self.journal = None
+        # Nombre d'entrées d'un logement entre deux instantanés de son état
+        self.intervalle_instantanes = int(os.environ.get('LOGEMENTS_HISTORIQUE_INSTANTANE', 20))
         self.init_database()
-        
+        # Historique hors transaction : écrit par lots en arrière-plan (0 : écriture immédiate)
+        if lot_historique is None:
+            lot_historique = int(os.environ.get('LOGEMENTS_HISTORIQUE_LOT', 500))
+        self.journal = JournalHistorique(
+            self.pool, lot_historique, float(os.environ.get('LOGEMENTS_HISTORIQUE_INTERVALLE_S', 1.0))
+        ) if lot_historique > 0 else None
+    
+    @property
+    def statistiques_import(self) -> Dict:
+        """Statistiques du dernier import lancé par le thread courant (session Streamlit)"""
+        return getattr(self._local, 'statistiques_import', {})
+    
+    @statistiques_import.setter
+    def statistiques_import(self, valeur: Dict):
+        self._local.statistiques_import = valeur
+    
     def init_database(self):
         """Initialise la base de données et crée les tables"""
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
-        
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS logements (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ilot TEXT,
-                logement TEXT,
-                decision TEXT,
-                date_decision TEXT,
-                nom_affectaire TEXT,
-                matricule TEXT,
-                nni TEXT,
-                profession TEXT,
-                fonction TEXT,
-                departement TEXT,
-                telephone TEXT,
-                en_activite TEXT,
-                a_la_retraite TEXT,
-                decede TEXT,
-                nom_repondant TEXT,
-                lien_parente TEXT,
-                tel_repondant TEXT,
-                pour_etat TEXT,
-                reforme TEXT,
-                decision2 TEXT,
-                date_decision2 TEXT,
-                observation TEXT,
-                latitude REAL,
-                longitude REAL,
-                adresse TEXT,
-                statut TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        with self.pool.ecriture() as conn:
+            self._creer_tables(conn.cursor())
+            self._migrer(conn)
+    
+    def _creer_tables(self, cursor: sqlite3.Cursor):
+        """Crée les tables absentes"""
+        cursor.execute(SCHEMA_LOGEMENTS.format(table='logements'))
         
         # Table pour l'historique des modifications
         cursor.execute("""
@@ -73,116 +1072,528 @@ class LogementDatabase:
             )
         """)
         
-        self.conn.commit()
+        # Empreintes des fichiers importés (évite de réimporter un fichier inchangé)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS imports (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chemin TEXT,
+                taille INTEGER,
+                mtime REAL,
+                hash_contenu TEXT,
+                mode TEXT,
+                lignes INTEGER,
+                details TEXT,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+    def _migrer(self, conn: sqlite3.Connection):
+        """Applique les migrations absentes de la base (mise à niveau sur place au démarrage)"""
+        cursor = conn.cursor()
+        if cursor.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRATIONS):
+            return
+        
+        # Verrou d'écriture avant de relire la version : un autre processus a pu migrer entre-temps
+        if not conn.in_transaction:
+            cursor.execute("BEGIN IMMEDIATE")
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        for numero, (description, etape) in enumerate(MIGRATIONS[version:], start=version + 1):
+            if isinstance(etape, str):
+                getattr(self, etape)(cursor)
+            else:
+                for requete in etape:
+                    cursor.execute(requete)
+            cursor.execute(f"PRAGMA user_version = {numero}")
+    
+    def version_schema(self) -> int:
+        """Version du schéma de la base (nombre de migrations appliquées)"""
+        with self.pool.lecture() as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+    
+    def _migrer_hash_import(self, cursor: sqlite3.Cursor):
+        """Migration 1 : colonne absente des bases créées avant l'import incrémental"""
+        self._ajouter_colonne_si_absente(cursor, "logements", "hash_import", "INTEGER")
+    
+    def _migrer_types(self, cursor: sqlite3.Cursor):
+        """Migration 9 : table logements reconstruite avec des colonnes typées
+        
+        SQLite ne change pas le type d'une colonne : les lignes sont copiées,
+        converties comme à l'import, dans une nouvelle table qui remplace
+        l'ancienne. Index et déclencheurs sont recréés, les tables dérivées
+        reconstruites, et la séquence des id conservée.
+        """
+        colonnes = [row[1] for row in cursor.execute("PRAGMA table_info(logements)")]
+        lues = [col for col in COLONNES_LOGEMENTS if col in colonnes]
+        objets = cursor.execute("SELECT sql FROM sqlite_master WHERE tbl_name = 'logements' "
+                                "AND type IN ('index', 'trigger') AND sql IS NOT NULL ORDER BY type").fetchall()
+        sequence = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'logements'").fetchone()
+        
+        cursor.execute(SCHEMA_LOGEMENTS.format(table='logements_typee'))
+        conversions = [CONVERSIONS.get(col) for col in lues]
+        insertion = f"INSERT INTO logements_typee ({', '.join(lues)}) VALUES ({', '.join(['?'] * len(lues))})"
+        lecture = cursor.connection.execute(f"SELECT {', '.join(lues)} FROM logements")
+        while True:
+            lot = lecture.fetchmany(10000)
+            if not lot:
+                break
+            cursor.executemany(insertion, [
+                tuple(conversion(valeur) if conversion else valeur for conversion, valeur in zip(conversions, row))
+                for row in lot
+            ])
+        
+        cursor.execute("DROP TABLE logements")
+        cursor.execute("ALTER TABLE logements_typee RENAME TO logements")
+        for (sql,) in objets:
+            cursor.execute(sql)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_logements_date_decision ON logements (date_decision)")
+        if sequence:
+            cursor.execute("UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = 'logements'", (sequence[0],))
+        for requete in RECONSTRUCTIONS:
+            cursor.execute(requete)
+    
+    def _ajouter_colonne_si_absente(self, cursor: sqlite3.Cursor, table: str, colonne: str, definition: str):
+        """Ajoute une colonne aux bases existantes créées avant son introduction"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        if colonne not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {colonne} {definition}")
+    
+    def _lire_excel(self, chemin: str) -> pd.DataFrame:
+        """Lit le fichier Excel et nettoie les noms de colonnes"""
+        df = pd.read_excel(chemin)
+        df.columns = df.columns.str.strip()
+        return df
+    
+    def importer_depuis_excel(self, taille_lot: int = 1000, par_lots: bool = True,
+                              mode: str = "remplacer", supprimer_absents: bool = False,
+                              flux: bool = True, force: bool = False, chemin: str = None) -> Tuple[int, str]:
+        """Importe les données depuis le fichier Excel
+        
+        Par défaut, le classeur est lu en flux (openpyxl en lecture seule) et
+        inséré par lots (executemany) dans une seule transaction, avec une
+        mémoire indépendante de la taille du fichier. ``flux=False`` passe par
+        un DataFrame complet converti colonne par colonne, ``par_lots=False``
+        conserve l'ancien chemin ligne par ligne (référence de comparaison).
+        ``mode="fusion"`` délègue à ``synchroniser_depuis_excel`` et ne réécrit
+        que les lignes nouvelles ou modifiées.
+        
+        Un fichier identique au dernier import (même empreinte) n'est pas
+        réimporté, sauf avec ``force=True``. ``chemin`` remplace le fichier
+        configuré (``excel_path``) pour cet import seulement.
+        """
+        chemin = chemin or self.excel_path
+        self.statistiques_import = {}
+        if not force and os.path.exists(chemin):
+            # Dernier import de ce fichier, à défaut le dernier import tout court
+            derniere = self.derniere_importation(os.path.abspath(chemin)) or self.derniere_importation()
+            if derniere and self._fichier_inchange(chemin, derniere):
+                self.statistiques_import = {'lignes': derniere['lignes'], 'ignore': True}
+                return derniere['lignes'], f"✓ Fichier inchangé depuis l'import du {derniere['timestamp']}, import ignoré"
+        
+        if mode == "fusion":
+            resultat = self.synchroniser_depuis_excel(supprimer_absents=supprimer_absents, taille_lot=taille_lot,
+                                                      chemin=chemin)
+            if 'erreur' in resultat:
+                return 0, resultat['message']
+            return resultat['inseres'] + resultat['modifies'], resultat['message']
         
-    def importer_depuis_excel(self) -> Tuple[int, str]:
-        """Importe les données depuis le fichier Excel"""
         try:
-            if not os.path.exists(self.excel_path):
-                return 0, f"Fichier {self.excel_path} introuvable"
-            
-            # Lire le fichier Excel
-            df = pd.read_excel(self.excel_path)
-            
-            # Nettoyer les noms de colonnes
-            df.columns = df.columns.str.strip()
-            
-            # Mapper les colonnes
-            column_mapping = {
-                'Ilot': 'ilot',
-                'Logement': 'logement',
-                'Décision': 'decision',
-                'Date Décision': 'date_decision',
-                'Nom de l\'Affectaire': 'nom_affectaire',
-                'Matricule': 'matricule',
-                'NNI': 'nni',
-                'Profession': 'profession',
-                'Fonction': 'fonction',
-                'Departement': 'departement',
-                'Téléphone': 'telephone',
-                'En Activité': 'en_activite',
-                'A la Retraite': 'a_la_retraite',
-                'Décédé': 'decede',
-                'Nom du repondant': 'nom_repondant',
-                'Lien de Parenté': 'lien_parente',
-                'N° Téléphone': 'tel_repondant',
-                'Pour l\'Etat': 'pour_etat',
-                'Reformé': 'reforme',
-            }
+            if not os.path.exists(chemin):
+                return 0, f"Fichier {chemin} introuvable"
+            
+            debut = time.perf_counter()
+            
+            # Effacer les données existantes et insérer les nouvelles
+            # dans une seule transaction
+            with self.pool.ecriture() as conn, self._declencheurs_suspendus(conn):
+                cursor = conn.cursor()
+                # Logements suivis par des instantanés : supprimés par le remplacement (nouveaux id)
+                remplaces = [ligne[0] for ligne in cursor.execute(
+                    "SELECT DISTINCT logement_id FROM historique_instantanes "
+                    "WHERE logement_id IN (SELECT id FROM logements)")]
+                cursor.execute("DELETE FROM logements")
+                cursor.execute("DELETE FROM empreintes_colonnes")
+                if not par_lots:
+                    count = self._inserer_ligne_par_ligne(cursor, self._lire_excel(chemin))
+                elif flux:
+                    count = self._inserer_lots(cursor, self._lire_excel_par_lots(chemin, taille_lot))
+                else:
+                    count = self._inserer_lots(cursor, self._lots_depuis_dataframe(self._lire_excel(chemin), taille_lot))
+                
+                self._enregistrer_import(cursor, chemin, "remplacer", count, f"{count} logements importés")
+                historique_id = self.ajouter_historique(None, "IMPORT", f"{count} logements importés depuis Excel",
+                                                        "Système")
+                self._ecrire_instantanes(conn, historique_id, dict.fromkeys(remplaces))
             
-            # Générer des coordonnées GPS fictives pour Nouakchott
-            # Centre de Nouakchott: 18.0735° N, 15.9582° W
-            base_lat = 18.0735
-            base_lon = -15.9582
-            
-            # Ajouter des coordonnées variées selon l'îlot
-            ilots_coords = {
-                'A': (18.08, -15.96),
-                'B': (18.09, -15.95),
-                'C': (18.07, -15.97),
-                'D': (18.06, -15.96),
-                'E': (18.08, -15.94),
-                'F': (18.09, -15.97),
-                'G': (18.07, -15.95),
-                'H': (18.06, -15.94),
+            duree = time.perf_counter() - debut
+            debit = count / duree if duree > 0 else 0.0
+            self.statistiques_import = {
+                'lignes': count,
+                'duree': duree,
+                'lignes_par_seconde': debit,
             }
             
-            # Effacer les données existantes
-            cursor = self.conn.cursor()
-            cursor.execute("DELETE FROM logements")
+            return count, f"✓ {count} logements importés avec succès ({debit:.0f} lignes/s)"
             
-            # Insérer les nouvelles données
-            count = 0
-            for idx, row in df.iterrows():
-                ilot = str(row.get('Ilot', '')).strip()
-                base_coords = ilots_coords.get(ilot, (base_lat, base_lon))
-                
-                # Variation aléatoire pour chaque logement
-                import random
-                lat = base_coords[0] + random.uniform(-0.01, 0.01)
-                lon = base_coords[1] + random.uniform(-0.01, 0.01)
-                
-                cursor.execute("""
-                    INSERT INTO logements (
-                        ilot, logement, decision, date_decision, nom_affectaire,
-                        matricule, nni, profession, fonction, departement,
-                        telephone, en_activite, a_la_retraite, decede,
-                        nom_repondant, lien_parente, tel_repondant,
-                        pour_etat, reforme, latitude, longitude, statut
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    str(row.get('Ilot', '')),
-                    str(row.get('Logement', '')),
-                    str(row.get('Décision', '')),
-                    str(row.get('Date Décision', '')),
-                    str(row.get('Nom de l\'Affectaire', '')),
-                    str(row.get('Matricule', '')),
-                    str(row.get('NNI', '')),
-                    str(row.get('Profession', '')),
-                    str(row.get('Fonction', '')),
-                    str(row.get('Departement', '')),
-                    str(row.get('Téléphone', '')),
-                    str(row.get('En Activité', '')),
-                    str(row.get('A la Retraite', '')),
-                    str(row.get('Décédé', '')),
-                    str(row.get('Nom du repondant', '')),
-                    str(row.get('Lien de Parenté', '')),
-                    str(row.get('N° Téléphone', '')),
-                    str(row.get('Pour l\'Etat', '')),
-                    str(row.get('Reformé', '')),
-                    lat,
-                    lon,
-                    'Actif'
+        except Exception as e:
+            return 0, f"✗ Erreur lors de l'importation: {str(e)}"
+    
+    @contextmanager
+    def _declencheurs_suspendus(self, conn: sqlite3.Connection):
+        """Retire les déclencheurs de logements le temps d'une réécriture complète de la table
+        
+        Évite une mise à jour ligne par ligne de l'index plein texte et des
+        facettes (et permet à SQLite de vider la table d'un coup) : elles sont
+        reconstruites en bloc en sortie, puis les déclencheurs recréés, dans la
+        même transaction.
+        """
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        declencheurs = conn.execute("SELECT name, sql FROM sqlite_master "
+                                    "WHERE type = 'trigger' AND tbl_name = 'logements'").fetchall()
+        for nom, _ in declencheurs:
+            conn.execute(f"DROP TRIGGER {nom}")
+        yield
+        for requete in RECONSTRUCTIONS:
+            conn.execute(requete)
+        for _, sql in declencheurs:
+            conn.execute(sql)
+    
+    def _lire_excel_par_lots(self, chemin: str, taille_lot: int = 1000) -> Iterator[List[tuple]]:
+        """Lit le classeur ligne à ligne (openpyxl read_only) et produit des lots de taille fixe
+        
+        Les en-têtes passent par COLUMN_MAPPING et les cellules sont converties
+        comme le ferait ``pd.read_excel`` suivi de ``str(valeur)``. Seul le lot
+        courant est gardé en mémoire.
+        """
+        wb = openpyxl.load_workbook(chemin, read_only=True, data_only=True)
+        try:
+            lignes = wb.active.iter_rows(values_only=True)
+            entetes = next(lignes, None)
+            if entetes is None:
+                return
+            
+            # Première occurrence de chaque en-tête (pandas renomme les suivantes)
+            positions = {}
+            for i, nom in enumerate(entetes):
+                if nom is not None:
+                    positions.setdefault(str(nom).strip(), i)
+            indices = [positions.get(source) for source in COLUMN_MAPPING]
+            # Ligne vide intercalée : cellules manquantes (NULL au stockage), '' hors du fichier
+            ligne_vide = tuple(None if i is not None else '' for i in indices)
+            
+            lot = []
+            vides = 0
+            for row in lignes:
+                if all(v is None or v == '' for v in row):
+                    # Les lignes vides ne comptent que si des données suivent
+                    vides += 1
+                    continue
+                if vides:
+                    lot.extend([ligne_vide] * vides)
+                    vides = 0
+                lot.append(tuple(
+                    _convertir_cellule(row[i] if i < len(row) else None) if i is not None else ''
+                    for i in indices
                 ))
-                count += 1
+                if len(lot) >= taille_lot:
+                    yield lot
+                    lot = []
+            if lot:
+                yield lot
+        finally:
+            wb.close()
+    
+    def _lots_depuis_dataframe(self, df: pd.DataFrame, taille_lot: int) -> Iterator[List[tuple]]:
+        """Découpe un DataFrame converti colonne par colonne en lots de lignes"""
+        valeurs = list(zip(*self._convertir_colonnes(df)))
+        for debut in range(0, len(valeurs), taille_lot):
+            yield valeurs[debut:debut + taille_lot]
+    
+    def _convertir_colonnes(self, df: pd.DataFrame) -> List[list]:
+        """Convertit les colonnes importées, une opération par colonne (équivalent à str(valeur))"""
+        n = len(df)
+        colonnes = []
+        for source in COLUMN_MAPPING:
+            if source in df.columns:
+                colonnes.append(df[source].astype(object).astype(str).tolist())
+            else:
+                colonnes.append([''] * n)
+        return colonnes
+    
+    def _generer_coordonnees(self, ilots: List[str]) -> Tuple[list, list]:
+        """Coordonnées de base par îlot puis variation aléatoire pour chaque logement"""
+        n = len(ilots)
+        ilots = pd.Series(ilots, dtype=object).str.strip()
+        base_lat = ilots.map({k: v[0] for k, v in ILOTS_COORDS.items()}).fillna(CENTRE_NOUAKCHOTT[0]).to_numpy(dtype=float)
+        base_lon = ilots.map({k: v[1] for k, v in ILOTS_COORDS.items()}).fillna(CENTRE_NOUAKCHOTT[1]).to_numpy(dtype=float)
+        rng = np.random.default_rng()
+        return (base_lat + rng.uniform(-0.01, 0.01, n)).tolist(), (base_lon + rng.uniform(-0.01, 0.01, n)).tolist()
+    
+    @staticmethod
+    def _empreinte_ligne(valeurs: tuple) -> int:
+        """Empreinte 64 bits des valeurs importées d'une ligne
+        
+        Une cellule manquante (None) compte comme 'nan', sa forme après
+        ``pd.read_excel`` et ``str()`` : l'empreinte ne dépend pas du chemin de lecture.
+        """
+        contenu = '\x1f'.join('nan' if v is None else str(v) for v in valeurs).encode('utf-8')
+        return int.from_bytes(hashlib.blake2b(contenu, digest_size=8).digest(), 'big', signed=True)
+    
+    @staticmethod
+    def _empreintes_colonnes(valeurs: tuple) -> bytes:
+        """Empreintes crc32 de chaque valeur importée d'une ligne, 4 octets par colonne"""
+        return b''.join(zlib.crc32(('nan' if v is None else str(v)).encode('utf-8')).to_bytes(4, 'big')
+                        for v in valeurs)
+    
+    def _inserer_lots(self, cursor: sqlite3.Cursor, lots: Iterable[List[tuple]]) -> int:
+        """Insère les lots de valeurs importées avec executemany"""
+        count = 0
+        for lot in lots:
+            latitudes, longitudes = self._generer_coordonnees([v[0] for v in lot])
+            # Empreinte calculée sur les valeurs lues, stockage typé
+            empreintes = [self._empreinte_ligne(v) for v in lot]
+            cursor.executemany(INSERT_IMPORT, [
+                _typer_import(v) + (lat, lon, 'Actif', h)
+                for v, h, lat, lon in zip(lot, empreintes, latitudes, longitudes)
+            ])
+            cursor.executemany(INSERT_EMPREINTES_COLONNES,
+                               [(h, self._empreintes_colonnes(v)) for v, h in zip(lot, empreintes)])
+            count += len(lot)
+        
+        return count
+    
+    def _inserer_ligne_par_ligne(self, cursor: sqlite3.Cursor, df: pd.DataFrame) -> int:
+        """Insère les lignes une par une (ancien chemin d'import)"""
+        count = 0
+        for idx, row in df.iterrows():
+            ilot = str(row.get('Ilot', '')).strip()
+            base_coords = ILOTS_COORDS.get(ilot, CENTRE_NOUAKCHOTT)
+            
+            # Variation aléatoire pour chaque logement
+            lat = base_coords[0] + random.uniform(-0.01, 0.01)
+            lon = base_coords[1] + random.uniform(-0.01, 0.01)
             
-            self.conn.commit()
-            self.ajouter_historique(None, "IMPORT", f"{count} logements importés depuis Excel", "Système")
+            valeurs = tuple(str(row.get(source, '')) for source in COLUMN_MAPPING)
+            empreinte = self._empreinte_ligne(valeurs)
+            cursor.execute(INSERT_IMPORT, _typer_import(valeurs) + (lat, lon, 'Actif', empreinte))
+            cursor.execute(INSERT_EMPREINTES_COLONNES, (empreinte, self._empreintes_colonnes(valeurs)))
+            count += 1
+        
+        return count
+    
+    def synchroniser_depuis_excel(self, supprimer_absents: bool = False, simulation: bool = False,
+                                  taille_lot: int = 1000, chemin: str = None) -> Dict:
+        """Import incrémental sur la clé naturelle (ilot, logement)
+        
+        Insère les nouvelles lignes, ne met à jour que celles dont l'empreinte a
+        changé et, si demandé, supprime celles absentes du fichier. Les
+        identifiants, dates de création et coordonnées sont conservés ; une
+        ligne modifiée ne voit réécrites que les colonnes changées dans le
+        fichier depuis l'import précédent, les autres saisies faites dans
+        l'application restent en place. Une ligne sans empreinte (antérieure aux
+        imports incrémentaux) compte comme inchangée : seule son empreinte est
+        enregistrée. ``simulation=True`` renvoie le différentiel sans rien écrire.
+        """
+        chemin = chemin or self.excel_path
+        resultat = {'inseres': 0, 'modifies': 0, 'inchanges': 0, 'supprimes': 0, 'doublons': 0}
+        try:
+            if not os.path.exists(chemin):
+                resultat['erreur'] = True
+                resultat['message'] = f"Fichier {chemin} introuvable"
+                return resultat
             
-            return count, f"✓ {count} logements importés avec succès"
+            debut = time.perf_counter()
             
+            # Dernière occurrence de chaque clé dans le fichier : valeurs typées, empreintes
+            # de la ligne et de chaque colonne des valeurs lues
+            entrantes = {}
+            total = 0
+            for lot in self._lire_excel_par_lots(chemin, taille_lot):
+                total += len(lot)
+                for valeurs in lot:
+                    typees = _typer_import(valeurs)
+                    entrantes[(typees[0], typees[1])] = (typees, self._empreinte_ligne(valeurs),
+                                                         self._empreintes_colonnes(valeurs))
+            resultat['doublons'] = total - len(entrantes)
+            
+            # La simulation ne fait que lire, l'import prend la connexion d'écriture
+            with (self.pool.lecture() if simulation else self.pool.ecriture()) as conn:
+                cursor = conn.cursor()
+                
+                # Empreintes des lignes existantes (None pour une ligne antérieure aux empreintes)
+                cursor.execute("SELECT id, hash_import, ilot, logement FROM logements")
+                existantes = {}
+                for row in cursor.fetchall():
+                    existantes.setdefault((row['ilot'], row['logement']), (row['id'], row['hash_import']))
+                
+                # Sans empreinte, rien ne distingue une saisie dans l'application d'un
+                # changement du fichier : la ligne est conservée et l'empreinte reprise
+                a_inserer, a_modifier, a_reprendre = [], [], []
+                for cle, (valeurs, empreinte, colonnes) in entrantes.items():
+                    if cle not in existantes:
+                        a_inserer.append((cle, valeurs, empreinte, colonnes))
+                    elif existantes[cle][1] is None:
+                        a_reprendre.append((cle, valeurs, empreinte, colonnes))
+                    elif existantes[cle][1] != empreinte:
+                        a_modifier.append((cle, valeurs, empreinte, colonnes))
+                a_supprimer = [cle for cle in existantes if cle not in entrantes] if supprimer_absents else []
+                
+                resultat['inseres'] = len(a_inserer)
+                resultat['modifies'] = len(a_modifier)
+                resultat['supprimes'] = len(a_supprimer)
+                resultat['inchanges'] = len(entrantes) - len(a_inserer) - len(a_modifier)
+                
+                if simulation:
+                    resultat['simulation'] = True
+                    resultat['details'] = {
+                        'inseres': [cle for cle, *_ in a_inserer],
+                        'modifies': [cle for cle, *_ in a_modifier],
+                        'supprimes': a_supprimer,
+                    }
+                    resultat['message'] = (f"Simulation: {resultat['inseres']} à insérer, {resultat['modifies']} à modifier, "
+                                           f"{resultat['inchanges']} inchangés, {resultat['supprimes']} à supprimer")
+                    return resultat
+                
+                # Écritures proportionnelles au différentiel, dans une seule transaction
+                if a_inserer:
+                    latitudes, longitudes = self._generer_coordonnees([v[0] for _, v, _, _ in a_inserer])
+                    lignes = [v + (lat, lon, 'Actif', h)
+                              for (_, v, h, _), lat, lon in zip(a_inserer, latitudes, longitudes)]
+                    for i in range(0, len(lignes), taille_lot):
+                        cursor.executemany(INSERT_IMPORT, lignes[i:i + taille_lot])
+                
+                if a_modifier:
+                    # Différences par champ de chaque ligne modifiée, rejouées par etat_au
+                    for logement_id, differences, ancien in self._fusionner_colonnes(conn, a_modifier, existantes,
+                                                                                     taille_lot):
+                        historique_id = self.ajouter_historique(
+                            logement_id, "UPDATE", json.dumps(differences, ensure_ascii=False), "Système")
+                        self._instantane_periodique(conn, logement_id, historique_id, ancien)
+                
+                if a_reprendre:
+                    cursor.executemany("UPDATE logements SET hash_import = ? WHERE id = ?",
+                                       [(h, existantes[cle][0]) for cle, _, h, _ in a_reprendre])
+                
+                if a_supprimer:
+                    cursor.executemany("DELETE FROM logements WHERE id = ?",
+                                       [(existantes[cle][0],) for cle in a_supprimer])
+                
+                # Empreintes par colonne des valeurs lues, base de la prochaine fusion
+                cursor.executemany(INSERT_EMPREINTES_COLONNES, [
+                    (h, colonnes) for _, _, h, colonnes in a_inserer + a_modifier + a_reprendre
+                ])
+                if a_modifier or a_supprimer:
+                    cursor.execute("DELETE FROM empreintes_colonnes WHERE hash_import NOT IN "
+                                   "(SELECT hash_import FROM logements WHERE hash_import IS NOT NULL)")
+                
+                resultat['message'] = (f"✓ Import incrémental: {resultat['inseres']} insérés, {resultat['modifies']} modifiés, "
+                                       f"{resultat['inchanges']} inchangés, {resultat['supprimes']} supprimés")
+                self._enregistrer_import(cursor, chemin, "fusion", total, resultat['message'].lstrip('✓ '))
+                historique_id = self.ajouter_historique(None, "IMPORT", resultat['message'].lstrip('✓ '), "Système")
+                # Instantanés vides des lignes supprimées, comme pour une suppression par lot
+                self._ecrire_instantanes(conn, historique_id, {existantes[cle][0]: None for cle in a_supprimer})
+            
+            duree = time.perf_counter() - debut
+            self.statistiques_import = dict(resultat, lignes=total, duree=duree,
+                                            lignes_par_seconde=total / duree if duree > 0 else 0.0)
+            
+            return resultat
+        
         except Exception as e:
-            return 0, f"✗ Erreur lors de l'importation: {str(e)}"
+            resultat['erreur'] = True
+            resultat['message'] = f"✗ Erreur lors de l'importation: {str(e)}"
+            return resultat
+    
+    def _fusionner_colonnes(self, conn: sqlite3.Connection, a_modifier: List[tuple], existantes: Dict,
+                            taille_lot: int) -> List[Tuple[int, Dict, Dict]]:
+        """Met à jour les lignes modifiées dans le fichier, colonne par colonne
+        
+        Seules les colonnes dont la valeur lue a changé depuis l'import
+        précédent (empreintes par colonne) sont réécrites : une saisie faite
+        dans l'application sur une autre colonne est conservée. Une ligne
+        importée avant les empreintes par colonne est réécrite en entier. Les
+        lignes sont regroupées par ensemble de colonnes, une requête chacun.
+        Renvoie, pour chaque logement dont une valeur change, son id, ses
+        différences {colonne: [avant, après]} et son état précédent.
+        """
+        colonnes_import = tuple(COLUMN_MAPPING.values())
+        anciennes = list({existantes[cle][1] for cle, *_ in a_modifier})
+        precedentes = {}
+        for i in range(0, len(anciennes), taille_lot):
+            bloc = anciennes[i:i + taille_lot]
+            precedentes.update(conn.execute(
+                f"SELECT hash_import, colonnes FROM empreintes_colonnes "
+                f"WHERE hash_import IN ({', '.join(['?'] * len(bloc))})", bloc).fetchall())
+        etats = self._etats(conn, [existantes[cle][0] for cle, *_ in a_modifier])
+        
+        par_colonnes, journal = {}, []
+        for cle, valeurs, empreinte, colonnes in a_modifier:
+            logement_id, ancienne = existantes[cle]
+            avant = precedentes.get(ancienne)
+            indices = [i for i in range(len(colonnes_import))
+                       if avant is None or avant[4 * i:4 * i + 4] != colonnes[4 * i:4 * i + 4]]
+            par_colonnes.setdefault(tuple(colonnes_import[i] for i in indices), []).append(
+                tuple(valeurs[i] for i in indices) + (empreinte, logement_id))
+            ancien = etats[logement_id]
+            differences = {colonnes_import[i]: [ancien[colonnes_import[i]], valeurs[i]] for i in indices
+                           if ancien[colonnes_import[i]] != valeurs[i]}
+            if differences:
+                journal.append((logement_id, differences, ancien))
+        
+        for colonnes, lignes in par_colonnes.items():
+            for i in range(0, len(lignes), taille_lot):
+                conn.executemany(_update_import(colonnes), lignes[i:i + taille_lot])
+        return journal
+    
+    def _empreinte_fichier(self, chemin: str, avec_hash: bool = True) -> Dict:
+        """Empreinte du fichier source : chemin, taille, date de modification et hash du contenu"""
+        infos = os.stat(chemin)
+        empreinte = {
+            'chemin': os.path.abspath(chemin),
+            'taille': infos.st_size,
+            'mtime': infos.st_mtime,
+        }
+        if avec_hash:
+            sha = hashlib.sha256()
+            with open(chemin, 'rb') as f:
+                for bloc in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(bloc)
+            empreinte['hash_contenu'] = sha.hexdigest()
+        return empreinte
+    
+    def _fichier_inchange(self, chemin: str, derniere: Dict) -> bool:
+        """Compare le fichier source à l'empreinte du dernier import"""
+        empreinte = self._empreinte_fichier(chemin, avec_hash=False)
+        if (empreinte['chemin'], empreinte['taille'], empreinte['mtime']) == \
+                (derniere['chemin'], derniere['taille'], derniere['mtime']):
+            return True
+        # Taille ou date différente : seul le contenu fait foi
+        return empreinte['taille'] == derniere['taille'] and \
+            self._empreinte_fichier(chemin)['hash_contenu'] == derniere['hash_contenu']
+    
+    def _enregistrer_import(self, cursor: sqlite3.Cursor, chemin: str, mode: str, lignes: int, details: str):
+        """Enregistre l'empreinte du fichier importé dans la transaction d'import"""
+        empreinte = self._empreinte_fichier(chemin)
+        cursor.execute("""
+            INSERT INTO imports (chemin, taille, mtime, hash_contenu, mode, lignes, details)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (empreinte['chemin'], empreinte['taille'], empreinte['mtime'],
+              empreinte['hash_contenu'], mode, lignes, details))
+    
+    def derniere_importation(self, chemin: str = None) -> Optional[Dict]:
+        """Renvoie la date, le fichier et le résultat du dernier import (éventuellement d'un fichier donné)"""
+        try:
+            with self.pool.lecture() as conn:
+                cursor = conn.cursor()
+                if chemin:
+                    cursor.execute("SELECT * FROM imports WHERE chemin = ? ORDER BY id DESC LIMIT 1", (chemin,))
+                else:
+                    cursor.execute("SELECT * FROM imports ORDER BY id DESC LIMIT 1")
+                row = cursor.fetchone()
+            return dict(row) if row else None
+        except Exception as e:
+            print(f"Erreur lecture imports: {e}")
+            return None
     
     def exporter_vers_excel(self, output_path: str = None) -> Tuple[bool, str]:
         """Exporte les données vers un fichier Excel"""
@@ -194,7 +1605,7 @@ class LogementDatabase:
             df = self.lire_tous()
             
             # Retirer les colonnes techniques
-            cols_to_remove = ['id', 'created_at', 'updated_at']
+            cols_to_remove = ['id', 'created_at', 'updated_at', 'hash_import']
             df = df.drop(columns=[col for col in cols_to_remove if col in df.columns])
             
             # Écrire dans Excel
@@ -211,21 +1622,22 @@ class LogementDatabase:
     def creer_logement(self, data: Dict) -> Tuple[int, str]:
         """Crée un nouveau logement"""
         try:
-            cursor = self.conn.cursor()
-            
-            columns = ', '.join(data.keys())
+            data = typer_logement(data)
+            columns = ', '.join(self._verifier_colonne(col) for col in data)
             placeholders = ', '.join(['?' for _ in data])
             values = tuple(data.values())
             
-            cursor.execute(f"""
-                INSERT INTO logements ({columns})
-                VALUES ({placeholders})
-            """, values)
-            
-            logement_id = cursor.lastrowid
-            self.conn.commit()
-            
-            self.ajouter_historique(logement_id, "CREATE", json.dumps(data, ensure_ascii=False), "Utilisateur")
+            with self.pool.ecriture() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"""
+                    INSERT INTO logements ({columns})
+                    VALUES ({placeholders})
+                """, values)
+                
+                logement_id = cursor.lastrowid
+                historique_id = self.ajouter_historique(logement_id, "CREATE", json.dumps(data, ensure_ascii=False),
+                                                        "Utilisateur")
+                self._ecrire_instantanes(conn, historique_id, self._etats(conn, [logement_id]))
             
             return logement_id, "✓ Logement créé avec succès"
             
@@ -236,9 +1648,10 @@ class LogementDatabase:
     def lire_logement(self, logement_id: int) -> Optional[Dict]:
         """Lit un logement par son ID"""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT * FROM logements WHERE id = ?", (logement_id,))
-            row = cursor.fetchone()
+            with self.pool.lecture() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT * FROM logements WHERE id = ?", (logement_id,))
+                row = cursor.fetchone()
             
             if row:
                 return dict(row)
@@ -248,171 +1661,863 @@ class LogementDatabase:
             print(f"Erreur lecture: {e}")
             return None
     
-    def lire_tous(self, filtre: Dict = None) -> pd.DataFrame:
-        """Lit tous les logements avec filtres optionnels"""
-        try:
-            query = "SELECT * FROM logements WHERE 1=1"
-            params = []
-            
-            if filtre:
-                for key, value in filtre.items():
-                    if value and value != "Tous":
-                        query += f" AND {key} = ?"
-                        params.append(value)
+    @staticmethod
+    def _verifier_colonne(colonne: str) -> str:
+        """Refuse toute colonne hors de la liste blanche (les noms sont insérés dans le SQL)"""
+        if colonne not in COLONNES_LOGEMENTS:
+            raise ValueError(f"Colonne inconnue: {colonne}")
+        return colonne
+    
+    def _clause_filtre(self, filtre: Dict = None) -> Tuple[str, list]:
+        """Conditions SQL d'un filtre {colonne[__operateur]: valeur}
+        
+        Sans opérateur : égalité (IN pour une liste) ; 'dans' : IN ;
+        'commence' : préfixe (sensible à la casse) ; 'nul' : True pour les
+        valeurs absentes, False pour les présentes ; 'min' / 'max' : bornes
+        incluses (dates acceptées pour les colonnes de EXPRESSIONS_DATE).
+        Les valeurs vides et "Tous" sont ignorées, comme dans les sélecteurs.
+        """
+        conditions, params = [], []
+        for key, value in (filtre or {}).items():
+            colonne, _, operateur = key.partition('__')
+            self._verifier_colonne(colonne)
+            if operateur not in OPERATEURS_FILTRE:
+                raise ValueError(f"Opérateur de filtre inconnu: {operateur}")
             
-            query += " ORDER BY ilot, logement"
+            if operateur == 'nul':
+                absent = f"({colonne} IS NULL OR {colonne} IN ('', 'nan'))"
+                conditions.append(absent if value else f"NOT {absent}")
+            elif operateur == 'dans' or (operateur == '' and isinstance(value, (list, tuple, set))):
+                valeurs = list(value)
+                conditions.append(f"{colonne} IN ({', '.join(['?'] * len(valeurs))})" if valeurs else "0")
+                params.extend(valeurs)
+            elif value is None or value == '' or value == "Tous":
+                continue
+            elif operateur == 'commence':
+                # Intervalle [préfixe, préfixe + U+10FFFF[ : utilisable par les index, contrairement à LIKE
+                conditions.append(f"{colonne} >= ? AND {colonne} < ?")
+                params.extend([value, value + '\U0010FFFF'])
+            elif operateur in ('min', 'max'):
+                expression = EXPRESSIONS_DATE.get(colonne, colonne)
+                if hasattr(value, 'strftime'):
+                    if colonne not in ('created_at', 'updated_at'):
+                        value = value.strftime('%Y-%m-%d')
+                    elif isinstance(value, datetime):
+                        value = value.strftime('%Y-%m-%d %H:%M:%S')
+                    else:
+                        # Une date seule en borne haute couvre toute la journée
+                        value = value.strftime('%Y-%m-%d') + (' 23:59:59' if operateur == 'max' else '')
+                conditions.append(f"{expression} {'>=' if operateur == 'min' else '<='} ?")
+                params.append(value)
+            else:
+                # 0 et False filtrent aussi (statuts en 0/1)
+                conditions.append(f"{colonne} = ?")
+                params.append(value)
+        return ' AND '.join(conditions) or '1=1', params
+    
+    def _projection(self, colonnes: List[str] = None, cles: Iterable[str] = (), prefixe: str = '') -> str:
+        """Liste SELECT des colonnes demandées, complétée par les clés de tri (toutes si None)"""
+        if colonnes is None:
+            return f"{prefixe}*"
+        selection = [self._verifier_colonne(col) for col in colonnes]
+        for cle in ('id', *cles):
+            if cle in COLONNES_LOGEMENTS and cle not in selection:
+                selection.append(cle)
+        return ', '.join(f"{prefixe}{col}" for col in selection)
+    
+    def _lire_page(self, conn: sqlite3.Connection, query: str, params: list, cles: Tuple[str, ...],
+                   taille_page: int) -> pd.DataFrame:
+        """Exécute une requête de page (taille_page + 1 lignes) et calcule le curseur suivant"""
+        df = pd.read_sql_query(query, conn, params=params + [taille_page + 1])
+        suivant = None
+        if len(df) > taille_page:
+            df = df.iloc[:taille_page]
+            suivant = tuple(_valeur_sql(df[cle].iloc[-1]) for cle in cles)
+        df.attrs['curseur_suivant'] = suivant
+        return df
+    
+    @_en_cache
+    def lire_tous(self, filtre: Dict = None, taille_page: int = None, apres: Tuple = None,
+                  tri: str = 'ilot', descendant: bool = False, colonnes: List[str] = None) -> pd.DataFrame:
+        """Lit tous les logements avec filtres optionnels (voir _clause_filtre)
+        
+        colonnes limite la lecture aux colonnes nommées (plus id et les clés de tri).
+        
+        Avec taille_page, ne lit qu'une page : pagination par curseur sur les
+        clés de TRIS[tri] (apres = df.attrs['curseur_suivant'] de la page
+        précédente). La page porte aussi le total dans df.attrs['total'].
+        """
+        try:
+            cles = TRIS[tri]
+            ordre = ', '.join(f"{cle} {'DESC' if descendant else 'ASC'}" for cle in cles)
+            where, params = self._clause_filtre(filtre)
+            selection = self._projection(colonnes, cles)
             
-            df = pd.read_sql_query(query, self.conn, params=params)
+            with self.pool.lecture() as conn:
+                if taille_page is None:
+                    return pd.read_sql_query(f"SELECT {selection} FROM logements WHERE {where} ORDER BY {ordre}",
+                                             conn, params=params)
+                
+                total = conn.execute(f"SELECT COUNT(*) FROM logements WHERE {where}", params).fetchone()[0]
+                params_page = list(params)
+                if apres is not None:
+                    condition, params_apres = _condition_apres(cles, apres, descendant)
+                    where += f" AND {condition}"
+                    params_page += params_apres
+                df = self._lire_page(conn, f"SELECT {selection} FROM logements WHERE {where} ORDER BY {ordre} LIMIT ?",
+                                     params_page, cles, taille_page)
+            df.attrs['total'] = total
             return df
             
         except Exception as e:
-            print(f"Erreur lecture tous: {e}")
+            _echec_lecture(f"Erreur lecture tous: {e}")
             return pd.DataFrame()
     
+    def _clause_zone(self, zone: Tuple[float, float, float, float], filtre: Dict = None) -> Tuple[str, list]:
+        """Condition : position dans la zone (sud, ouest, nord, est) et filtre éventuel"""
+        sud, ouest, nord, est = (float(borne) for borne in zone)
+        where, params = self._clause_filtre(filtre)
+        # L'index spatial présélectionne (flottants 32 bits arrondis vers l'extérieur),
+        # les colonnes de logements tranchent aux bords
+        return (f"""id IN (SELECT id FROM logements_zones
+                           WHERE lat_max >= ? AND lat_min <= ? AND lon_max >= ? AND lon_min <= ?)
+                    AND latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ? AND {where}""",
+                [sud, nord, ouest, est, sud, nord, ouest, est] + params)
+    
+    @_en_cache
+    def lire_dans_zone(self, zone: Tuple[float, float, float, float], filtre: Dict = None,
+                       limite: int = None, colonnes: List[str] = None) -> pd.DataFrame:
+        """Logements situés dans la zone (sud, ouest, nord, est), par l'index spatial
+        
+        filtre et colonnes comme pour lire_tous ; au plus limite lignes (par id),
+        df.attrs['total'] donnant le nombre de logements de la zone.
+        """
+        try:
+            where, params = self._clause_zone(zone, filtre)
+            query = f"SELECT {self._projection(colonnes)} FROM logements WHERE {where} ORDER BY id"
+            with self.pool.lecture() as conn:
+                total = conn.execute(f"SELECT COUNT(*) FROM logements WHERE {where}", params).fetchone()[0]
+                if limite is not None:
+                    query += " LIMIT ?"
+                    params = params + [limite]
+                df = pd.read_sql_query(query, conn, params=params)
+            df.attrs['total'] = total
+            return df
+        
+        except Exception as e:
+            _echec_lecture(f"Erreur lecture zone: {e}")
+            return pd.DataFrame()
+    
+    @_en_cache
+    def compter_dans_zone(self, zone: Tuple[float, float, float, float], filtre: Dict = None,
+                          divisions: int = 8) -> pd.DataFrame:
+        """Nombre de logements par case d'une grille divisions × divisions couvrant la zone
+        
+        Colonnes latitude et longitude (position moyenne des logements de la
+        case) et nombre, les cases les plus peuplées en premier.
+        """
+        try:
+            sud, ouest, nord, est = (float(borne) for borne in zone)
+            pas_lat = (nord - sud) / divisions or 1.0
+            pas_lon = (est - ouest) / divisions or 1.0
+            where, params = self._clause_zone(zone, filtre)
+            query = f"""
+                SELECT AVG(latitude) AS latitude, AVG(longitude) AS longitude, COUNT(*) AS nombre
+                FROM logements WHERE {where}
+                GROUP BY min(CAST((latitude - ?) / ? AS INTEGER), ?), min(CAST((longitude - ?) / ? AS INTEGER), ?)
+                ORDER BY nombre DESC
+            """
+            params = params + [sud, pas_lat, divisions - 1, ouest, pas_lon, divisions - 1]
+            with self.pool.lecture() as conn:
+                return pd.read_sql_query(query, conn, params=params)
+        
+        except Exception as e:
+            _echec_lecture(f"Erreur comptage zone: {e}")
+            return pd.DataFrame(columns=['latitude', 'longitude', 'nombre'])
+    
     # CRUD - Update
     def modifier_logement(self, logement_id: int, data: Dict) -> Tuple[bool, str]:
-        """Modifie un logement existant"""
+        """Modifie un logement existant
+        
+        Seules les colonnes dont la valeur change sont écrites ; l'historique
+        garde leurs différences {colonne: [avant, après]}.
+        """
         try:
-            cursor = self.conn.cursor()
-            
-            # Construire la requête UPDATE
-            set_clause = ', '.join([f"{key} = ?" for key in data.keys()])
-            set_clause += ", updated_at = CURRENT_TIMESTAMP"
-            values = tuple(data.values()) + (logement_id,)
-            
-            cursor.execute(f"""
-                UPDATE logements 
-                SET {set_clause}
-                WHERE id = ?
-            """, values)
+            data = typer_logement(data)
+            for col in data:
+                self._verifier_colonne(col)
             
-            self.conn.commit()
-            
-            self.ajouter_historique(logement_id, "UPDATE", json.dumps(data, ensure_ascii=False), "Utilisateur")
+            with self.pool.ecriture() as conn:
+                ligne = conn.execute("SELECT * FROM logements WHERE id = ?", (logement_id,)).fetchone()
+                if ligne is None:
+                    raise ValueError("Logement introuvable")
+                ancien = dict(ligne)
+                differences = {col: [ancien[col], valeur] for col, valeur in data.items() if ancien[col] != valeur}
+                if not differences:
+                    return True, "✓ Aucune modification à enregistrer"
+                
+                set_clause = ', '.join(f"{col} = ?" for col in differences)
+                conn.execute(f"""
+                    UPDATE logements
+                    SET {set_clause}, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, tuple(apres for _, apres in differences.values()) + (logement_id,))
+                historique_id = self.ajouter_historique(logement_id, "UPDATE",
+                                                        json.dumps(differences, ensure_ascii=False), "Utilisateur")
+                self._instantane_periodique(conn, logement_id, historique_id, ancien)
             
             return True, "✓ Logement modifié avec succès"
             
         except Exception as e:
             return False, f"✗ Erreur lors de la modification: {str(e)}"
     
+    @staticmethod
+    def _etats(conn: sqlite3.Connection, ids: List[int]) -> Dict[int, Dict]:
+        """Lignes complètes des logements, indexées par id"""
+        return {ligne['id']: dict(ligne) for ligne in conn.execute(
+            "SELECT * FROM logements WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(ids),))}
+    
+    @staticmethod
+    def _ecrire_instantanes(conn: sqlite3.Connection, historique_id: int, etats: Dict[int, Optional[Dict]],
+                            decalage: int = 0):
+        """Enregistre l'état de chaque logement après l'entrée historique_id - decalage"""
+        conn.executemany(INSERT_INSTANTANE, [
+            (logement_id, decalage, None if etat is None else json.dumps(etat, ensure_ascii=False), historique_id)
+            for logement_id, etat in etats.items()])
+    
+    def _instantane_periodique(self, conn: sqlite3.Connection, logement_id: int, historique_id: int, ancien: Dict):
+        """Instantané du logement toutes les intervalle_instantanes entrées
+        
+        Un logement sans instantané (importé, ou modifié avant cette version)
+        reçoit celui de son état précédant la modification.
+        """
+        dernier = conn.execute("SELECT MAX(historique_id) FROM historique_instantanes WHERE logement_id = ?",
+                               (logement_id,)).fetchone()[0]
+        if dernier is None:
+            self._ecrire_instantanes(conn, historique_id, {logement_id: ancien}, decalage=1)
+        elif conn.execute("SELECT COUNT(*) FROM historique WHERE logement_id = ? AND id > ?",
+                          (logement_id, dernier)).fetchone()[0] >= self.intervalle_instantanes:
+            self._ecrire_instantanes(conn, historique_id, self._etats(conn, [logement_id]))
+    
     # CRUD - Delete
     def supprimer_logement(self, logement_id: int) -> Tuple[bool, str]:
         """Supprime un logement"""
         try:
-            cursor = self.conn.cursor()
+            with self.pool.ecriture() as conn:
+                # Lire les données avant suppression pour l'historique
+                logement = self.lire_logement(logement_id)
+                
+                conn.execute("DELETE FROM logements WHERE id = ?", (logement_id,))
+                
+                if logement:
+                    self.ajouter_historique(
+                        logement_id,
+                        "DELETE",
+                        f"Logement {logement.get('ilot')}-{logement.get('logement')} supprimé",
+                        "Utilisateur"
+                    )
             
-            # Lire les données avant suppression pour l'historique
-            logement = self.lire_logement(logement_id)
+            return True, "✓ Logement supprimé avec succès"
             
-            cursor.execute("DELETE FROM logements WHERE id = ?", (logement_id,))
-            self.conn.commit()
+        except Exception as e:
+            return False, f"✗ Erreur lors de la suppression: {str(e)}"
+    
+    # CRUD par lots : une transaction, executemany et une entrée d'historique par lot
+    def creer_logements(self, donnees: List[Dict]) -> Tuple[List[int], str]:
+        """Crée plusieurs logements en une seule transaction
+        
+        Les colonnes absentes d'un enregistrement valent NULL. Les id sont
+        renvoyés dans l'ordre des données : sous le verrou d'écriture,
+        AUTOINCREMENT les attribue consécutivement.
+        """
+        if not donnees:
+            return [], "Aucun logement à créer"
+        try:
+            donnees = [typer_logement(data) for data in donnees]
+            colonnes = list(dict.fromkeys(col for data in donnees for col in data))
+            if 'id' in colonnes:
+                raise ValueError("Les id sont attribués par la base")
+            for colonne in colonnes:
+                self._verifier_colonne(colonne)
+            lignes = [tuple(data.get(col) for col in colonnes) for data in donnees]
             
-            if logement:
-                self.ajouter_historique(
-                    logement_id, 
-                    "DELETE", 
-                    f"Logement {logement.get('ilot')}-{logement.get('logement')} supprimé",
-                    "Utilisateur"
-                )
+            with self.pool.ecriture() as conn:
+                conn.executemany(f"""
+                    INSERT INTO logements ({', '.join(colonnes)})
+                    VALUES ({', '.join('?' for _ in colonnes)})
+                """, lignes)
+                dernier = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                ids = list(range(dernier - len(lignes) + 1, dernier + 1))
+                historique_id = self.ajouter_historique(None, "CREATE_LOT", json.dumps(
+                    {'nombre': len(ids), 'ids': ids}, ensure_ascii=False), "Utilisateur")
+                self._ecrire_instantanes(conn, historique_id, self._etats(conn, ids))
             
-            return True, "✓ Logement supprimé avec succès"
+            return ids, f"✓ {len(ids)} logements créés avec succès"
+        
+        except Exception as e:
+            return [], f"✗ Erreur lors de la création: {str(e)}"
+    
+    def modifier_logements(self, modifications: List[Dict]) -> Tuple[int, str]:
+        """Modifie plusieurs logements en une seule transaction
+        
+        Chaque élément porte l'id du logement et les colonnes à modifier ; seules
+        les valeurs qui changent sont écrites, et les logements qui modifient les
+        mêmes colonnes partagent un executemany. L'entrée d'historique du lot
+        garde les différences de chaque logement, un instantané par logement
+        modifié permet de retrouver son état (etat_au). Renvoie le nombre de
+        logements modifiés.
+        """
+        if not modifications:
+            return 0, "Aucun logement à modifier"
+        try:
+            demandes = {}
+            for modification in modifications:
+                data = typer_logement({k: v for k, v in modification.items() if k != 'id'})
+                for col in data:
+                    self._verifier_colonne(col)
+                demandes.setdefault(int(modification['id']), {}).update(data)
             
+            with self.pool.ecriture() as conn:
+                anciens = self._etats(conn, list(demandes))
+                groupes, journal = {}, []
+                for logement_id, data in demandes.items():
+                    if logement_id not in anciens:
+                        continue
+                    ancien = anciens[logement_id]
+                    differences = {col: [ancien[col], valeur] for col, valeur in data.items() if ancien[col] != valeur}
+                    if differences:
+                        groupes.setdefault(tuple(differences), []).append(
+                            tuple(apres for _, apres in differences.values()) + (logement_id,))
+                        journal.append({'id': logement_id, **differences})
+                
+                for colonnes, lignes in groupes.items():
+                    set_clause = ', '.join(f"{col} = ?" for col in colonnes)
+                    conn.executemany(f"""
+                        UPDATE logements
+                        SET {set_clause}, updated_at = CURRENT_TIMESTAMP
+                        WHERE id = ?
+                    """, lignes)
+                if journal:
+                    historique_id = self.ajouter_historique(None, "UPDATE_LOT", json.dumps(
+                        {'nombre': len(journal), 'modifications': journal}, ensure_ascii=False), "Utilisateur")
+                    self._ecrire_instantanes(conn, historique_id,
+                                             self._etats(conn, [entree['id'] for entree in journal]))
+            
+            return len(journal), f"✓ {len(journal)} logements modifiés avec succès"
+        
         except Exception as e:
-            return False, f"✗ Erreur lors de la suppression: {str(e)}"
+            return 0, f"✗ Erreur lors de la modification: {str(e)}"
+    
+    def supprimer_logements(self, ids: List[int]) -> Tuple[int, str]:
+        """Supprime plusieurs logements en une seule transaction
+        
+        Les libellés îlot-logement de l'historique sont lus par une seule
+        requête, dans la transaction de la suppression.
+        """
+        if not ids:
+            return 0, "Aucun logement à supprimer"
+        try:
+            ids = [int(i) for i in ids]
+            with self.pool.ecriture() as conn:
+                existants = conn.execute(
+                    "SELECT id, ilot, logement FROM logements WHERE id IN (SELECT value FROM json_each(?)) ORDER BY id",
+                    (json.dumps(ids),)).fetchall()
+                libelles = [f"{ilot}-{logement}" for _, ilot, logement in existants]
+                cursor = conn.executemany("DELETE FROM logements WHERE id = ?", [(i,) for i in ids])
+                supprimes = cursor.rowcount
+                historique_id = self.ajouter_historique(None, "DELETE_LOT", json.dumps(
+                    {'nombre': supprimes, 'ids': ids, 'logements': libelles}, ensure_ascii=False), "Utilisateur")
+                # Instantanés vides : supprimés à partir de cette entrée
+                self._ecrire_instantanes(conn, historique_id, {ligne[0]: None for ligne in existants})
+            
+            return supprimes, f"✓ {supprimes} logements supprimés avec succès"
+        
+        except Exception as e:
+            return 0, f"✗ Erreur lors de la suppression: {str(e)}"
     
     # Recherche et filtres
-    def rechercher(self, terme: str) -> pd.DataFrame:
-        """Recherche dans tous les champs texte"""
+    @staticmethod
+    def _requete_fts(terme: str) -> Optional[str]:
+        """Traduit la saisie en requête FTS5 : chaque mot est un préfixe, tous sont requis"""
+        mots = re.findall(r'\w+', normaliser_recherche(terme))
+        if not mots:
+            return None
+        return ' '.join(f'"{mot}"*' for mot in mots)
+    
+    @_en_cache
+    def rechercher(self, terme: str, filtre: Dict = None, taille_page: int = None, apres: Tuple = None,
+                   tri: str = None, descendant: bool = False, colonnes: List[str] = None) -> pd.DataFrame:
+        """Recherche plein texte (îlot, logement, nom, NNI, profession, département)
+        
+        Sans tri, les résultats sont classés par pertinence (bm25, curseur sur
+        (score, id)) ; sinon par les clés de TRIS[tri]. taille_page, apres,
+        df.attrs['total'] et df.attrs['curseur_suivant'] comme pour lire_tous.
+        """
         try:
-            query = """
-                SELECT * FROM logements 
-                WHERE ilot LIKE ? OR logement LIKE ? OR nom_affectaire LIKE ?
-                OR nni LIKE ? OR profession LIKE ? OR departement LIKE ?
-                ORDER BY ilot, logement
-            """
+            requete_fts = self._requete_fts(terme)
+            if requete_fts is None:
+                return self.lire_tous(filtre, colonnes=colonnes).iloc[0:0]
+            
+            correspondance, params = self._clause_recherche(requete_fts, filtre)
+            limite = "LIMIT ?" if taille_page is not None else ""
             
-            search_term = f"%{terme}%"
-            params = [search_term] * 6
+            if tri is None:
+                # Classement dans l'index seul, puis lecture des seules lignes de la page
+                cles = ('score', 'id')
+                condition, params_apres = _condition_apres(('score', 'rowid'), apres) if apres else ('1=1', [])
+                query = f"""
+                    SELECT {self._projection(colonnes, prefixe='l.')}, f.score FROM (
+                        SELECT rowid, score FROM (
+                            SELECT rowid, bm25(logements_fts) AS score FROM logements_fts
+                            WHERE {correspondance}
+                        )
+                        WHERE {condition}
+                        ORDER BY score, rowid {limite}
+                    ) AS f
+                    JOIN logements l ON l.id = f.rowid
+                    ORDER BY f.score, f.rowid
+                """
+                params = params + params_apres
+            else:
+                cles = TRIS[tri]
+                ordre = ', '.join(f"{cle} {'DESC' if descendant else 'ASC'}" for cle in cles)
+                condition, params_apres = _condition_apres(cles, apres, descendant) if apres else ('1=1', [])
+                query = f"""
+                    SELECT {self._projection(colonnes, cles)} FROM logements
+                    WHERE id IN (SELECT rowid FROM logements_fts WHERE {correspondance}) AND {condition}
+                    ORDER BY {ordre} {limite}
+                """
+                params = params + params_apres
             
-            df = pd.read_sql_query(query, self.conn, params=params)
+            with self.pool.lecture() as conn:
+                if taille_page is None:
+                    df = pd.read_sql_query(query, conn, params=params)
+                    return df.drop(columns=['score'], errors='ignore')
+                df = self._lire_page(conn, query, params, cles, taille_page)
+            df = df.drop(columns=['score'], errors='ignore')
+            df.attrs['total'] = self.compter_recherche(terme, filtre)
             return df
             
         except Exception as e:
-            print(f"Erreur recherche: {e}")
+            _echec_lecture(f"Erreur recherche: {e}")
             return pd.DataFrame()
     
-    def obtenir_valeurs_uniques(self, colonne: str) -> List[str]:
-        """Obtient les valeurs uniques d'une colonne"""
+    def _clause_recherche(self, requete_fts: str, filtre: Dict = None) -> Tuple[str, list]:
+        """Condition sur logements_fts : correspondance plein texte et filtre éventuel"""
+        where, params = self._clause_filtre(filtre)
+        # Sans condition seulement : 'nul' et un 'dans' vide n'ont pas de paramètre
+        if where == '1=1':
+            return "logements_fts MATCH ?", [requete_fts]
+        return (f"logements_fts MATCH ? AND rowid IN (SELECT id FROM logements WHERE {where})",
+                [requete_fts] + params)
+    
+    def compter_recherche(self, terme: str, filtre: Dict = None) -> int:
+        """Nombre total de résultats d'une recherche (pour la pagination)"""
+        requete_fts = self._requete_fts(terme)
+        if requete_fts is None:
+            return 0
+        correspondance, params = self._clause_recherche(requete_fts, filtre)
+        with self.pool.lecture() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM logements_fts WHERE {correspondance}",
+                                params).fetchone()[0]
+    
+    def obtenir_valeurs_uniques(self, colonne: str, ilot: str = None) -> List[str]:
+        """Obtient les valeurs uniques d'une colonne (limitées à un îlot si précisé)"""
+        if colonne in FACETTES:
+            return list(self.obtenir_facettes(colonne, ilot))
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(f"SELECT DISTINCT {colonne} FROM logements WHERE {colonne} IS NOT NULL AND {colonne} != '' ORDER BY {colonne}")
-            rows = cursor.fetchall()
+            self._verifier_colonne(colonne)
+            where, params = self._clause_filtre({'ilot': ilot})
+            with self.pool.lecture() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"SELECT DISTINCT {colonne} FROM logements WHERE {colonne} IS NOT NULL "
+                               f"AND {colonne} != '' AND {where} ORDER BY {colonne}", params)
+                rows = cursor.fetchall()
             return [row[0] for row in rows]
         except Exception as e:
             print(f"Erreur valeurs uniques: {e}")
             return []
     
+    def obtenir_facettes(self, colonne: str, ilot: str = None) -> Dict[str, int]:
+        """Valeurs distinctes d'une colonne de FACETTES et leurs effectifs, triées
+        
+        Avec ilot, seules les valeurs présentes dans cet îlot (facettes dépendantes).
+        """
+        try:
+            if colonne not in FACETTES:
+                raise ValueError(f"Colonne sans facettes: {colonne}")
+            with self.pool.lecture() as conn:
+                if ilot and ilot != "Tous":
+                    rows = conn.execute("SELECT valeur, nombre FROM facettes WHERE colonne = ? AND ilot = ? "
+                                        "ORDER BY valeur", (colonne, ilot)).fetchall()
+                else:
+                    rows = conn.execute("SELECT valeur, SUM(nombre) FROM facettes WHERE colonne = ? "
+                                        "GROUP BY valeur ORDER BY valeur", (colonne,)).fetchall()
+            return {valeur: nombre for valeur, nombre in rows}
+        except Exception as e:
+            print(f"Erreur facettes: {e}")
+            return {}
+    
+    def reconstruire_facettes(self) -> bool:
+        """Recalcule les facettes depuis la table logements (après une écriture hors application)"""
+        try:
+            with self.pool.ecriture() as conn:
+                conn.execute("DELETE FROM facettes")
+                for requete in REMPLIR_FACETTES:
+                    conn.execute(requete)
+            return True
+        except Exception as e:
+            print(f"Erreur reconstruction facettes: {e}")
+            return False
+    
+    @_en_cache
     def obtenir_statistiques(self) -> Dict:
-        """Calcule des statistiques sur les logements"""
+        """Statistiques sur les logements, lues dans la table statistiques tenue à jour"""
         try:
-            cursor = self.conn.cursor()
+            with self.pool.lecture() as conn:
+                rows = conn.execute("SELECT dimension, valeur, nombre FROM statistiques "
+                                    "ORDER BY dimension, valeur").fetchall()
+            
+            effectifs = {dimension: {} for dimension in ['total'] + DIMENSIONS_STATISTIQUES}
+            for dimension, valeur, nombre in rows:
+                # '' regroupe les valeurs absentes, rendues comme None par GROUP BY ;
+                # les statuts 0/1 sont rangés en texte dans la table
+                if valeur == '':
+                    valeur = None
+                elif dimension in COLONNES_DRAPEAUX:
+                    valeur = int(valeur)
+                effectifs[dimension][valeur] = nombre
             
-            stats = {}
+            departements = sorted(((v, n) for v, n in effectifs['departement'].items() if v is not None),
+                                  key=lambda item: (-item[1], item[0]))
+            return {
+                'total': effectifs['total'].get(None, 0),
+                'par_ilot': effectifs['ilot'],
+                'par_departement': dict(departements[:10]),
+                'par_activite': effectifs['en_activite'],
+            }
+            
+        except Exception as e:
+            _echec_lecture(f"Erreur statistiques: {e}")
+            return {}
+    
+    def _calculer_statistiques(self) -> Dict:
+        """Calcule les statistiques par agrégats sur toute la table (référence de la vérification)"""
+        stats = {}
+        
+        with self.pool.lecture() as conn:
+            cursor = conn.cursor()
             
             # Total
             cursor.execute("SELECT COUNT(*) FROM logements")
             stats['total'] = cursor.fetchone()[0]
             
             # Par îlot
-            cursor.execute("SELECT ilot, COUNT(*) FROM logements GROUP BY ilot ORDER BY ilot")
+            cursor.execute("SELECT nullif(ilot, ''), COUNT(*) FROM logements GROUP BY 1 ORDER BY 1")
             stats['par_ilot'] = dict(cursor.fetchall())
             
-            # Par département
-            cursor.execute("SELECT departement, COUNT(*) FROM logements WHERE departement != '' GROUP BY departement ORDER BY COUNT(*) DESC LIMIT 10")
+            # Par département (les dix plus nombreux)
+            cursor.execute("SELECT departement, COUNT(*) FROM logements WHERE departement != '' GROUP BY departement ORDER BY COUNT(*) DESC, departement LIMIT 10")
             stats['par_departement'] = dict(cursor.fetchall())
             
-            # Par statut
-            cursor.execute("SELECT en_activite, COUNT(*) FROM logements GROUP BY en_activite")
+            # Par statut (1, 0 ou None)
+            cursor.execute("SELECT en_activite, COUNT(*) FROM logements GROUP BY 1")
             stats['par_activite'] = dict(cursor.fetchall())
-            
-            return stats
-            
-        except Exception as e:
-            print(f"Erreur statistiques: {e}")
-            return {}
+        
+        return stats
+    
+    def verifier_statistiques(self, reparer: bool = True) -> Dict:
+        """Compare les statistiques tenues à jour à un recalcul complet
+        
+        Renvoie {'coherent': bool, 'ecarts': {clé: (tenu, recalculé)}, 'repare': bool} ;
+        avec reparer, la table est reconstruite en cas d'écart.
+        """
+        tenues = self.obtenir_statistiques()
+        recalculees = self._calculer_statistiques()
+        ecarts = {cle: (tenues.get(cle), valeur) for cle, valeur in recalculees.items() if tenues.get(cle) != valeur}
+        
+        repare = False
+        if ecarts and reparer:
+            with self.pool.ecriture() as conn:
+                conn.execute("DELETE FROM statistiques")
+                for requete in REMPLIR_STATISTIQUES:
+                    conn.execute(requete)
+            repare = True
+        return {'coherent': not ecarts, 'ecarts': ecarts, 'repare': repare}
     
     def ajouter_historique(self, logement_id: Optional[int], action: str, details: str, utilisateur: str):
-        """Ajoute une entrée dans l'historique"""
+        """Ajoute une entrée dans l'historique
+        
+        Dans une transaction d'écriture, l'entrée en fait partie : elle est
+        validée ou annulée avec la modification qu'elle décrit, et son id est
+        renvoyé. Hors transaction, elle passe par le journal différé
+        (écriture par lots).
+        """
+        entree = (logement_id, action, details, utilisateur, time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime()))
+        if self.pool.en_transaction():
+            # Une erreur ici annule aussi la modification : pas de changement sans trace
+            with self.pool.ecriture() as conn:
+                return conn.execute(INSERT_HISTORIQUE, entree).lastrowid
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                INSERT INTO historique (logement_id, action, details, utilisateur)
-                VALUES (?, ?, ?, ?)
-            """, (logement_id, action, details, utilisateur))
-            self.conn.commit()
+            if self.journal:
+                self.journal.ajouter(entree)
+            else:
+                with self.pool.ecriture() as conn:
+                    conn.execute(INSERT_HISTORIQUE, entree)
         except Exception as e:
             print(f"Erreur historique: {e}")
     
-    def obtenir_historique(self, logement_id: int = None, limit: int = 50) -> pd.DataFrame:
-        """Récupère l'historique des modifications"""
+    def obtenir_historique(self, logement_id: int = None, limit: int = 50, apres: Tuple = None,
+                           action: str = None, utilisateur: str = None, debut: str = None,
+                           fin: str = None) -> pd.DataFrame:
+        """Récupère l'historique des modifications, du plus récent au plus ancien
+        
+        Filtres optionnels : logement, action, utilisateur et dates (AAAA-MM-JJ,
+        bornes incluses). Pagination par curseur sur (timestamp, id) : apres =
+        df.attrs['curseur_suivant'] de la page précédente. Les entrées encore
+        en attente dans le journal différé sont écrites d'abord.
+        """
+        if self.journal:
+            try:
+                self.journal.vider()
+            except Exception as e:
+                print(f"Erreur historique: {e}")
+        return self._lire_historique(logement_id, limit, apres, action, utilisateur, debut, fin)
+    
+    @_en_cache
+    def _lire_historique(self, logement_id: int = None, limit: int = 50, apres: Tuple = None,
+                         action: str = None, utilisateur: str = None, debut: str = None,
+                         fin: str = None) -> pd.DataFrame:
+        """Lit une page de l'historique par les index (logement, action ou utilisateur, puis date)"""
         try:
-            if logement_id:
-                query = "SELECT * FROM historique WHERE logement_id = ? ORDER BY timestamp DESC LIMIT ?"
-                params = (logement_id, limit)
-            else:
-                query = "SELECT * FROM historique ORDER BY timestamp DESC LIMIT ?"
-                params = (limit,)
+            conditions, params = [], []
+            for colonne, valeur in (('logement_id', logement_id), ('action', action), ('utilisateur', utilisateur)):
+                if valeur:
+                    conditions.append(f"{colonne} = ?")
+                    params.append(valeur)
+            if debut:
+                conditions.append("timestamp >= ?")
+                params.append(str(debut))
+            if fin:
+                conditions.append("timestamp < date(?, '+1 day')")
+                params.append(str(fin))
+            if apres is not None:
+                # timestamp n'est jamais NULL : la comparaison de valeurs de ligne borne le parcours d'index
+                conditions.append("(timestamp, id) < (?, ?)")
+                params.extend(apres)
+            where = ' AND '.join(conditions) or '1'
             
-            df = pd.read_sql_query(query, self.conn, params=params)
-            return df
+            with self.pool.lecture() as conn:
+                return self._lire_page(conn, f"SELECT * FROM historique WHERE {where} "
+                                             "ORDER BY timestamp DESC, id DESC LIMIT ?",
+                                       params, ('timestamp', 'id'), limit)
         except Exception as e:
-            print(f"Erreur lecture historique: {e}")
+            _echec_lecture(f"Erreur lecture historique: {e}")
             return pd.DataFrame()
     
+    def etat_au(self, logement_id: int, timestamp: str) -> Optional[Dict]:
+        """État du logement à une date (AAAA-MM-JJ : fin de la journée, ou AAAA-MM-JJ HH:MM:SS, UTC)
+        
+        Part du dernier instantané antérieur et rejoue les différences des
+        entrées UPDATE qui le suivent. Renvoie None si le logement n'existait
+        pas ou plus à cette date, ou si son état n'y est pas connu : avant son
+        premier instantané, ou avant la dernière entrée archivée du logement
+        (l'archivage ne garde que l'état à cette entrée). Une fusion Excel
+        enregistre les différences des lignes qu'elle modifie ; un import en
+        remplacement supprime les logements existants (NULL ensuite).
+        """
+        borne = str(timestamp)
+        if len(borne) == 10:
+            borne += ' 23:59:59'
+        with self.pool.lecture() as conn:
+            etat = self._rejouer(conn, logement_id, borne)
+        return etat[1] if etat else None
+    
+    @staticmethod
+    def _rejouer(conn: sqlite3.Connection, logement_id: int, borne: str) -> Optional[Tuple[int, Optional[Dict]]]:
+        """Dernière entrée prise en compte et état du logement à la date borne, None si inconnu"""
+        instantane = conn.execute("""
+            SELECT historique_id, etat FROM historique_instantanes
+            WHERE logement_id = ? AND timestamp <= ?
+            ORDER BY historique_id DESC LIMIT 1
+        """, (logement_id, borne)).fetchone()
+        if instantane is None:
+            return None
+        historique_id = instantane['historique_id']
+        etat = json.loads(instantane['etat']) if instantane['etat'] else None
+        for historique_id, action, details, horodatage in conn.execute("""
+            SELECT id, action, details, timestamp FROM historique
+            WHERE logement_id = ? AND id > ? AND timestamp <= ?
+            ORDER BY id
+        """, (logement_id, historique_id, borne)):
+            if action == 'DELETE':
+                etat = None
+            elif action == 'UPDATE' and etat is not None:
+                for colonne, valeur in json.loads(details).items():
+                    # Entrées antérieures aux différences : valeur seule
+                    etat[colonne] = valeur[1] if isinstance(valeur, list) else valeur
+                etat['updated_at'] = horodatage
+        return historique_id, etat
+    
+    def archiver_historique(self, jours: int = None, avant: str = None, fichier: str = None,
+                            taille_bloc: int = 10000) -> Dict:
+        """Déplace les entrées anciennes de l'historique vers l'archive compressée
+        
+        Sont archivées les entrées antérieures à ``avant`` (AAAA-MM-JJ), à défaut
+        de plus de ``jours`` jours (LOGEMENTS_HISTORIQUE_RETENTION_JOURS, 365 par
+        défaut), par blocs de ``taille_bloc`` entrées. Avec ``fichier``, l'archive
+        est écrite dans ce fichier SQLite, validée avant la suppression : un arrêt
+        entre les deux laisse au pire des entrées archivées deux fois.
+        
+        Dans la transaction de la suppression, chaque logement dont des entrées
+        partent reçoit un instantané de son état à la dernière d'entre elles
+        (etat_au reste exact après cette date), puis seul l'instantané le plus
+        récent avant la date est gardé par logement, et aucun pour un logement
+        supprimé. L'espace libéré est ensuite rendu au système (recuperer_espace).
+        """
+        resultat = {'archivees': 0, 'blocs': 0, 'instantanes': 0, 'pages_liberees': 0}
+        try:
+            if avant is None:
+                if jours is None:
+                    jours = int(os.environ.get('LOGEMENTS_HISTORIQUE_RETENTION_JOURS', 365))
+                avant = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(time.time() - jours * 86400))
+            if self.journal:
+                self.journal.vider()
+            
+            with self.pool.ecriture() as conn:
+                archive = conn
+                if fichier:
+                    archive = sqlite3.connect(fichier)
+                    archive.execute(SCHEMA_HISTORIQUE_ARCHIVE)
+                try:
+                    lecture = conn.execute(f"SELECT {', '.join(COLONNES_HISTORIQUE)} FROM historique "
+                                           "WHERE timestamp < ? ORDER BY timestamp, id", (str(avant),))
+                    while True:
+                        lignes = [tuple(ligne) for ligne in lecture.fetchmany(taille_bloc)]
+                        if not lignes:
+                            break
+                        archive.execute(
+                            "INSERT INTO historique_archive (debut, fin, nombre, donnees) VALUES (?, ?, ?, ?)",
+                            (lignes[0][-1], lignes[-1][-1], len(lignes),
+                             zlib.compress(json.dumps(lignes, ensure_ascii=False).encode('utf-8'))))
+                        resultat['archivees'] += len(lignes)
+                        resultat['blocs'] += 1
+                    if fichier:
+                        archive.commit()
+                finally:
+                    if fichier:
+                        archive.close()
+                resultat['instantanes'] = self._instantanes_archivage(conn, str(avant))
+                conn.execute("DELETE FROM historique WHERE timestamp < ?", (str(avant),))
+                conn.execute("""
+                    DELETE FROM historique_instantanes AS i
+                    WHERE timestamp < ? AND (etat IS NULL OR EXISTS (
+                        SELECT 1 FROM historique_instantanes AS j
+                        WHERE j.logement_id = i.logement_id AND j.timestamp < ?
+                        AND (j.historique_id, j.id) > (i.historique_id, i.id)))
+                """, (str(avant), str(avant)))
+            
+            if resultat['archivees']:
+                resultat['pages_liberees'] = self.recuperer_espace()
+            resultat['message'] = (f"✓ {resultat['archivees']} entrées antérieures au {avant[:10]} archivées "
+                                   f"({resultat['blocs']} blocs)")
+        except Exception as e:
+            resultat['erreur'] = True
+            resultat['message'] = f"✗ Erreur lors de l'archivage: {str(e)}"
+        return resultat
+    
+    def _instantanes_archivage(self, conn: sqlite3.Connection, avant: str) -> int:
+        """Instantané de chaque logement à sa dernière entrée antérieure à avant, avant leur archivage
+        
+        Rien n'est écrit quand l'instantané existant est déjà à jour ou que
+        l'état n'est pas connu (aucun instantané). Renvoie le nombre d'instantanés écrits.
+        """
+        instantanes = []
+        for logement_id, borne in conn.execute("""
+            SELECT logement_id, MAX(timestamp) FROM historique
+            WHERE timestamp < ? AND logement_id IS NOT NULL GROUP BY logement_id
+        """, (avant,)).fetchall():
+            etat = self._rejouer(conn, logement_id, borne)
+            if etat is not None and not conn.execute(
+                    "SELECT 1 FROM historique_instantanes WHERE logement_id = ? AND historique_id = ?",
+                    (logement_id, etat[0])).fetchone():
+                instantanes.append((logement_id, 0, None if etat[1] is None else
+                                    json.dumps(etat[1], ensure_ascii=False), etat[0]))
+        conn.executemany(INSERT_INSTANTANE, instantanes)
+        return len(instantanes)
+    
+    def lire_archive_historique(self, fichier: str = None, debut: str = None, fin: str = None) -> pd.DataFrame:
+        """Décompresse les entrées archivées (de la base ou du fichier), bornes incluses AAAA-MM-JJ"""
+        conditions, params = [], []
+        if debut:
+            conditions.append("fin >= ?")
+            params.append(str(debut))
+        if fin:
+            conditions.append("debut < date(?, '+1 day')")
+            params.append(str(fin))
+        requete = f"SELECT donnees FROM historique_archive WHERE {' AND '.join(conditions) or '1'} ORDER BY debut"
+        try:
+            if fichier:
+                conn = sqlite3.connect(fichier)
+                try:
+                    blocs = conn.execute(requete, params).fetchall()
+                finally:
+                    conn.close()
+            else:
+                with self.pool.lecture() as conn:
+                    blocs = conn.execute(requete, params).fetchall()
+            lignes = [ligne for (donnees,) in blocs for ligne in json.loads(zlib.decompress(donnees))]
+            df = pd.DataFrame(lignes, columns=COLONNES_HISTORIQUE)
+            # Les blocs en bordure débordent des bornes demandées
+            if debut:
+                df = df[df['timestamp'] >= str(debut)]
+            if fin:
+                df = df[df['timestamp'].str[:10] <= str(fin)[:10]]
+            return df.reset_index(drop=True)
+        except Exception as e:
+            print(f"Erreur lecture archive: {e}")
+            return pd.DataFrame(columns=COLONNES_HISTORIQUE)
+    
+    def recuperer_espace(self, pages: int = None) -> int:
+        """Rend au système les pages libres de la base (PRAGMA incremental_vacuum)
+        
+        Une base créée avant l'auto_vacuum incrémental est d'abord convertie
+        par un VACUUM complet (une seule fois). Renvoie le nombre de pages
+        libérées. Hors de toute transaction : VACUUM et executescript valident
+        ce qui est en cours.
+        """
+        if self.pool.en_transaction():
+            raise sqlite3.OperationalError("recuperer_espace hors transaction uniquement")
+        with self.pool.ecriture() as conn:
+            avant = conn.execute("PRAGMA page_count").fetchone()[0]
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+            else:
+                # executescript exécute le pragma jusqu'au bout (execute ne libère qu'une page)
+                conn.executescript(f"PRAGMA incremental_vacuum({int(pages or 0)})")
+            return avant - conn.execute("PRAGMA page_count").fetchone()[0]
+    
+    def metriques_pool(self) -> Dict:
+        """Métriques du pool de connexions (connexions en cours, emprunts, attente)"""
+        return self.pool.metriques()
+    
+    def metriques_cache(self) -> Dict:
+        """Compteurs du cache des lectures (succès, échecs, évictions, taille)"""
+        return self.cache.metriques() if self.cache else {}
+    
+    def metriques_historique(self) -> Dict:
+        """Compteurs du journal différé de l'historique (entrées, lots, en attente)"""
+        return self.journal.metriques() if self.journal else {}
+    
     def fermer(self):
-        """Ferme la connexion à la base de données"""
-        if self.conn:
-            self.conn.close()
+        """Ferme les connexions à la base de données après avoir écrit l'historique en attente"""
+        journal = getattr(self, 'journal', None)
+        if journal:
+            journal.fermer()
+        pool = getattr(self, 'pool', None)
+        if pool:
+            pool.fermer()
     
     def __del__(self):
         """Destructeur pour fermer proprement la connexion"""
@@ -139,6 +139,1190 @@ def test_excel_file():
         return False
 
 
+def test_import_par_lots():
+    """Test de l'import par lots face à l'import ligne par ligne"""
+    print("\n🧪 Test de l'import par lots...")
+    
+    import tempfile
+    import pandas as pd
+    from database import LogementDatabase
+    
+    if not os.path.exists("logements.xlsx"):
+        print("  ⚠️  Fichier Excel non trouvé, import non testé")
+        return True
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        resultats = []
+        for nom, options in [("ligne par ligne", {'par_lots': False}),
+                             ("DataFrame par lots", {'flux': False}),
+                             ("flux openpyxl", {'flux': True})]:
+            db = LogementDatabase(db_path=os.path.join(dossier, f"lots_{len(resultats)}.db"),
+                                  excel_path="logements.xlsx")
+            count, message = db.importer_depuis_excel(taille_lot=100, **options)
+            assert count > 0, message
+            print(f"  ✅ {nom}: {message}")
+            resultats.append(db.lire_tous().sort_values('id').reset_index(drop=True))
+            assert db.statistiques_import['lignes_par_seconde'] > 0
+            db.fermer()
+        
+        ligne = resultats[0]
+        colonnes = [c for c in ligne.columns if c not in ('latitude', 'longitude', 'created_at', 'updated_at')]
+        for lots in resultats[1:]:
+            pd.testing.assert_frame_equal(ligne[colonnes], lots[colonnes])
+            # Les coordonnées restent dans la zone de l'îlot (variation de ±0.01)
+            ecart = (ligne[['latitude', 'longitude']] - lots[['latitude', 'longitude']]).abs()
+            assert (ecart <= 0.02 + 1e-9).all().all()
+        print("  ✅ Résultats identiques entre les chemins d'import")
+        
+        # Ligne vide intercalée : cellules NULL et même empreinte quel que soit le chemin
+        excel_path = os.path.join(dossier, "vides.xlsx")
+        pd.DataFrame([{'Ilot': 'A', 'Logement': 'L1'}, {'Ilot': None, 'Logement': None},
+                      {'Ilot': 'B', 'Logement': 'L2'}]).to_excel(excel_path, index=False)
+        lots = list(LogementDatabase._lire_excel_par_lots(None, excel_path))
+        assert lots[0][1][:2] == (None, None)
+        tables = []
+        for flux in (True, False):
+            db = LogementDatabase(db_path=os.path.join(dossier, f"vides_{flux}.db"), excel_path=excel_path)
+            count, message = db.importer_depuis_excel(flux=flux)
+            assert count == 3, message
+            tables.append(db.lire_tous().sort_values('id').reset_index(drop=True))
+            db.fermer()
+        assert tables[0]['ilot'].tolist()[1] is None
+        assert tables[0]['hash_import'].tolist() == tables[1]['hash_import'].tolist()
+        print("  ✅ Lignes vides intercalées importées en NULL")
+    
+    return True
+
+
+def test_import_incremental():
+    """Test de l'import incrémental sur la clé (ilot, logement)"""
+    print("\n🧪 Test de l'import incrémental...")
+    
+    import tempfile
+    import pandas as pd
+    from database import LogementDatabase
+    
+    lignes = [
+        {'Ilot': 'A', 'Logement': '1', 'Nom de l\'Affectaire': 'AHMED', 'Profession': 'INSTITUTEUR'},
+        {'Ilot': 'A', 'Logement': '2', 'Nom de l\'Affectaire': 'FATIMA', 'Profession': 'MEDECIN'},
+        {'Ilot': 'B', 'Logement': '1', 'Nom de l\'Affectaire': 'MOHAMED', 'Profession': 'INGENIEUR'},
+    ]
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        excel_path = os.path.join(dossier, "logements.xlsx")
+        pd.DataFrame(lignes).to_excel(excel_path, index=False)
+        db = LogementDatabase(db_path=os.path.join(dossier, "fusion.db"), excel_path=excel_path)
+        
+        resultat = db.synchroniser_depuis_excel()
+        assert (resultat['inseres'], resultat['modifies'], resultat['inchanges']) == (3, 0, 0), resultat
+        avant = db.lire_tous().set_index(['ilot', 'logement'])
+        
+        # Saisie dans l'application sur une colonne que le fichier ne change pas
+        db.modifier_logement(int(avant.loc[('A', '1'), 'id']), {'nom_affectaire': 'AHMED SALEM'})
+        
+        # Une ligne modifiée, une supprimée, une ajoutée
+        lignes[0]['Profession'] = 'DIRECTEUR'
+        del lignes[1]
+        lignes.append({'Ilot': 'C', 'Logement': '7', 'Nom de l\'Affectaire': 'AICHA', 'Profession': 'JURISTE'})
+        pd.DataFrame(lignes).to_excel(excel_path, index=False)
+        
+        simulation = db.synchroniser_depuis_excel(supprimer_absents=True, simulation=True)
+        assert simulation['details']['modifies'] == [('A', '1')]
+        assert simulation['details']['inseres'] == [('C', '7')]
+        assert simulation['details']['supprimes'] == [('A', '2')]
+        assert len(db.lire_tous()) == 3, "La simulation ne doit rien écrire"
+        print(f"  ✅ {simulation['message']}")
+        
+        resultat = db.synchroniser_depuis_excel(supprimer_absents=True)
+        assert (resultat['inseres'], resultat['modifies'], resultat['inchanges'], resultat['supprimes']) == (1, 1, 1, 1)
+        apres = db.lire_tous().set_index(['ilot', 'logement'])
+        
+        # Identifiants et coordonnées conservés pour les lignes existantes
+        for cle in [('A', '1'), ('B', '1')]:
+            assert apres.loc[cle, 'id'] == avant.loc[cle, 'id']
+            assert apres.loc[cle, 'latitude'] == avant.loc[cle, 'latitude']
+        assert apres.loc[('A', '1'), 'profession'] == 'DIRECTEUR'
+        assert apres.loc[('A', '1'), 'nom_affectaire'] == 'AHMED SALEM', "Saisie écrasée par la fusion"
+        print(f"  ✅ {resultat['message']}")
+        
+        resultat = db.synchroniser_depuis_excel(supprimer_absents=True)
+        assert resultat['inchanges'] == 3 and resultat['inseres'] == resultat['modifies'] == resultat['supprimes'] == 0
+        print("  ✅ Aucune écriture pour un fichier inchangé")
+        
+        # Ligne sans empreinte (base antérieure) : conservée, empreinte reprise
+        logement_id = int(apres.loc[('B', '1'), 'id'])
+        db.modifier_logement(logement_id, {'nom_affectaire': 'MOHAMED LEMINE'})
+        with db.pool.ecriture() as conn:
+            conn.execute("UPDATE logements SET hash_import = NULL")
+        resultat = db.synchroniser_depuis_excel()
+        assert resultat['inchanges'] == 3 and resultat['modifies'] == 0, resultat
+        assert db.lire_logement(logement_id)['nom_affectaire'] == 'MOHAMED LEMINE'
+        assert db.lire_tous()['hash_import'].notna().all()
+        print("  ✅ Lignes sans empreinte conservées, empreintes reprises")
+        db.fermer()
+    
+    return True
+
+
+def test_empreinte_import():
+    """Test du saut des imports d'un fichier inchangé"""
+    print("\n🧪 Test de l'empreinte des imports...")
+    
+    import tempfile
+    import pandas as pd
+    from database import LogementDatabase
+    
+    lignes = [
+        {'Ilot': 'A', 'Logement': '1', 'Nom de l\'Affectaire': 'AHMED'},
+        {'Ilot': 'B', 'Logement': '2', 'Nom de l\'Affectaire': 'FATIMA'},
+    ]
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        excel_path = os.path.join(dossier, "logements.xlsx")
+        pd.DataFrame(lignes).to_excel(excel_path, index=False)
+        db = LogementDatabase(db_path=os.path.join(dossier, "empreinte.db"), excel_path=excel_path)
+        
+        count, message = db.importer_depuis_excel()
+        assert count == 2 and not db.statistiques_import.get('ignore'), message
+        derniere = db.derniere_importation()
+        assert derniere['lignes'] == 2 and derniere['mode'] == 'remplacer'
+        assert len(derniere['hash_contenu']) == 64
+        
+        # Une modification faite dans l'application survit au rechargement du tableau de bord
+        logement_id = int(db.lire_tous(filtre={'ilot': 'A'})['id'].iloc[0])
+        db.modifier_logement(logement_id, {'nom_affectaire': 'AHMED SALEM'})
+        nb_historique = len(db.obtenir_historique(limit=100))
+        count, message = db.importer_depuis_excel()
+        assert count == 2 and db.statistiques_import.get('ignore'), message
+        assert db.lire_logement(logement_id)['nom_affectaire'] == 'AHMED SALEM'
+        assert len(db.obtenir_historique(limit=100)) == nb_historique
+        print(f"  ✅ {message}")
+        
+        # Date de modification changée mais contenu identique
+        os.utime(excel_path, (derniere['mtime'] + 60, derniere['mtime'] + 60))
+        count, message = db.importer_depuis_excel()
+        assert db.statistiques_import.get('ignore'), message
+        print("  ✅ Contenu identique reconnu malgré une nouvelle date de modification")
+        
+        count, message = db.importer_depuis_excel(force=True)
+        assert count == 2 and not db.statistiques_import.get('ignore'), message
+        assert db.lire_tous(filtre={'ilot': 'A'})['nom_affectaire'].iloc[0] == 'AHMED'
+        print("  ✅ Import forcé")
+        
+        lignes.append({'Ilot': 'C', 'Logement': '3', 'Nom de l\'Affectaire': 'AICHA'})
+        pd.DataFrame(lignes).to_excel(excel_path, index=False)
+        count, message = db.importer_depuis_excel()
+        assert count == 3 and not db.statistiques_import.get('ignore'), message
+        print("  ✅ Fichier modifié réimporté")
+        db.fermer()
+    
+    return True
+
+
+def test_pool_connexions():
+    """Test du pool de connexions partagé entre threads"""
+    print("\n🧪 Test du pool de connexions...")
+    
+    import sqlite3
+    import tempfile
+    import threading
+    from database import LogementDatabase
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        db = LogementDatabase(db_path=os.path.join(dossier, "pool.db"), taille_pool=2, taille_cache=0)
+        erreurs = []
+        
+        def session(numero):
+            try:
+                for i in range(10):
+                    logement_id, message = db.creer_logement({'ilot': 'A', 'logement': f"{numero}-{i}"})
+                    assert logement_id > 0, message
+                    assert db.lire_logement(logement_id)['logement'] == f"{numero}-{i}"
+                    db.lire_tous(filtre={'ilot': 'A'})
+            except Exception as e:
+                erreurs.append(e)
+        
+        threads = [threading.Thread(target=session, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert not erreurs, erreurs
+        assert len(db.lire_tous()) == 80
+        
+        metriques = db.metriques_pool()
+        assert metriques['lecteurs_ouverts'] <= 2
+        assert metriques['lecteurs_en_cours'] == 0
+        assert metriques['emprunts_lecture'] >= 160 and metriques['emprunts_ecriture'] >= 160
+        print(f"  ✅ 8 sessions concurrentes, {metriques['lecteurs_ouverts']} connexions de lecture, "
+              f"attente max {metriques['attente_max_s'] * 1000:.1f} ms")
+        
+        db.fermer()
+        try:
+            with db.pool.lecture():
+                ferme = False
+        except sqlite3.ProgrammingError:
+            ferme = True
+        assert ferme, "Le pool fermé ne doit plus prêter de connexion"
+        print("  ✅ Fermeture propre du pool")
+    
+    return True
+
+
+def test_profil_sqlite():
+    """Test du profil de réglage SQLite"""
+    print("\n🧪 Test du profil SQLite...")
+    
+    import tempfile
+    from database import LogementDatabase, profil_sqlite
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        db_path = os.path.join(dossier, "profil.db")
+        db = LogementDatabase(db_path=db_path, profil='production')
+        with db.pool.lecture() as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+            assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+            assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2
+            assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+        print("  ✅ WAL, synchronous=NORMAL, temp_store=MEMORY appliqués")
+        
+        # Checkpoint périodique et troncature du WAL à la fermeture
+        db.pool._intervalle_checkpoint = 0.001
+        db.creer_logement({'ilot': 'A', 'logement': '1'})
+        assert db.metriques_pool()['checkpoints'] >= 1
+        db.fermer()
+        wal = db_path + "-wal"
+        assert not os.path.exists(wal) or os.path.getsize(wal) == 0
+        print("  ✅ Checkpoint WAL périodique et à la fermeture")
+        
+        ancien = os.environ.get('LOGEMENTS_SQLITE_CACHE_SIZE')
+        os.environ['LOGEMENTS_SQLITE_CACHE_SIZE'] = '-2000'
+        try:
+            assert profil_sqlite('production')['cache_size'] == -2000
+            assert profil_sqlite('defaut') == {'cache_size': -2000, 'checkpoint_s': 300.0}
+        finally:
+            if ancien is None:
+                del os.environ['LOGEMENTS_SQLITE_CACHE_SIZE']
+            else:
+                os.environ['LOGEMENTS_SQLITE_CACHE_SIZE'] = ancien
+        print("  ✅ Surcharge par variable d'environnement")
+    
+    return True
+
+
+def test_migrations():
+    """Test de la mise à niveau du schéma d'une base existante"""
+    print("\n🧪 Test des migrations du schéma...")
+    
+    import sqlite3
+    import tempfile
+    from database import LogementDatabase, MIGRATIONS
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        # Base au schéma d'origine : ni hash_import, ni index, user_version = 0
+        db_path = os.path.join(dossier, "ancienne.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE logements (id INTEGER PRIMARY KEY AUTOINCREMENT, ilot TEXT, logement TEXT, "
+                     "nom_affectaire TEXT, nni TEXT, profession TEXT, departement TEXT, en_activite TEXT, "
+                     "latitude REAL, longitude REAL, created_at TIMESTAMP, updated_at TIMESTAMP)")
+        conn.execute("CREATE TABLE historique (id INTEGER PRIMARY KEY AUTOINCREMENT, logement_id INTEGER, "
+                     "action TEXT, details TEXT, utilisateur TEXT, timestamp TIMESTAMP)")
+        conn.execute("INSERT INTO logements (ilot, logement, departement) VALUES ('A', '1', 'MS')")
+        conn.commit()
+        conn.close()
+        
+        db = LogementDatabase(db_path=db_path)
+        assert db.version_schema() == len(MIGRATIONS)
+        assert db.lire_tous(filtre={'departement': 'MS'})['logement'].tolist() == ['1']
+        assert db.rechercher('MS')['logement'].tolist() == ['1']
+        with db.pool.lecture() as conn:
+            colonnes = [row[1] for row in conn.execute("PRAGMA table_info(logements)")]
+            index = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+            plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM logements WHERE departement = 'MS' "
+                                "ORDER BY ilot, logement").fetchall()
+        assert 'hash_import' in colonnes
+        assert {'idx_logements_ilot_logement', 'idx_logements_departement',
+                'idx_logements_profession', 'idx_historique_logement'} <= index
+        assert 'idx_logements_departement' in plan[0][-1] and len(plan) == 1, plan
+        print(f"  ✅ Base existante mise à niveau en version {len(MIGRATIONS)}, données conservées")
+        db.fermer()
+        
+        # Réouverture : aucune migration rejouée
+        db = LogementDatabase(db_path=db_path)
+        assert db.version_schema() == len(MIGRATIONS)
+        db.fermer()
+        print("  ✅ Réouverture sans nouvelle migration")
+    
+    return True
+
+
+def test_types_stockage():
+    """Test des colonnes typées : migration d'une base en texte et import"""
+    print("\n🧪 Test des colonnes typées...")
+    
+    import sqlite3
+    import tempfile
+    import pandas as pd
+    from database import LogementDatabase
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        # Base dont toutes les valeurs ont été stockées par str() (migrations 1 à 8 appliquées)
+        db_path = os.path.join(dossier, "texte.db")
+        LogementDatabase(db_path=db_path).fermer()
+        conn = sqlite3.connect(db_path)
+        conn.execute("DROP TABLE logements")
+        conn.execute("CREATE TABLE logements (id INTEGER PRIMARY KEY AUTOINCREMENT, ilot TEXT, logement TEXT, "
+                     "date_decision TEXT, nom_affectaire TEXT, departement TEXT, en_activite TEXT, decede TEXT, "
+                     "latitude REAL, longitude REAL, hash_import INTEGER, created_at TIMESTAMP, updated_at TIMESTAMP)")
+        conn.executemany("INSERT INTO logements (ilot, logement, date_decision, nom_affectaire, departement, "
+                         "en_activite, decede) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         [('A', '1', '03/07/1989', 'AHMED', 'MS', 'OUI', 'nan'),
+                          ('A', '2', '1993', 'nan', '', 'oui', 'Non'),
+                          ('B', '3', 'nan', 'SIDI', 'MS', 'nan', 'OUI'),
+                          ('B', '4', '2001-05-17 00:00:00', 'AICHA', 'MEN', '', '')])
+        conn.execute("DELETE FROM logements WHERE logement = '4'")
+        conn.execute("PRAGMA user_version = 8")
+        conn.commit()
+        conn.close()
+        
+        db = LogementDatabase(db_path=db_path)
+        with db.pool.lecture() as conn:
+            lignes = [tuple(row) for row in conn.execute(
+                "SELECT date_decision, nom_affectaire, departement, en_activite, typeof(en_activite), decede "
+                "FROM logements ORDER BY id")]
+            plan = conn.execute("EXPLAIN QUERY PLAN SELECT id FROM logements "
+                                "WHERE date_decision >= '1990-01-01'").fetchall()
+        assert lignes == [('1989-07-03', 'AHMED', 'MS', 1, 'integer', None),
+                          ('1993', None, None, 1, 'integer', 0),
+                          (None, 'SIDI', 'MS', None, 'null', 1)], lignes
+        assert 'idx_logements_date_decision' in plan[0][-1], plan
+        assert db.obtenir_statistiques()['par_activite'] == {1: 2, None: 1}
+        assert db.rechercher('SIDI')['logement'].tolist() == ['3'] and db.rechercher('nan').empty
+        assert db.obtenir_valeurs_uniques('departement') == ['MS']
+        assert db.creer_logement({'ilot': 'C', 'logement': '5'})[0] == 5, "id déjà attribué réutilisé"
+        print("  ✅ Migration : statuts 0/1, dates ISO indexées, 'nan' et '' en NULL, id conservés")
+        
+        modifie, _ = db.modifier_logement(1, {'en_activite': 'Non', 'date_decision': '15/03/2008', 'nni': ''})
+        logement = db.lire_logement(1)
+        assert modifie and (logement['en_activite'], logement['date_decision'], logement['nni']) == (0, '2008-03-15', None)
+        print("  ✅ Saisies converties à l'écriture")
+        db.fermer()
+        
+        excel_path = os.path.join(dossier, "logements.xlsx")
+        pd.DataFrame([{'Ilot': 'A', 'Logement': 1, 'Date Décision': '03/07/1989', 'En Activité': 'OUI'},
+                      {'Ilot': 'B', 'Logement': 2, 'Date Décision': None, 'En Activité': None}]).to_excel(excel_path, index=False)
+        db = LogementDatabase(db_path=os.path.join(dossier, "import.db"), excel_path=excel_path)
+        db.importer_depuis_excel()
+        df = db.lire_tous()
+        assert df['en_activite'].tolist()[0] == 1 and pd.isna(df['en_activite'].tolist()[1])
+        assert df['date_decision'].tolist()[0] == '1989-07-03' and df['nom_affectaire'].isna().all()
+        assert db.synchroniser_depuis_excel()['inchanges'] == 2
+        print("  ✅ Import typé, empreintes inchangées à la fusion suivante")
+        
+        # Un filtre à 0 ne doit pas être ignoré comme une valeur vide
+        assert db.lire_tous({'en_activite': 0}).empty
+        assert db.lire_tous({'en_activite': 1})['ilot'].tolist() == ['A']
+        assert db.lire_tous({'en_activite': False}).empty
+        print("  ✅ Filtres sur les statuts à 0")
+        db.fermer()
+    
+    return True
+
+
+def test_recherche_plein_texte():
+    """Test de la recherche plein texte (FTS5)"""
+    print("\n🧪 Test de la recherche plein texte...")
+    
+    import tempfile
+    from database import LogementDatabase
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        db = LogementDatabase(db_path=os.path.join(dossier, "recherche.db"))
+        ids = {}
+        for logement, nom, profession in [('1', 'Hélène Diallo', 'Ingénieure'),
+                                          ('2', 'مُحَمَّد ولد أحمد', 'طبيب'),
+                                          ('3', 'Mohamed Lemine', 'Instituteur'),
+                                          ('4', 'Mohamed Salem', 'Infirmier')]:
+            ids[logement], _ = db.creer_logement({'ilot': 'A', 'logement': logement, 'nni': f"12345{logement}",
+                                                  'nom_affectaire': nom, 'profession': profession})
+        
+        assert db.rechercher('helene')['id'].tolist() == [ids['1']]
+        assert db.rechercher('INGEN')['id'].tolist() == [ids['1']]
+        assert db.rechercher('محمد احمد')['id'].tolist() == [ids['2']]
+        assert db.rechercher('123453')['id'].tolist() == [ids['3']]
+        assert db.rechercher('moha sal')['id'].tolist() == [ids['4']]
+        assert db.rechercher('"*').empty
+        print("  ✅ Accents, arabe, préfixes et plusieurs mots")
+        
+        assert db.compter_recherche('mohamed') == 2
+        page = db.rechercher('mohamed', taille_page=1)
+        suivante = db.rechercher('mohamed', taille_page=1, apres=page.attrs['curseur_suivant'])
+        assert page.attrs['total'] == 2 and suivante.attrs['curseur_suivant'] is None
+        assert sorted(page['id'].tolist() + suivante['id'].tolist()) == [ids['3'], ids['4']]
+        print("  ✅ Pagination des résultats")
+        
+        # Filtres sans paramètre combinés à la recherche : mêmes lignes que lire_tous
+        db.modifier_logement(ids['3'], {'departement': 'MS'})
+        for filtre in [{'departement__nul': True}, {'departement__nul': False}, {'ilot__dans': []}]:
+            attendus = [i for i in db.lire_tous(filtre)['id'].tolist() if i in (ids['3'], ids['4'])]
+            assert sorted(db.rechercher('mohamed', filtre)['id'].tolist()) == sorted(attendus), filtre
+            assert db.compter_recherche('mohamed', filtre) == len(attendus), filtre
+        print("  ✅ Filtres 'nul' et 'dans' vide appliqués à la recherche")
+        
+        db.modifier_logement(ids['3'], {'nom_affectaire': 'Aicha Mint Ahmed'})
+        db.supprimer_logement(ids['4'])
+        assert db.compter_recherche('mohamed') == 0
+        assert db.rechercher('aicha')['id'].tolist() == [ids['3']]
+        print("  ✅ Index synchronisé après modification et suppression")
+        db.fermer()
+    
+    return True
+
+
+def test_pagination():
+    """Test de la pagination par curseur de lire_tous et rechercher"""
+    print("\n🧪 Test de la pagination...")
+    
+    import tempfile
+    from database import LogementDatabase, TRIS
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        db = LogementDatabase(db_path=os.path.join(dossier, "pagination.db"))
+        for i in range(23):
+            db.creer_logement({'ilot': 'AB'[i % 2], 'logement': str(i % 5), 'nom_affectaire': f"Nom {i}",
+                               'departement': None if i % 4 == 0 else f"D{i % 3}"})
+        
+        def parcourir(lire, **options):
+            ids, apres = [], None
+            while True:
+                page = lire(taille_page=4, apres=apres, **options)
+                assert len(page) <= 4 and page.attrs['total'] == 23
+                ids += page['id'].tolist()
+                apres = page.attrs['curseur_suivant']
+                if apres is None:
+                    return ids
+        
+        # Toutes les pages mises bout à bout = la lecture complète, NULL et doublons de clés compris
+        for tri in TRIS:
+            for descendant in (False, True):
+                attendu = db.lire_tous(tri=tri, descendant=descendant)['id'].tolist()
+                assert parcourir(db.lire_tous, tri=tri, descendant=descendant) == attendu, (tri, descendant)
+        print(f"  ✅ {len(TRIS)} clés de tri, ordre croissant et décroissant")
+        
+        assert parcourir(db.rechercher, terme='nom') == db.rechercher('nom')['id'].tolist()
+        assert parcourir(db.rechercher, terme='nom', tri='departement') == \
+            db.rechercher('nom', tri='departement')['id'].tolist()
+        page = db.rechercher('nom', filtre={'ilot': 'A'}, taille_page=50)
+        assert page.attrs['total'] == 12 and set(page['ilot']) == {'A'}
+        print("  ✅ Recherche paginée, par pertinence ou par clé, avec filtre")
+        db.fermer()
+    
+    return True
+
+
+def test_filtres_projection():
+    """Test de la projection des colonnes et des filtres de lire_tous"""
+    print("\n🧪 Test des filtres et de la projection...")
+    
+    import tempfile
+    from datetime import date
+    from database import LogementDatabase
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        db = LogementDatabase(db_path=os.path.join(dossier, "filtres.db"))
+        for ilot, nom, dept, date_decision in [('A', 'MOHAMED SALEM', 'MS', '15/03/2008'),
+                                               ('B', 'MOHAMEDOU', 'nan', '01/12/2015'),
+                                               ('C', 'AICHA', None, 'nan'),
+                                               ('A', 'MOUSSA', 'MEN', '30/06/2020')]:
+            db.creer_logement({'ilot': ilot, 'logement': nom[:3], 'nom_affectaire': nom,
+                               'departement': dept, 'date_decision': date_decision})
+        
+        df = db.lire_tous(colonnes=['nom_affectaire', 'departement'])
+        assert list(df.columns) == ['nom_affectaire', 'departement', 'id', 'ilot', 'logement']
+        print("  ✅ Projection : colonnes demandées, id et clés de tri")
+        
+        def noms(filtre):
+            return sorted(db.lire_tous(filtre, colonnes=['nom_affectaire'])['nom_affectaire'])
+        
+        assert noms({'ilot': ['B', 'C']}) == ['AICHA', 'MOHAMEDOU']
+        assert noms({'ilot__dans': []}) == []
+        assert noms({'nom_affectaire__commence': 'MOHAMED'}) == ['MOHAMED SALEM', 'MOHAMEDOU']
+        assert noms({'departement__nul': True}) == ['AICHA', 'MOHAMEDOU']
+        assert noms({'departement__nul': False, 'ilot': 'A'}) == ['MOHAMED SALEM', 'MOUSSA']
+        assert noms({'date_decision__min': date(2010, 1, 1), 'date_decision__max': '2019-12-31'}) == ['MOHAMEDOU']
+        assert noms({'date_decision__max': date(2010, 1, 1)}) == ['MOHAMED SALEM']
+        assert noms({'updated_at__max': date(2100, 1, 1), 'ilot': 'Tous'}) == ['AICHA', 'MOHAMED SALEM', 'MOHAMEDOU', 'MOUSSA']
+        print("  ✅ Filtres IN, préfixe, valeurs absentes et intervalles de dates")
+        
+        assert db.lire_tous({'ilot = ilot OR 1': 'A'}).empty
+        assert db.lire_tous({'ilot__contient': 'A'}).empty
+        assert db.lire_tous(colonnes=['*']).empty
+        print("  ✅ Colonnes et opérateurs hors liste blanche refusés")
+        db.fermer()
+    
+    return True
+
+
+def test_facettes():
+    """Test des facettes des filtres tenues à jour par déclencheurs"""
+    print("\n🧪 Test des facettes...")
+    
+    import tempfile
+    import pandas as pd
+    from database import LogementDatabase, FACETTES
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        excel_path = os.path.join(dossier, "logements.xlsx")
+        pd.DataFrame([
+            {'Ilot': 'A', 'Logement': '1', 'Departement': 'MS', 'Profession': 'MEDECIN'},
+            {'Ilot': 'A', 'Logement': '2', 'Departement': 'MEN', 'Profession': None},
+            {'Ilot': 'B', 'Logement': '1', 'Departement': 'MS', 'Profession': 'INFIRMIER'},
+        ]).to_excel(excel_path, index=False)
+        db = LogementDatabase(db_path=os.path.join(dossier, "facettes.db"), excel_path=excel_path)
+        
+        def verifier():
+            # Les facettes doivent égaler un GROUP BY sur la table, globalement et par îlot
+            for colonne in FACETTES:
+                for ilot in [None, 'A', 'B', 'C']:
+                    df = db.lire_tous({'ilot': ilot, f"{colonne}__nul": False})
+                    attendu = df.groupby(colonne).size().to_dict() if not df.empty else {}
+                    assert db.obtenir_facettes(colonne, ilot) == attendu, (colonne, ilot)
+        
+        db.importer_depuis_excel()
+        verifier()
+        assert db.obtenir_facettes('departement') == {'MEN': 1, 'MS': 2}
+        assert db.obtenir_valeurs_uniques('departement', ilot='B') == ['MS']
+        print("  ✅ Facettes globales et dépendantes de l'îlot après import")
+        
+        logement_id, _ = db.creer_logement({'ilot': 'C', 'logement': '1', 'departement': 'MF', 'profession': 'JURISTE'})
+        verifier()
+        db.modifier_logement(logement_id, {'ilot': 'A', 'departement': 'MS'})
+        verifier()
+        assert db.obtenir_facettes('departement', 'A') == {'MEN': 1, 'MS': 2} and 'C' not in db.obtenir_facettes('ilot')
+        db.supprimer_logement(logement_id)
+        verifier()
+        db.synchroniser_depuis_excel(chemin=excel_path)
+        verifier()
+        print("  ✅ Facettes à jour après création, modification, suppression et fusion")
+        
+        with db.pool.ecriture() as conn:
+            conn.execute("DELETE FROM facettes")
+        assert db.reconstruire_facettes()
+        verifier()
+        print("  ✅ Reconstruction complète")
+        db.fermer()
+    
+    return True
+
+
+def test_statistiques():
+    """Test des statistiques tenues à jour par déclencheurs"""
+    print("\n🧪 Test des statistiques...")
+    
+    import tempfile
+    from database import LogementDatabase
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        db = LogementDatabase(db_path=os.path.join(dossier, "statistiques.db"))
+        assert db.obtenir_statistiques()['total'] == 0
+        
+        ids = []
+        for i in range(12):
+            logement_id, _ = db.creer_logement({'ilot': 'ABC'[i % 3], 'logement': str(i),
+                                                'departement': f"D{i % 11}", 'en_activite': 'Oui' if i % 2 else None})
+            ids.append(logement_id)
+        db.modifier_logement(ids[0], {'ilot': 'Z', 'en_activite': 'Non'})
+        db.modifier_logement(ids[1], {'departement': 'D0'})
+        db.supprimer_logement(ids[2])
+        
+        stats = db.obtenir_statistiques()
+        assert stats == db._calculer_statistiques(), (stats, db._calculer_statistiques())
+        assert stats['total'] == 11 and stats['par_ilot']['Z'] == 1 and len(stats['par_departement']) == 9
+        assert stats['par_activite'] == {None: 4, 0: 1, 1: 6}
+        assert db.verifier_statistiques() == {'coherent': True, 'ecarts': {}, 'repare': False}
+        print("  ✅ Statistiques à jour après création, modification et suppression")
+        
+        with db.pool.ecriture() as conn:
+            conn.execute("UPDATE statistiques SET nombre = nombre + 5 WHERE dimension = 'ilot' AND valeur = 'A'")
+        verification = db.verifier_statistiques()
+        assert not verification['coherent'] and verification['repare'] and list(verification['ecarts']) == ['par_ilot']
+        assert db.verifier_statistiques()['coherent']
+        print("  ✅ Écart détecté et table reconstruite")
+        db.fermer()
+    
+    return True
+
+
+def test_cache_requetes():
+    """Test du cache des lectures invalidé par la version des données"""
+    print("\n🧪 Test du cache des lectures...")
+    
+    import sqlite3
+    import tempfile
+    from database import LogementDatabase, CacheRequetes
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        db_path = os.path.join(dossier, "cache.db")
+        db = LogementDatabase(db_path=db_path)
+        db.creer_logement({'ilot': 'A', 'logement': '1'})
+        
+        premier = db.lire_tous()
+        premier.loc[0, 'ilot'] = 'modifié'
+        assert db.lire_tous().loc[0, 'ilot'] == 'A'
+        assert db.obtenir_statistiques() == db.obtenir_statistiques()
+        metriques = db.metriques_cache()
+        assert metriques['succes'] == 2 and metriques['echecs'] == 2, metriques
+        print("  ✅ Lectures répétées servies par le cache (copies indépendantes)")
+        
+        db.creer_logement({'ilot': 'B', 'logement': '2'})
+        assert len(db.lire_tous()) == 2 and db.obtenir_statistiques()['total'] == 2
+        assert db.metriques_cache()['invalidations'] == 2
+        
+        # Écriture par une autre connexion : détectée par PRAGMA data_version
+        autre = sqlite3.connect(db_path)
+        autre.execute("UPDATE logements SET logement = '20' WHERE ilot = 'B'")
+        autre.commit()
+        autre.close()
+        assert db.lire_tous()['logement'].tolist() == ['1', '20']
+        print("  ✅ Cache invalidé par les écritures du processus et des autres connexions")
+        
+        # Lecture en échec (pool saturé) : la valeur de repli n'est pas mise en cache
+        db.creer_logement({'ilot': 'C', 'logement': '3'})
+        def pool_sature():
+            raise TimeoutError("Aucune connexion de lecture disponible")
+        db.pool.lecture = pool_sature
+        assert db.lire_tous().empty and db.obtenir_statistiques() == {}
+        assert db.obtenir_historique().empty and db.rechercher('A').empty
+        del db.pool.lecture
+        assert len(db.lire_tous()) == 3 and db.obtenir_statistiques()['total'] == 3
+        assert not db.obtenir_historique().empty
+        print("  ✅ Lectures en échec non mises en cache")
+        
+        cache = CacheRequetes(taille_max=1100)
+        for i in range(5):
+            cache.ecrire(i, 0, 'x' * 300)
+        cache.lire(2, 0)
+        cache.ecrire(5, 0, 'x' * 300)
+        assert [cle for cle in range(6) if cache.lire(cle, 0)[0]] == [2, 4, 5]
+        assert cache.metriques()['evictions'] == 3 and cache.metriques()['taille_octets'] <= 1100
+        print("  ✅ Éviction LRU bornée par la taille")
+        db.fermer()
+    
+    return True
+
+
+def test_carte_regroupee():
+    """Test du mode regroupé des cartes"""
+    print("\n🧪 Test des cartes regroupées...")
+    
+    import pandas as pd
+    from carte import carte_logements, lignes_regroupees, mode_effectif, id_depuis_clic
+    
+    assert mode_effectif(10, 'auto', seuil=100) == 'individuel'
+    assert mode_effectif(101, 'auto', seuil=100) == 'regroupe'
+    assert mode_effectif(101, 'individuel', seuil=100) == 'individuel'
+    
+    df = pd.DataFrame({
+        'ilot': ['A', 'B', None],
+        'logement': ['1', '2', '3'],
+        'nom_affectaire': ['<Ali>', 'Sidi', None],
+        'latitude': [18.071234567, '18.08', None],
+        'longitude': [-15.95, -15.96, -15.97],
+    })
+    lignes = lignes_regroupees(df)
+    assert lignes[0][:3] == [18.07123, -15.95, 'A-1: &lt;Ali&gt;'], lignes[0]
+    assert len(lignes) == 2 and lignes[1][0] == 18.08 and lignes[0][3] != lignes[1][3]
+    print("  ✅ Tableau compact des points (coordonnées, libellé échappé, couleur, sans position écartée)")
+    
+    grand = pd.concat([df] * 400, ignore_index=True)
+    champs = {'nom_affectaire': 'Affectaire détaillé'}
+    carte, mode = carte_logements(grand, champs, seuil=500)
+    html_regroupe = carte.get_root().render()
+    assert mode == 'regroupe' and 'markerClusterGroup' in html_regroupe and 'détaillé' not in html_regroupe
+    carte, mode = carte_logements(grand, champs, mode='individuel')
+    assert mode == 'individuel' and len(carte.get_root().render()) > 3 * len(html_regroupe)
+    print("  ✅ Regroupement automatique au-delà du seuil, HTML réduit")
+    
+    df['id'] = [7, 8, 9]
+    for mode in ('individuel', 'regroupe'):
+        carte, _ = carte_logements(df, mode=mode)
+        page = carte.get_root().render()
+        assert '(#7)' in page and 'bindPopup' not in page, mode
+    assert lignes_regroupees(df, avec_id=True)[0][2] == 'A-1: &lt;Ali&gt; (#7)'
+    assert id_depuis_clic({'last_object_clicked_tooltip': ' B-2: Sidi (#8) '}) == 8
+    assert id_depuis_clic({'last_object_clicked_tooltip': None}) is None and id_depuis_clic(None) is None
+    print("  ✅ Détails au clic : marqueurs sans pop-up, id relu dans l'info-bulle")
+    
+    return True
+
+
+def test_zones():
+    """Test de l'index spatial et de la lecture par zone"""
+    print("\n🧪 Test de la lecture par zone...")
+    
+    import tempfile
+    from database import LogementDatabase
+    from carte import vue_depuis_retour
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        db = LogementDatabase(db_path=os.path.join(dossier, "zones.db"))
+        ids = []
+        for i in range(100):
+            logement_id, _ = db.creer_logement({'ilot': 'AB'[i % 2], 'logement': str(i),
+                                                'latitude': 18.0 + (i % 10) / 100, 'longitude': -16.0 + (i // 10) / 100})
+            ids.append(logement_id)
+        db.creer_logement({'ilot': 'A', 'logement': 'sans position'})
+        
+        zone = (18.0, -16.0, 18.045, -15.955)  # 5 × 5 positions
+        df = db.lire_dans_zone(zone)
+        assert len(df) == 25 and df.attrs['total'] == 25
+        df = db.lire_dans_zone(zone, {'ilot': 'A'}, limite=10, colonnes=['logement'])
+        assert len(df) == 10 and df.attrs['total'] == 15 and set(df.columns) == {'id', 'logement'}
+        effectifs = db.compter_dans_zone(zone, divisions=2)
+        assert effectifs['nombre'].sum() == 25 and len(effectifs) == 4
+        print("  ✅ Lecture par zone avec filtre, limite et effectifs par case")
+        
+        db.modifier_logement(ids[0], {'latitude': 18.5})
+        db.supprimer_logement(ids[1])
+        assert db.lire_dans_zone(zone).attrs['total'] == 23
+        assert db.lire_dans_zone((18.49, -16.01, 18.51, -15.99))['id'].tolist() == [ids[0]]
+        with db.pool.lecture() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM logements_zones").fetchone()[0] == 99
+        print("  ✅ Index spatial tenu à jour (création, déplacement, suppression)")
+        db.fermer()
+    
+    retour = {'bounds': {'_southWest': {'lat': 18.0, 'lng': -16.0}, '_northEast': {'lat': 18.1, 'lng': -15.9}},
+              'zoom': 15, 'center': {'lat': 18.05, 'lng': -15.95}}
+    assert vue_depuis_retour(retour, 13) == ([18.05, -15.95], 15, (18.0, -16.0, 18.1, -15.9))
+    centre, zoom, (sud, ouest, nord, est) = vue_depuis_retour(None, 13)
+    assert zoom == 13 and sud < centre[0] < nord and ouest < centre[1] < est
+    print("  ✅ Zone affichée relue dans le retour de st_folium")
+    
+    return True
+
+
+def test_couche_geojson():
+    """Test de la couche GeoJSON des marqueurs et de son cache"""
+    print("\n🧪 Test de la couche GeoJSON...")
+    
+    import tempfile
+    import pandas as pd
+    from database import LogementDatabase
+    from carte import collection_geojson, geojson_en_cache
+    
+    df = pd.DataFrame({
+        'id': [7, 8, 9, 10],
+        'ilot': ['A', 'Z', 'B', 'C'],
+        'logement': ['1', '2', '3', '4'],
+        'nom_affectaire': ['<Ali>', 'Sidi', 'Ahmed', 'Fatima'],
+        'profession': ['Médecin', None, '', 'Enseignant'],
+        'latitude': [18.071234567, '18.08', None, 95.0],
+        'longitude': [-15.95, -15.96, -15.97, -15.98],
+    })
+    collection = collection_geojson(df, ['profession'], avec_id=True)
+    entites = collection['features']
+    assert collection['type'] == 'FeatureCollection' and [e['id'] for e in entites] == [7, 8]
+    assert entites[0]['geometry'] == {'type': 'Point', 'coordinates': [-15.95, 18.07123]}
+    assert entites[0]['properties'] == {'libelle': 'A-1: &lt;Ali&gt; (#7)', 'couleur': 'red', 'profession': 'Médecin'}
+    assert entites[1]['properties']['couleur'] == 'gray' and entites[1]['properties']['profession'] == ''
+    print("  ✅ Entités construites par colonnes, positions invalides écartées")
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        db = LogementDatabase(db_path=os.path.join(dossier, "geojson.db"))
+        db.creer_logement({'ilot': 'A', 'logement': '1', 'latitude': 18.07, 'longitude': -15.95})
+        constructions = []
+        
+        def construire():
+            constructions.append(1)
+            return collection_geojson(db.lire_tous(), avec_id=True)
+        
+        premiere = geojson_en_cache(db, ('carte', 'A'), construire)
+        assert geojson_en_cache(db, ('carte', 'A'), construire) is premiere and len(constructions) == 1
+        geojson_en_cache(db, ('carte', 'B'), construire)
+        assert len(constructions) == 2
+        db.creer_logement({'ilot': 'B', 'logement': '2', 'latitude': 18.08, 'longitude': -15.96})
+        assert len(geojson_en_cache(db, ('carte', 'A'), construire)['features']) == 2 and len(constructions) == 3
+        print("  ✅ Collection servie par le cache par filtre, reconstruite après écriture")
+        db.fermer()
+    
+    return True
+
+
+def test_carte_webgl():
+    """Test de la carte WebGL (plotly)"""
+    print("\n🧪 Test de la carte WebGL...")
+    
+    import pandas as pd
+    from carte import figure_webgl, COULEURS_WEBGL
+    
+    df = pd.DataFrame({
+        'ilot': ['B', 'A', 'B', None, 'A'],
+        'logement': ['1', '2', '3', '4', '5'],
+        'nom_affectaire': ['Ali', 'Sidi', 'Ahmed', 'Fatima', 'Mariem'],
+        'profession': ['Médecin', None, 'Juriste', '', 'Enseignant'],
+        'latitude': [18.07, 18.08, '18.09', 18.1, None],
+        'longitude': [-15.95, -15.96, -15.97, -15.98, -15.99],
+    })
+    figure = figure_webgl(df, {'profession': 'Profession'})
+    traces = {trace.name: trace for trace in figure.data}
+    assert set(traces) == {'A', 'B', '-'} and all(trace.type == 'scattermapbox' for trace in figure.data)
+    assert list(traces['B'].lat) == [18.07, 18.09] and list(traces['A'].lon) == [-15.96]
+    assert traces['A'].marker.color == COULEURS_WEBGL['red'] and traces['-'].marker.color == COULEURS_WEBGL['gray']
+    assert [list(ligne) for ligne in traces['B'].customdata] == [['B-1', 'Médecin'], ['B-3', 'Juriste']]
+    assert 'Profession : %{customdata[1]}' in traces['A'].hovertemplate
+    print("  ✅ Une trace WebGL par îlot, couleurs des marqueurs, survol limité")
+    
+    assert figure_webgl(df.iloc[0:0]).data == ()
+    print("  ✅ Carte vide sans erreur")
+    
+    return True
+
+
+def test_nettoyage_affichage():
+    """Test de la préparation des tableaux pour l'affichage"""
+    print("\n🧪 Test du nettoyage pour l'affichage...")
+    
+    import numpy as np
+    import pandas as pd
+    from affichage import nettoyer_dataframe, afficher_valeur_activite
+    
+    df = pd.DataFrame({
+        'en_activite': ['OUI', ' oui ', 'non', None, '', np.nan],
+        'decede': [1, 0, 1.0, 0, True, False],
+        'nom_affectaire': ['Ali', '', None, 'Sidi', np.nan, 'Ahmed'],
+        'latitude': [18.07, np.nan, 18.08, 18.09, 18.1, 18.11],
+        'id': range(6),
+    })
+    propre = nettoyer_dataframe(df)
+    assert propre['en_activite'].tolist() == ['Oui', 'Oui', 'Non', 'Non', 'Non', 'Non']
+    assert propre['decede'].tolist() == ['Oui', 'Non', 'Oui', 'Non', 'Oui', 'Non']
+    assert propre['nom_affectaire'].tolist() == ['Ali', '-', '-', 'Sidi', '-', 'Ahmed']
+    assert propre['latitude'].tolist()[1] == 0 and propre['id'].tolist() == list(range(6))
+    assert nettoyer_dataframe(df, 'ar')['en_activite'].iloc[0] == afficher_valeur_activite('OUI', 'ar')
+    assert df['en_activite'].iloc[0] == 'OUI' and df['nom_affectaire'].iloc[1] == ''
+    print("  ✅ Statuts traduits, valeurs absentes remplacées, original intact")
+    
+    complet = pd.DataFrame({'ilot': ['A', 'B'], 'logement': ['1', '2']})
+    assert nettoyer_dataframe(complet) is complet
+    print("  ✅ Aucune copie sans modification")
+    
+    return True
+
+
+def test_libelles_logements():
+    """Test des libellés de la sélection de la liste"""
+    print("\n🧪 Test des libellés de sélection...")
+    
+    import pandas as pd
+    from affichage import libelles_logements
+    
+    df = pd.DataFrame({'id': [12, 5, 40], 'ilot': ['A', None, 'C'], 'logement': ['1', '2', '3'],
+                       'nom_affectaire': ['AHMED', 'FATIMA', None]})
+    libelles = libelles_logements(df)
+    assert list(libelles) == [12, 5, 40]
+    assert libelles == {12: 'ID:12 - A-1 - AHMED', 5: 'ID:5 - -2 - FATIMA', 40: 'ID:40 - C-3 - '}
+    assert libelles_logements(df[['id', 'ilot', 'logement']])[12] == 'ID:12 - A-1 - '
+    print("  ✅ Libellés indexés par id, dans l'ordre des lignes, colonnes absentes tolérées")
+    
+    return True
+
+
+def test_crud_par_lots():
+    """Test des créations, modifications et suppressions par lots"""
+    print("\n🧪 Test du CRUD par lots...")
+    
+    import json
+    import tempfile
+    from database import LogementDatabase
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        db = LogementDatabase(db_path=os.path.join(dossier, "lots.db"))
+        version = db.pool.version_donnees()
+        
+        ids, message = db.creer_logements([
+            {'ilot': 'LOT1', 'logement': str(i), 'nom_affectaire': f'PERSONNE {i}', 'en_activite': 'OUI'}
+            for i in range(5)] + [{'ilot': 'LOT1', 'logement': '5', 'departement': 'MS'}])
+        assert len(ids) == 6 and ids == list(range(ids[0], ids[0] + 6)), message
+        assert db.lire_logement(ids[5])['departement'] == 'MS'
+        assert db.lire_logement(ids[5])['nom_affectaire'] is None
+        assert db.lire_logement(ids[0])['en_activite'] == 1
+        # Une seule transaction, donc un seul commit
+        assert db.pool.version_donnees()[0] == version[0] + 1
+        print("  ✅ 6 logements créés en une transaction, id consécutifs")
+        
+        assert db.creer_logements([{'id': 1, 'ilot': 'X'}])[0] == []
+        assert db.creer_logements([{'colonne_inconnue': 'X'}])[0] == []
+        assert db.creer_logement({'ilot': 'X', 'colonne_inconnue': 'X'}) == (0, "✗ Erreur lors de la création: "
+                                                                              "Colonne inconnue: colonne_inconnue")
+        # Colonne hors liste blanche : refusée avant toute lecture de la ligne
+        assert 'Colonne inconnue: foo' in db.modifier_logement(ids[0], {'foo': 'X'})[1]
+        assert 'Colonne inconnue: foo' in db.modifier_logements([{'id': ids[0], 'foo': 'X'}])[1]
+        
+        nombre, message = db.modifier_logements(
+            [{'id': i, 'ilot': 'LOT2'} for i in ids[:4]] + [{'id': ids[4], 'ilot': 'LOT2', 'departement': 'MEN'}])
+        assert nombre == 5, message
+        assert db.obtenir_facettes('ilot') == {'LOT1': 1, 'LOT2': 5}
+        assert db.lire_logement(ids[4])['departement'] == 'MEN'
+        assert len(db.rechercher('LOT2')) == 5
+        
+        nombre, message = db.supprimer_logements(ids[:3] + [999999])
+        assert nombre == 3, message
+        assert db.obtenir_statistiques()['total'] == 3
+        assert len(db.rechercher('LOT2')) == 2
+        assert db.verifier_statistiques(reparer=False)['coherent']
+        print("  ✅ Modification et suppression par lots, facettes, recherche et statistiques à jour")
+        
+        historique = db.obtenir_historique()
+        assert sorted(historique['action']) == ['CREATE_LOT', 'DELETE_LOT', 'UPDATE_LOT']
+        details = {action: json.loads(d) for action, d in zip(historique['action'], historique['details'])}
+        assert details['CREATE_LOT'] == {'nombre': 6, 'ids': ids}
+        assert details['UPDATE_LOT']['nombre'] == 5
+        assert details['DELETE_LOT']['logements'] == ['LOT2-0', 'LOT2-1', 'LOT2-2']
+        print("  ✅ Une entrée d'historique groupée par lot")
+        db.fermer()
+    
+    return True
+
+
+def test_journal_historique():
+    """Test de l'historique : même transaction que la modification, écriture différée par lots"""
+    print("\n🧪 Test de l'historique atomique et différé...")
+    
+    import sqlite3
+    import subprocess
+    import sys
+    import tempfile
+    import time
+    from database import LogementDatabase
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        db_path = os.path.join(dossier, "historique.db")
+        db = LogementDatabase(db_path=db_path, lot_historique=100)
+        db.journal.intervalle = 60
+        
+        # Modification et historique : un seul commit
+        logement_id, _ = db.creer_logement({'ilot': 'A', 'logement': '1'})
+        version = db.pool.version_donnees()[0]
+        assert db.modifier_logement(logement_id, {'ilot': 'B'})[0]
+        assert db.pool.version_donnees()[0] == version + 1
+        
+        # Historique impossible à écrire : la modification est annulée
+        with db.pool.ecriture() as conn:
+            conn.execute("CREATE TRIGGER historique_refuse BEFORE INSERT ON historique "
+                         "BEGIN SELECT RAISE(ABORT, 'historique indisponible'); END")
+        succes, message = db.modifier_logement(logement_id, {'ilot': 'C'})
+        assert not succes and 'historique indisponible' in message
+        assert db.lire_logement(logement_id)['ilot'] == 'B'
+        with db.pool.ecriture() as conn:
+            conn.execute("DROP TRIGGER historique_refuse")
+        print("  ✅ Modification et historique validés ou annulés ensemble")
+        
+        # Hors transaction : file d'attente vidée par lots de 100 en arrière-plan
+        for i in range(100):
+            db.ajouter_historique(None, "EXPORT", f"export {i}", "Système")
+        limite = time.monotonic() + 10
+        while db.metriques_historique()['entrees'] < 100 and time.monotonic() < limite:
+            time.sleep(0.01)
+        for i in range(50):
+            db.ajouter_historique(None, "EXPORT", f"export {100 + i}", "Système")
+        metriques = db.metriques_historique()
+        assert metriques['entrees'] == 100 and metriques['lots'] == 1 and metriques['en_attente'] == 50, metriques
+        db.fermer()
+        
+        conn = sqlite3.connect(db_path)
+        exports = conn.execute("SELECT COUNT(*) FROM historique WHERE action = 'EXPORT'").fetchone()[0]
+        conn.close()
+        assert exports == 150
+        print("  ✅ Lot complet écrit en arrière-plan, les 50 entrées restantes écrites à la fermeture")
+        
+        # Arrêt de l'interpréteur sans fermer la base : vidage par atexit
+        code = ("from database import LogementDatabase\n"
+                f"db = LogementDatabase(db_path={db_path!r}, lot_historique=1000)\n"
+                "for i in range(30): db.ajouter_historique(None, 'EXPORT', 'sortie', 'Système')\n")
+        subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        db = LogementDatabase(db_path=db_path)
+        historique = db.obtenir_historique(limit=1000)
+        assert (historique['details'] == 'sortie').sum() == 30
+        db.fermer()
+        print("  ✅ Entrées en attente écrites à l'arrêt de l'interpréteur")
+    
+    return True
+
+
+def test_archivage_historique():
+    """Test de l'historique : pages par curseur, filtres, archivage compressé et récupération d'espace"""
+    print("\n🧪 Test de l'archivage de l'historique...")
+    
+    import sqlite3
+    import tempfile
+    from database import LogementDatabase, INSERT_HISTORIQUE
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        # Base créée sans auto_vacuum incrémental (avant cette version)
+        db_path = os.path.join(dossier, "historique.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE ancienne (x)")
+        conn.close()
+        db = LogementDatabase(db_path=db_path, lot_historique=0, taille_cache=0)
+        entrees = [(i % 50 or None, ['CREATE', 'UPDATE', 'DELETE'][i % 3], 'x' * 200, ['Utilisateur', 'Système'][i % 2],
+                    f"{2023 + i % 4}-{1 + i % 12:02d}-{1 + i % 28:02d} 10:{i % 60:02d}:00") for i in range(3000)]
+        with db.pool.ecriture() as conn:
+            conn.executemany(INSERT_HISTORIQUE, entrees)
+        
+        # Parcours complet par pages : ordre décroissant, sans doublon ni oubli
+        ids, apres = [], None
+        while True:
+            page = db.obtenir_historique(limit=400, apres=apres, action='UPDATE', utilisateur='Système')
+            ids += page['id'].tolist()
+            apres = page.attrs['curseur_suivant']
+            if apres is None:
+                break
+        with db.pool.lecture() as conn:
+            attendus = [ligne[0] for ligne in conn.execute(
+                "SELECT id FROM historique WHERE action = 'UPDATE' AND utilisateur = 'Système' "
+                "ORDER BY timestamp DESC, id DESC")]
+            plan = ' '.join(ligne[-1] for ligne in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM historique WHERE action = ? AND (timestamp, id) < (?, ?) "
+                "ORDER BY timestamp DESC, id DESC LIMIT 10", ('UPDATE', '2025', 1)))
+        assert ids == attendus and len(ids) == 500
+        assert 'idx_historique_action' in plan and 'TEMP B-TREE' not in plan, plan
+        periode = db.obtenir_historique(limit=5000, debut='2024-03-01', fin='2024-03-31')
+        assert len(periode) == sum(1 for e in entrees if e[4].startswith('2024-03'))
+        print("  ✅ Pages par curseur et filtres (action, utilisateur, dates) servis par les index")
+        
+        # Archivage dans la base, puis dans un fichier séparé
+        anciennes = db.obtenir_historique(limit=5000, fin='2024-12-31').sort_values('id')
+        resultat = db.archiver_historique(avant='2025-01-01', taille_bloc=400)
+        assert resultat['archivees'] == len(anciennes) == 1500 and resultat['blocs'] == 4, resultat
+        assert resultat['pages_liberees'] > 0
+        assert len(db.obtenir_historique(limit=5000)) == 1500
+        archive = db.lire_archive_historique().sort_values('id').reset_index(drop=True)
+        assert archive[['id', 'action', 'utilisateur', 'timestamp']].equals(
+            anciennes[['id', 'action', 'utilisateur', 'timestamp']].reset_index(drop=True))
+        assert len(db.lire_archive_historique(debut='2024-03-01', fin='2024-03-31')) == len(periode)
+        with db.pool.lecture() as conn:
+            assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+            taille_archive = conn.execute("SELECT SUM(LENGTH(donnees)) FROM historique_archive").fetchone()[0]
+        assert taille_archive < 1500 * 200 / 5
+        print(f"  ✅ 1500 entrées archivées en 4 blocs compressés ({taille_archive} octets), "
+              f"{resultat['pages_liberees']} pages rendues, base convertie en auto_vacuum incrémental")
+        
+        fichier = os.path.join(dossier, "archive.db")
+        resultat = db.archiver_historique(avant='2026-01-01', fichier=fichier)
+        assert resultat['archivees'] == 750 and len(db.obtenir_historique(limit=5000)) == 750
+        assert resultat['pages_liberees'] > 0
+        assert len(db.lire_archive_historique(fichier=fichier)) == 750
+        print("  ✅ Archivage dans un fichier SQLite séparé")
+        db.fermer()
+    
+    return True
+
+
+def test_etat_au():
+    """Test des différences par champ, des instantanés et de l'état d'un logement à une date"""
+    print("\n🧪 Test de l'état d'un logement à une date...")
+    
+    import json
+    import tempfile
+    import pandas as pd
+    from database import LogementDatabase
+    
+    def sans_horodatage(etat):
+        return {k: v for k, v in etat.items() if k not in ('created_at', 'updated_at')} if etat else etat
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        db = LogementDatabase(db_path=os.path.join(dossier, "etat.db"), taille_cache=0)
+        db.intervalle_instantanes = 5
+        logement_id, _ = db.creer_logement({'ilot': 'A', 'logement': '1', 'nom_affectaire': 'AHMED',
+                                            'en_activite': 'OUI'})
+        etats = [db.lire_logement(logement_id)]
+        for i in range(12):
+            assert db.modifier_logement(logement_id, {'ilot': 'A', 'profession': f'PROFESSION {i}',
+                                                      'en_activite': 'OUI' if i % 2 else 'NON'})[0]
+            etats.append(db.lire_logement(logement_id))
+        assert db.modifier_logement(logement_id, {'ilot': 'A'}) == (True, "✓ Aucune modification à enregistrer")
+        assert not db.modifier_logement(10 ** 6, {'ilot': 'A'})[0]
+        # Logement importé (sans entrée CREATE ni instantané)
+        with db.pool.ecriture() as conn:
+            importe = conn.execute("INSERT INTO logements (ilot, logement) VALUES ('B', '2')").lastrowid
+        assert db.modifier_logement(importe, {'departement': 'MS'})[0]
+        db.supprimer_logement(logement_id)
+        
+        # Horodatages espacés d'une minute par entrée, instantanés alignés sur leur entrée
+        with db.pool.ecriture() as conn:
+            conn.execute("UPDATE historique SET timestamp = datetime('2025-01-01', '+' || id || ' minutes')")
+            conn.execute("UPDATE historique_instantanes "
+                         "SET timestamp = datetime('2025-01-01', '+' || historique_id || ' minutes')")
+            entrees = conn.execute("SELECT id, action, details, timestamp FROM historique "
+                                   "WHERE logement_id = ? ORDER BY id", (logement_id,)).fetchall()
+            instantanes = conn.execute("SELECT COUNT(*) FROM historique_instantanes WHERE logement_id = ?",
+                                       (logement_id,)).fetchone()[0]
+        
+        differences = json.loads(entrees[1]['details'])
+        assert differences == {'profession': [None, 'PROFESSION 0'], 'en_activite': [1, 0]}
+        assert [e['action'] for e in entrees] == ['CREATE'] + ['UPDATE'] * 12 + ['DELETE']
+        # CREATE, puis toutes les 5 entrées
+        assert instantanes == 3
+        for entree, etat in zip(entrees, etats):
+            assert sans_horodatage(db.etat_au(logement_id, entree['timestamp'])) == sans_horodatage(etat)
+        assert db.etat_au(logement_id, '2024-12-31') is None
+        assert db.etat_au(logement_id, entrees[-1]['timestamp']) is None
+        assert db.etat_au(importe, '2025-01-01 00:00:00') is None
+        assert db.etat_au(importe, '2025-01-02')['departement'] == 'MS'
+        print("  ✅ Différences par champ, 3 instantanés, état reconstruit à chaque entrée")
+        
+        # Lots : différences dans l'entrée du lot, un instantané par logement
+        ids, _ = db.creer_logements([{'ilot': 'C', 'logement': str(i)} for i in range(3)])
+        nombre, _ = db.modifier_logements([{'id': ids[0], 'ilot': 'D'}, {'id': ids[1], 'ilot': 'C'}])
+        assert nombre == 1
+        historique = db.obtenir_historique(limit=1)
+        assert json.loads(historique['details'][0])['modifications'] == [{'id': ids[0], 'ilot': ['C', 'D']}]
+        assert db.etat_au(ids[0], '2100-01-01')['ilot'] == 'D'
+        db.supprimer_logements(ids)
+        assert db.etat_au(ids[1], '2100-01-01') is None
+        print("  ✅ Lots : différences, instantanés et suppressions pris en compte")
+        
+        # Archivage : l'état à la dernière entrée archivée reste connu
+        archive_id, _ = db.creer_logement({'ilot': 'E', 'logement': '1', 'profession': 'P0'})
+        db.modifier_logement(archive_id, {'profession': 'P1'})
+        with db.pool.ecriture() as conn:
+            conn.execute("UPDATE historique SET timestamp = datetime('2020-01-01', '+' || id || ' minutes') "
+                         "WHERE logement_id = ?", (archive_id,))
+            conn.execute("UPDATE historique_instantanes SET timestamp = datetime('2020-01-01', '+' || "
+                         "historique_id || ' minutes') WHERE logement_id = ?", (archive_id,))
+        db.modifier_logement(archive_id, {'profession': 'P2'})
+        resultat = db.archiver_historique(avant='2021-01-01')
+        assert resultat['archivees'] == 2 and resultat['instantanes'] == 1, resultat
+        assert db.etat_au(archive_id, '2020-12-31')['profession'] == 'P1'
+        assert db.etat_au(archive_id, '2100-01-01')['profession'] == 'P2'
+        with db.pool.lecture() as conn:
+            anciens = conn.execute("SELECT COUNT(*) FROM historique_instantanes WHERE timestamp < '2021-01-01'"
+                                   ).fetchone()[0]
+        assert anciens == 1
+        print("  ✅ Archivage : instantané à la date de coupure, anciens instantanés purgés")
+        
+        # Imports Excel : une fusion enregistre ses différences, un remplacement supprime les logements
+        db.excel_path = os.path.join(dossier, "logements.xlsx")
+        pd.DataFrame([{'Ilot': 'F', 'Logement': '1', 'Profession': 'P0'}]).to_excel(db.excel_path, index=False)
+        db.synchroniser_depuis_excel()
+        fusion_id = int(db.lire_tous(filtre={'ilot': 'F'})['id'].iloc[0])
+        db.modifier_logement(fusion_id, {'nom_affectaire': 'NOM'})
+        pd.DataFrame([{'Ilot': 'F', 'Logement': '1', 'Profession': 'P1'}]).to_excel(db.excel_path, index=False)
+        assert db.synchroniser_depuis_excel()['modifies'] == 1
+        historique = db.obtenir_historique(logement_id=fusion_id, limit=1)
+        assert json.loads(historique['details'][0]) == {'profession': ['P0', 'P1']}
+        assert historique['utilisateur'][0] == 'Système'
+        etat = db.etat_au(fusion_id, '2100-01-01')
+        assert (etat['profession'], etat['nom_affectaire']) == ('P1', 'NOM')
+        db.importer_depuis_excel(force=True)
+        assert db.etat_au(fusion_id, '2100-01-01') is None
+        print("  ✅ Imports : différences de la fusion rejouées, logements remplacés supprimés")
+        db.fermer()
+    
+    return True
+
+
 def test_app_structure():
     """Test de la structure de l'application"""
     print("\n🧪 Test de la structure de l'application...")
@@ -146,6 +1330,8 @@ def test_app_structure():
     required_files = [
         'app.py',
         'database.py',
+        'carte.py',
+        'affichage.py',
         'requirements.txt',
         'README.md',
         'run_app.sh'
@@ -183,6 +1369,75 @@ def main():
     # Test 4: Module database
     results.append(("Module database", test_database_module()))
     
+    # Test 5: Import par lots
+    results.append(("Import par lots", test_import_par_lots()))
+    
+    # Test 6: Import incrémental
+    results.append(("Import incrémental", test_import_incremental()))
+    
+    # Test 7: Empreinte des imports
+    results.append(("Empreinte des imports", test_empreinte_import()))
+    
+    # Test 8: Pool de connexions
+    results.append(("Pool de connexions", test_pool_connexions()))
+    
+    # Test 9: Profil SQLite
+    results.append(("Profil SQLite", test_profil_sqlite()))
+    
+    # Test 10: Migrations du schéma
+    results.append(("Migrations du schéma", test_migrations()))
+    
+    # Test 11: Recherche plein texte
+    results.append(("Recherche plein texte", test_recherche_plein_texte()))
+    
+    # Test 12: Pagination
+    results.append(("Pagination", test_pagination()))
+    
+    # Test 13: Filtres et projection
+    results.append(("Filtres et projection", test_filtres_projection()))
+    
+    # Test 14: Facettes
+    results.append(("Facettes des filtres", test_facettes()))
+    
+    # Test 15: Statistiques
+    results.append(("Statistiques tenues à jour", test_statistiques()))
+    
+    # Test 16: Cache des lectures
+    results.append(("Cache des lectures", test_cache_requetes()))
+    
+    # Test 17: Cartes regroupées
+    results.append(("Cartes regroupées", test_carte_regroupee()))
+    
+    # Test 18: Lecture par zone
+    results.append(("Lecture par zone", test_zones()))
+    
+    # Test 19: Couche GeoJSON
+    results.append(("Couche GeoJSON des marqueurs", test_couche_geojson()))
+    
+    # Test 20: Carte WebGL
+    results.append(("Carte WebGL", test_carte_webgl()))
+    
+    # Test 21: Nettoyage pour l'affichage
+    results.append(("Nettoyage pour l'affichage", test_nettoyage_affichage()))
+    
+    # Test 22: Colonnes typées
+    results.append(("Colonnes typées", test_types_stockage()))
+    
+    # Test 23: Libellés de sélection
+    results.append(("Libellés de sélection", test_libelles_logements()))
+    
+    # Test 24: CRUD par lots
+    results.append(("CRUD par lots", test_crud_par_lots()))
+    
+    # Test 25: Historique atomique et différé
+    results.append(("Historique atomique et différé", test_journal_historique()))
+    
+    # Test 26: Archivage de l'historique
+    results.append(("Archivage de l'historique", test_archivage_historique()))
+    
+    # Test 27: État d'un logement à une date
+    results.append(("État à une date", test_etat_au()))
+    
     # Résumé
     print("\n" + "=" * 60)
     print("📊 RÉSUMÉ DES TESTS")